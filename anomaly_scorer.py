@@ -0,0 +1,236 @@
+import math, threading
+from collections import Counter
+from typing import Any, Iterable, List, Optional, Sequence
+
+from config import (
+    ANOMALY_GATE,
+    ANOMALY_THRESHOLD,
+    ANOMALY_MIN_SAMPLES,
+    ANOMALY_DECAY,
+)
+from metrics import REGISTRY
+from preprocess import _epoch_sec
+from prompt_builder import _is_external
+
+try:
+    import numpy as np  # 선택 의존성: 없으면 게이트 비활성 (모든 trace가 LLM 판단으로)
+except ImportError:
+    np = None
+
+# LLM 판단 전 로컬 이상 점수 게이트.
+# trace → 고정 길이 수치 벡터 → 지수가중 평균/분산(트래픽으로 점진 갱신) 기준 z-score
+# 상위 3개 평균이 점수. 점수 < threshold인 trace는 LLM 노드로 보내지 않는다 (sigma 탐지는 항상 통과)
+
+FEATURES = (
+    "log_events",
+    "log_dns",
+    "log_net",
+    "log_proc_create",
+    "log_proc_term",
+    "log_other",
+    "log_distinct_dst_ip",
+    "log_distinct_dst_port",
+    "external_dst_ratio",
+    "port_rarity_max",
+    "port_rarity_mean",
+    "proc_rarity_max",
+    "proc_rarity_mean",
+    "sigma",
+    "log_gap_mean",
+    "log_gap_min",
+    "log_gap_std",
+    "log_duration",
+)
+# 양쪽 방향 모두 이상으로 볼 특징 (간격이 비정상적으로 짧거나 긴 경우). 나머지는 큰 쪽만
+_TWO_SIDED = ("log_gap_mean", "log_gap_min", "log_gap_std", "log_duration")
+
+GATE = REGISTRY.counter(
+    "trace_anomaly_gate_total", "Traces by local anomaly gate result (pass, skip, warmup)", ("result",)
+)
+SCORES = REGISTRY.histogram(
+    "trace_anomaly_score", "Local anomaly score per trace",
+    buckets=(0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0, 7.5, 10.0),
+)
+
+
+def _kind(ev: str):
+    if "Dnsquery" in ev:
+        return 0
+    if "Networkconnectiondetected" in ev:
+        return 1
+    if "ProcessCreate" in ev:
+        return 2
+    if "Processterminated" in ev or "ProcessTerminate" in ev:
+        return 3
+    return 4
+
+
+def _ts(ts: Optional[str]):
+    # "YYYY-MM-DD HH:MM:SS.fff" → epoch 초 (초 단위 파싱은 preprocess와 같은 lru 캐시 사용)
+    if not ts:
+        return None
+    sec = _epoch_sec(ts[:19])
+    if sec is None:
+        return None
+    frac = ts[20:26]
+    return sec + (float("0." + frac) if frac.isdigit() else 0.0)
+
+
+class AnomalyScorer:
+    def __init__(
+        self,
+        threshold: float = ANOMALY_THRESHOLD,
+        min_samples: int = ANOMALY_MIN_SAMPLES,
+        decay: float = ANOMALY_DECAY,
+    ):
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.decay = decay  # 배치마다 기존 통계 가중치 (1에 가까울수록 천천히 적응)
+        self.dim = len(FEATURES)
+        self._two_sided = np.array([f in _TWO_SIDED for f in FEATURES]) if np is not None else None
+        self.mean = np.zeros(self.dim) if np is not None else None
+        self.var = np.ones(self.dim) if np is not None else None
+        self.seen = 0
+        self._ports: Counter = Counter()
+        self._procs: Counter = Counter()
+        self._ports_total = 0
+        self._procs_total = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return np is not None
+
+    def _rarity(self, counter: Counter, total: int, keys: Iterable[str]):
+        vals = [-math.log((counter.get(k, 0) + 1) / (total + 1)) for k in keys]
+        return (max(vals), sum(vals) / len(vals)) if vals else (0.0, 0.0)
+
+    def vectorize(self, events: Sequence[Any], observe: bool = True):
+        # 이벤트 목록(dict 또는 EventRecord) → FEATURES 순서의 float 리스트
+        kinds = [0] * 5
+        ips, ports, procs, times = set(), set(), set(), []
+        sigma = 0.0
+        for e in events:
+            get = e.get
+            kinds[_kind(get("event_name") or "")] += 1
+            v = get("destination_ip")
+            if v:
+                ips.add(v)
+            v = get("destination_port")
+            if v:
+                ports.add(str(v))
+            v = get("process_name")
+            if v:
+                procs.add(v)
+            if get("sigma_alert") or get("sigma_rule_title"):
+                sigma = 1.0
+            t = _ts(get("timestamp_utc"))
+            if t is not None:
+                times.append(t)
+        with self._lock:
+            port_max, port_mean = self._rarity(self._ports, self._ports_total, ports)
+            proc_max, proc_mean = self._rarity(self._procs, self._procs_total, procs)
+            if observe:
+                # 희귀도 통계는 trace 단위 등장 횟수로 갱신, 커지면 절반으로 줄여 최근 트래픽 위주로 유지
+                self._ports.update(ports)
+                self._procs.update(procs)
+                self._ports_total += 1
+                self._procs_total += 1
+                if self._ports_total > 100_000:
+                    self._ports = Counter({k: c // 2 for k, c in self._ports.items() if c > 1})
+                    self._procs = Counter({k: c // 2 for k, c in self._procs.items() if c > 1})
+                    self._ports_total //= 2
+                    self._procs_total //= 2
+        times.sort()
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        if gaps:
+            g_mean = sum(gaps) / len(gaps)
+            g_std = math.sqrt(sum((g - g_mean) ** 2 for g in gaps) / len(gaps))
+            g_min = min(gaps)
+        else:
+            g_mean = g_std = g_min = 0.0
+        n = len(events)
+        ext = sum(1 for ip in ips if _is_external(ip))
+        return [
+            math.log1p(n),
+            *(math.log1p(c) for c in kinds),
+            math.log1p(len(ips)),
+            math.log1p(len(ports)),
+            ext / len(ips) if ips else 0.0,
+            port_max,
+            port_mean,
+            proc_max,
+            proc_mean,
+            sigma,
+            math.log1p(g_mean),
+            math.log1p(g_min),
+            math.log1p(g_std),
+            math.log1p(times[-1] - times[0] if times else 0.0),
+        ]
+
+    def score_batch(self, vectors: List[List[float]], update: bool = True):
+        # 현재 통계로 점수를 매긴 뒤 이 배치로 평균/분산을 갱신 (점수가 자기 자신에 희석되지 않도록)
+        if np is None or not vectors:
+            return [float("inf")] * len(vectors)
+        X = np.asarray(vectors, dtype=np.float64)
+        with self._lock:
+            mean, var, seen = self.mean.copy(), self.var.copy(), self.seen
+            if update:
+                self._fit(X)
+        z = (X - mean) / np.sqrt(var + 1e-6)
+        z = np.where(self._two_sided, np.abs(z), np.maximum(z, 0.0))
+        k = min(3, self.dim)
+        scores = np.sort(z, axis=1)[:, -k:].mean(axis=1)
+        if seen < self.min_samples:
+            # 통계가 쌓이기 전(warmup)에는 모든 trace 통과
+            scores = np.full(len(X), np.inf)
+        return scores.tolist()
+
+    def _fit(self, X):
+        n = len(X)
+        bm, bv = X.mean(axis=0), X.var(axis=0)
+        if self.seen == 0:
+            self.mean, self.var = bm, np.maximum(bv, 1e-3)
+        else:
+            # 배치 크기만큼 decay를 적용한 지수가중 평균/분산
+            a = 1.0 - self.decay ** n
+            delta = bm - self.mean
+            self.mean = self.mean + a * delta
+            self.var = np.maximum((1 - a) * (self.var + a * delta ** 2) + a * bv, 1e-3)
+        self.seen += n
+
+    def gate(self, vectors: List[List[float]], force: Optional[List[bool]] = None):
+        # 반환: [(통과 여부, 점수)] — force[i]가 참이면(sigma 등) 점수와 무관하게 통과
+        scores = self.score_batch(vectors)
+        out = []
+        for i, s in enumerate(scores):
+            forced = bool(force and force[i])
+            if math.isinf(s):
+                GATE.labels("warmup").inc()
+                out.append((True, s))
+                continue
+            SCORES.observe(s)
+            ok = forced or s >= self.threshold
+            GATE.labels("pass" if ok else "skip").inc()
+            out.append((ok, s))
+        return out
+
+
+_scorer: Optional[AnomalyScorer] = None
+_scorer_lock = threading.Lock()
+
+
+def get_scorer():
+    # ANOMALY_GATE=0 이거나 numpy가 없으면 None (게이트 없음)
+    global _scorer
+    if _scorer is None and ANOMALY_GATE and np is not None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = AnomalyScorer()
+    return _scorer
+
+
+def set_scorer(scorer: Optional[AnomalyScorer]):
+    # 테스트/벤치마크용 교체
+    global _scorer
+    _scorer = scorer
@@ -0,0 +1,304 @@
+import argparse, gzip, json, os, threading, time
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set
+
+from config import (
+    ROLLING_MAX_TRACES,
+    ROLLING_TTL_SEC,
+    SUMMARY_CHUNK_EVENTS,
+    SUMMARY_CONCURRENCY,
+    SUMMARY_MAX_INFLIGHT,
+    TRACE_MAX_EVENTS,
+    PAYLOAD_DECODER,
+)
+from decoders import get_decoder
+from metrics import ERRORS
+from offset_tracker import OffsetTracker
+from rolling_summary import RollingSummaryStore
+from trace_aggregator import TraceAggregator
+from worker_pool import SummaryWorkerPool
+
+# 보관된 OTLP 덤프(디렉터리의 .json / .jsonl / .gz)로 my_log_db를 다시 만드는 오프라인 backfill.
+#   파일 디코딩/이벤트 추출은 프로세스 풀, trace 그룹핑은 부모의 TraceAggregator (파일 경계를 넘는 trace도 하나로),
+#   요약은 bounded 워커 풀, Chroma 기록은 큰 배치의 BatchWriter.
+# "비활성"은 시간 대신 파일 수로 잼: gap_files개 파일 동안 이벤트가 없던 trace를 flush
+# checkpoint: 파일 인덱스를 offset처럼 OffsetTracker로 추적 → 그 파일의 이벤트를 담은 trace 요약이 모두
+# Chroma에 기록된 파일만 완료로 저장. 재실행하면 완료 파일은 건너뜀 (같은 trace id로 upsert → 중복 없음)
+# 읽지 못한 파일과 요약에 실패한 trace는 파일 인덱스를 놓지 않음 → checkpoint가 그 앞에서 멈추고 재실행 시 다시 처리
+# 실행: python backfill.py ./dumps --workers 4 --concurrency 8 --checkpoint .backfill.json [--dry-run]
+
+_FILES = ("backfill", 0)  # OffsetTracker/aggregator에서 파일 인덱스용 가상 파티션
+_SUFFIXES = (".json", ".jsonl", ".json.gz", ".jsonl.gz", ".gz")
+
+
+def iter_files(paths: Iterable[str], skip: Optional[Set[str]] = None) -> Iterator[str]:
+    # 디렉터리를 정렬 순서로 lazily 순회 (덤프 파일명이 시간 순이라고 가정)
+    for p in paths:
+        if os.path.isdir(p):
+            for root, dirs, files in os.walk(p):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(_SUFFIXES):
+                        path = os.path.abspath(os.path.join(root, name))
+                        if not skip or path not in skip:
+                            yield path
+        elif os.path.isfile(p):
+            path = os.path.abspath(p)
+            if not skip or path not in skip:
+                yield path
+        else:
+            print(f"[WARN] 경로 없음: {p}")
+
+
+def load_file(path: str, decoder_name: str = PAYLOAD_DECODER):
+    # 프로세스 풀 워커: 파일 하나 → compact 이벤트 목록. .jsonl은 줄마다 OTLP payload 하나
+    decoder = get_decoder(decoder_name)
+    opener = gzip.open if path.endswith(".gz") else open
+    events: List[Any] = []
+    with opener(path, "rb") as fp:
+        if path.endswith((".jsonl", ".jsonl.gz")):
+            for line in fp:
+                line = line.strip()
+                if line:
+                    events.extend(decoder.iter_events(line, compact=True))
+        else:
+            events.extend(decoder.iter_events_from_file(fp, compact=True))
+    return events
+
+
+def load_checkpoint(path: Optional[str]):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as fp:
+        return set(json.load(fp).get("done", []))
+
+
+def save_checkpoint(path: str, done: Iterable[str], stats: Dict[str, Any]):
+    # 임시 파일에 쓰고 교체 (중간에 죽어도 이전 checkpoint 유지)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump({"done": sorted(done), "updated": time.time(), **stats}, fp, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class Backfill:
+    def __init__(
+        self,
+        workers: int = 0,
+        concurrency: int = SUMMARY_CONCURRENCY,
+        max_inflight: int = SUMMARY_MAX_INFLIGHT,
+        decoder: str = PAYLOAD_DECODER,
+        gap_files: int = 2,
+        max_events: int = TRACE_MAX_EVENTS,
+        checkpoint: Optional[str] = None,
+        dry_run: bool = False,
+        chroma_batch: int = 256,
+        progress_sec: float = 2.0,
+    ):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.decoder = decoder
+        self.checkpoint = checkpoint
+        self.dry_run = dry_run
+        self.chroma_batch = chroma_batch
+        self.progress_sec = progress_sec
+        self._file_no = 0  # aggregator clock = 지금까지 넣은 파일 수
+        self.tracker = OffsetTracker()
+        # max_events로 여러 번 flush되는 trace는 이 실행 안에서 앞 조각 요약과 병합 (마지막 조각으로 덮어쓰지 않음)
+        self.rolling = RollingSummaryStore(ROLLING_MAX_TRACES, ROLLING_TTL_SEC)
+        self.pool = SummaryWorkerPool(
+            self._dry_run if dry_run else self._summarize, concurrency, max_inflight
+        )
+        on_chunk = None
+        if not dry_run:
+            from pipeline import chunk_prefetcher
+
+            on_chunk = chunk_prefetcher(self.pool)
+        self.agg = TraceAggregator(
+            gap_files,
+            max_events,
+            clock=lambda: self._file_no,
+            chunk_events=SUMMARY_CHUNK_EVENTS,
+            on_chunk=on_chunk,
+        )
+        self.paths: List[str] = []
+        self.done: Set[str] = set()
+        self.spans = 0
+        self.traces = 0
+        self.file_errors = 0
+        self.prompt_tokens = 0  # dry-run: 요약 프롬프트로 보냈을 토큰 수
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._last_progress = self._last_checkpoint = time.monotonic()
+
+    def _summarize(self, trace_id: str, evs: List[Any], features, token=None):
+        from pipeline import summarize_trace
+
+        # 실패하면 token을 놓지 않음 (이 trace의 파일부터 checkpoint에 남지 않음)
+        summarize_trace(
+            trace_id, evs, features, lambda: self.tracker.release(token), self.rolling
+        )
+
+    def _dry_run(self, trace_id: str, evs: List[Any], features, token=None):
+        # LLM/Chroma 없이 그룹핑/메타/프롬프트 구성까지만 (토큰 수 집계)
+        from prompt_builder import compact_clean_text, count_tokens
+
+        features.meta()
+        body = compact_clean_text(
+            features.clean_text(), stage="backfill_dry_run", sigma_lines=features.sigma_lines
+        )
+        n = count_tokens(body)
+        with self._lock:
+            self.prompt_tokens += n
+        self.tracker.release(token)
+
+    def _add(self, idx: int, path: str, events: List[Any]):
+        self.agg.add_events(events, (_FILES, idx))
+        self.tracker.seen(_FILES, idx)
+        self._file_no = idx + 1
+        self.spans += len(events)
+        self._drain(self.agg.pop_ready())
+
+    def _drain(self, ready):
+        for tid, evs, feat, offsets in ready:
+            item = (tid, evs, feat, self.tracker.hold(offsets))
+            self.traces += 1
+            while not self.pool.submit(*item):
+                self.pool.wait_for_room(1.0)  # 요약 워커 풀이 가득 차면 파일 읽기도 멈춤 (bounded)
+
+    def _completed(self):
+        # 이 실행에서 모든 trace가 기록된 파일 = 파일 인덱스 위치 이전의 파일
+        pos = self.tracker.position(self.agg.low_offsets()).get(_FILES, 0)
+        return self.paths[:pos]
+
+    def _tick(self, final: bool = False):
+        now = time.monotonic()
+        if final or now - self._last_progress >= self.progress_sec:
+            self._last_progress = now
+            self.progress()
+        if self.checkpoint and not self.dry_run and (final or now - self._last_checkpoint >= 10):
+            self._last_checkpoint = now
+            save_checkpoint(
+                self.checkpoint,
+                self.done | set(self._completed()),
+                {"spans": self.spans, "traces": self.traces},
+            )
+
+    def progress(self):
+        dt = max(1e-9, time.perf_counter() - self._t0)
+        extra = f" prompt_tokens={self.prompt_tokens}" if self.dry_run else ""
+        print(
+            f"[BACKFILL] files={len(self.paths)} spans={self.spans} ({self.spans / dt:,.0f}/s) "
+            f"traces={self.traces} ({self.traces / dt:,.0f}/s) summarized={self.pool.done} "
+            f"failed={self.pool.failed} inflight={self.pool.inflight} open={len(self.agg.buckets)}{extra}",
+            flush=True,
+        )
+
+    def run(self, inputs: Iterable[str]):
+        self.done = load_checkpoint(self.checkpoint)
+        if self.done:
+            print(f"[INFO] checkpoint {self.checkpoint}: 완료 파일 {len(self.done)}개 건너뜀")
+        if not self.dry_run:
+            from chroma_setup import get_writer
+            from summarize_embed import warmup
+
+            warmup()
+            get_writer().max_batch = max(1, self.chroma_batch)  # backfill은 큰 배치로 bulk upsert
+        window: Deque = deque()
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=ctx) as ex:
+            # 읽기 창을 workers*2개로 제한 → 디코딩된 이벤트가 메모리에 무한정 쌓이지 않음, 파일 순서 유지
+            skip = set(self.done)
+            if self.checkpoint:
+                skip |= {os.path.abspath(self.checkpoint), os.path.abspath(self.checkpoint) + ".tmp"}
+            for path in iter_files(inputs, skip):
+                window.append((len(self.paths), path, ex.submit(load_file, path, self.decoder)))
+                self.paths.append(path)
+                if len(window) >= self.workers * 2:
+                    self._consume(window.popleft())
+            while window:
+                self._consume(window.popleft())
+        self._file_no += 1 << 30  # 남은 trace 모두 만료
+        self._drain(self.agg.pop_ready())
+        self.pool.shutdown(wait=True)
+        if not self.dry_run:
+            from chroma_setup import get_writer
+
+            get_writer().flush()
+        self._tick(final=True)
+        if self.file_errors or self.pool.failed:
+            print(
+                f"[WARN] 파일 {self.file_errors}개 / trace {self.pool.failed}개 실패: "
+                f"checkpoint는 실패 지점 앞까지만 저장됨, 다시 실행하면 그 파일부터 재처리"
+            )
+        return self.summary()
+
+    def _consume(self, item):
+        idx, path, fut = item
+        try:
+            events = fut.result()
+        except Exception as e:
+            # seen/완료 처리하지 않고 파일 인덱스를 계속 잡아 둠 → 재실행 시 다시 읽음
+            print(f"[ERR] {path}: {e}")
+            ERRORS.labels("backfill_file").inc()
+            self.file_errors += 1
+            self.tracker.hold({_FILES: idx})
+            self._file_no = idx + 1
+            self._tick()
+            return
+        self._add(idx, path, events)
+        self._tick()
+
+    def summary(self):
+        dt = time.perf_counter() - self._t0
+        return {
+            "files": len(self.paths),
+            "skipped_files": len(self.done),
+            "file_errors": self.file_errors,
+            "spans": self.spans,
+            "traces": self.traces,
+            "summarized": self.pool.done,
+            "failed": self.pool.failed,
+            "elapsed_sec": round(dt, 3),
+            "spans_per_sec": round(self.spans / dt, 1) if dt else 0.0,
+            "traces_per_sec": round(self.traces / dt, 1) if dt else 0.0,
+            "dry_run": self.dry_run,
+            **({"prompt_tokens": self.prompt_tokens} if self.dry_run else {}),
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="보관된 OTLP 덤프로 trace 요약 재생성 (Kafka 재처리 없이)")
+    ap.add_argument("paths", nargs="+", help="디렉터리 또는 파일 (.json / .jsonl / .gz)")
+    ap.add_argument("--workers", type=int, default=0, help="디코딩 프로세스 수 (0=CPU 코어 수)")
+    ap.add_argument("--concurrency", type=int, default=SUMMARY_CONCURRENCY, help="동시 요약 수")
+    ap.add_argument("--max-inflight", type=int, default=SUMMARY_MAX_INFLIGHT)
+    ap.add_argument("--decoder", default=PAYLOAD_DECODER, help="json | orjson | stream")
+    ap.add_argument("--gap-files", type=int, default=2, help="이 파일 수 동안 이벤트 없는 trace를 flush")
+    ap.add_argument("--max-events", type=int, default=TRACE_MAX_EVENTS)
+    ap.add_argument("--checkpoint", default="", help="완료 파일 목록 JSON (재실행 시 이어서)")
+    ap.add_argument("--restart", action="store_true", help="checkpoint 무시하고 처음부터")
+    ap.add_argument("--dry-run", action="store_true", help="LLM/Chroma 없이 그룹핑/프롬프트까지만")
+    ap.add_argument("--chroma-batch", type=int, default=256, help="Chroma bulk upsert 배치 크기")
+    ap.add_argument("--progress-sec", type=float, default=2.0)
+    args = ap.parse_args(argv)
+    if args.restart and args.checkpoint and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    bf = Backfill(
+        workers=args.workers,
+        concurrency=args.concurrency,
+        max_inflight=args.max_inflight,
+        decoder=args.decoder,
+        gap_files=args.gap_files,
+        max_events=args.max_events,
+        checkpoint=args.checkpoint or None,
+        dry_run=args.dry_run,
+        chroma_batch=args.chroma_batch,
+        progress_sec=args.progress_sec,
+    )
+    print(json.dumps(bf.run(args.paths), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# 로컬 이상 점수 게이트: 게이트 없이/있을 때 1000 trace당 LLM 호출 수 + 주입한 이상 trace 재현율
+# 정상 트래픽(소수의 프로세스/내부 목적지/일정한 간격) 사이에 이상 trace(희귀 프로세스, 외부 IP 다수,
+# 짧은 간격 연결 폭주, 희귀 포트)를 섞어 judge_many에 흘림. fake ChatOpenAI/검색기/컬렉션 사용
+# 실행: python -m benchmarks.bench_anomaly [traces] [anomaly_ratio] [threshold]
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fakes import FakeChatModel, FakeCollection, FakeRetriever, install_fake_judge
+from anomaly_scorer import AnomalyScorer, set_scorer
+from decision_cache import set_decision_cache
+from llm_scheduler import PRIORITY_NORMAL
+from preprocess import build_clean_text
+
+PROCS = ["chrome.exe", "svchost.exe", "Code.exe", "explorer.exe", "OneDrive.exe", "Teams.exe"]
+RARE = ["mshta.exe", "rundll32.exe", "certutil.exe", "bitsadmin.exe", "regsvr32.exe"]
+INTERNAL = [f"10.0.{i}.{j}" for i in range(4) for j in range(1, 6)]
+PORTS = [443, 443, 443, 80, 53, 445]
+BASE = datetime(2025, 8, 14, 4, 0, 0)
+
+
+def _ev(name, proc, t, **kv):
+    return {
+        "event_name": name,
+        "process_name": proc,
+        "process_id": str(random.randint(1000, 30000)),
+        "timestamp_utc": (BASE + timedelta(seconds=t)).strftime("%Y-%m-%d %H:%M:%S.%f")[:23],
+        **kv,
+    }
+
+
+def _normal(t0: float):
+    proc = random.choice(PROCS)
+    t = t0
+    evs = [_ev("ProcessCreate", proc, t, command_line=f"{proc} --run")]
+    for _ in range(random.randint(3, 10)):
+        t += random.uniform(0.2, 3.0)
+        if random.random() < 0.3:
+            evs.append(_ev("Dnsquery", proc, t, query_name="update.example.com"))
+        else:
+            evs.append(
+                _ev(
+                    "Networkconnectiondetected", proc, t,
+                    destination_ip=random.choice(INTERNAL), destination_port=random.choice(PORTS),
+                )
+            )
+    evs.append(_ev("Processterminated", proc, t + random.uniform(0.5, 5.0)))
+    return evs
+
+
+def _anomaly(t0: float):
+    kind = random.randrange(3)
+    proc = random.choice(RARE) if kind != 1 else random.choice(PROCS)
+    t = t0
+    evs = [_ev("ProcessCreate", proc, t, command_line=f"{proc} /c payload")]
+    for _ in range(random.randint(20, 60) if kind != 2 else random.randint(4, 8)):
+        t += random.uniform(0.001, 0.02)  # 짧은 간격 폭주
+        ip = (
+            f"{random.randint(11, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+            if kind != 2
+            else random.choice(INTERNAL)
+        )
+        port = random.choice((4444, 8081, 1337, 6667)) if kind != 0 else 443
+        evs.append(_ev("Networkconnectiondetected", proc, t, destination_ip=ip, destination_port=port))
+    return evs
+
+
+def _traffic(n: int, ratio: float):
+    out = []
+    for i in range(n):
+        bad = random.random() < ratio
+        evs = (_anomaly if bad else _normal)(i * 0.5)
+        out.append((f"t{i:06d}", evs, bad))
+    return out
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 3.0
+    random.seed(7)
+    llm, retriever = FakeChatModel(0.0), FakeRetriever(0.0)
+    install_fake_judge(llm, retriever, FakeCollection())
+    set_decision_cache(None)  # 게이트 효과만 측정
+    import chroma_setup
+    import judge_graph
+
+    chroma_setup.get_writer().verbose = False
+    judge_graph.get_graph()
+    traffic = _traffic(n, ratio)
+    bad_total = sum(1 for *_, bad in traffic if bad)
+    print(f"[BENCH] traces={n} injected_anomalies={bad_total} threshold={threshold}")
+
+    # 1) 게이트 없음: 모든 trace가 LLM 판단
+    set_scorer(None)
+    calls0 = llm.calls
+    items = [(tid, build_clean_text(evs), PRIORITY_NORMAL) for tid, evs, _ in traffic]
+    t0 = time.perf_counter()
+    for s in range(0, n, 64):
+        judge_graph.judge_many(items[s : s + 64], concurrency=16)
+    dt = time.perf_counter() - t0
+    base = llm.calls - calls0
+    print(f"  no gate  llm_calls={base:<6} per_1000={1000 * base / n:7.1f}  {dt:6.2f}s")
+
+    # 2) 게이트: 벡터화 + 일괄 점수 (warmup 구간 포함)
+    scorer = AnomalyScorer(threshold=threshold)
+    set_scorer(scorer)
+    calls0 = llm.calls
+    t0 = time.perf_counter()
+    vecs = [scorer.vectorize(evs) for _, evs, _ in traffic]
+    t_vec = time.perf_counter() - t0
+    passed = bad_pass = 0
+    for s in range(0, n, 64):
+        batch = [(tid, txt, p, None, v) for (tid, txt, p), v in zip(items[s : s + 64], vecs[s : s + 64])]
+        for r, (_, _, bad) in zip(judge_graph.judge_many(batch, concurrency=16), traffic[s : s + 64]):
+            gated = r["reason"].startswith("로컬 이상 점수")
+            passed += not gated
+            bad_pass += bad and not gated
+    dt = time.perf_counter() - t0
+    gated_calls = llm.calls - calls0
+    print(
+        f"  gate     llm_calls={gated_calls:<6} per_1000={1000 * gated_calls / n:7.1f}  {dt:6.2f}s "
+        f"(vectorize {1e6 * t_vec / n:.1f}us/trace)"
+    )
+    print(
+        f"  reduction={base / max(1, gated_calls):.1f}x  passed={passed} "
+        f"anomaly_recall={bad_pass}/{bad_total} ({100 * bad_pass / max(1, bad_total):.1f}%)"
+    )
+    chroma_setup.get_writer().flush()
+
+
+if __name__ == "__main__":
+    main()
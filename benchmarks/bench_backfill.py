@@ -0,0 +1,119 @@
+# 오프라인 backfill: 합성 덤프 디렉터리(.json / .jsonl / .jsonl.gz, trace가 인접 파일에 걸쳐 있음)를
+#   기존 방식(main.py처럼 파일마다 순차 process_events) vs backfill.Backfill(dry-run / fake LLM)로 처리
+# 실행: python -m benchmarks.bench_backfill [files] [traces_per_file] [llm_latency_sec] [workers]
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+
+from backfill import Backfill, iter_files, load_file
+from benchmarks.bench_shards import _split
+from benchmarks.fakes import FakeLLM, install_fake_backends
+from benchmarks.synth import SynthConfig, generate
+
+
+def _write_dump(root: str, n_files: int, per_file: int):
+    # payload 하나를 짝/홀 span으로 나눠 i번째와 i+1번째 파일에 기록 → 파일 경계를 넘는 trace
+    payloads = generate(
+        SynthConfig(traces=n_files * per_file, spans_per_trace=12, traces_per_payload=per_file, orphan_ratio=0.0)
+    )
+    files = [[] for _ in range(n_files + 1)]
+    for i, p in enumerate(payloads):
+        a, b = _split(p)
+        files[i].append(a)
+        files[i + 1].append(b)
+    for i, chunk in enumerate(files):
+        if not chunk:
+            continue
+        kind = i % 3
+        name = os.path.join(root, f"dump-{i:05d}")
+        if kind == 0:
+            # .json 한 파일에 payload 하나: resourceSpans를 합침
+            merged = {"resourceSpans": [rs for p in chunk for rs in p["resourceSpans"]]}
+            with open(name + ".json", "w", encoding="utf-8") as fp:
+                json.dump(merged, fp)
+        elif kind == 1:
+            with open(name + ".jsonl", "w", encoding="utf-8") as fp:
+                fp.writelines(json.dumps(p) + "\n" for p in chunk)
+        else:
+            with gzip.open(name + ".jsonl.gz", "wt", encoding="utf-8") as fp:
+                fp.writelines(json.dumps(p) + "\n" for p in chunk)
+
+
+def _check_multi_flush(root: str):
+    # max_events보다 긴 trace(12 span, max_events=5 → 3번 flush)가 마지막 조각으로 덮어써지지 않고
+    # 문서 하나에 모든 이벤트/프로세스가 남는지 확인
+    from chroma_setup import get_collection
+
+    payload = generate(SynthConfig(traces=1, spans_per_trace=12, traces_per_payload=1, orphan_ratio=0.0))[0]
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    for i, span in enumerate(spans):
+        span["name"] = f"proc{i}.exe@ProcessCreate"
+    path = os.path.join(root, "long-trace.json")
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump(payload, fp)
+    Backfill(workers=1, decoder="json", max_events=5, progress_sec=1e9).run([path])
+    meta = get_collection().docs[spans[0]["traceId"]]["metadata"]
+    names = {f"proc{i}.exe" for i in range(len(spans))}
+    stored = meta["process_names"]
+    missing = sorted(n for n in names if n not in stored)
+    if meta["event_count"] != len(spans) or missing:
+        raise AssertionError(f"multi-flush trace lost events: event_count={meta['event_count']} missing={missing}")
+    print(f"  multi-flush     event_count={meta['event_count']} segments={meta.get('segments')} process_names ok")
+
+
+def _serial(root: str):
+    # 기존 main.py 방식: 파일마다 디코딩 → group_by_trace → 순차 요약 (파일 경계에서 trace가 쪼개짐)
+    from pipeline import process_events
+
+    spans = summaries = 0
+    t0 = time.perf_counter()
+    for path in iter_files([root]):
+        events = load_file(path, "json")
+        spans += len(events)
+        summaries += len(process_events(events))
+    return time.perf_counter() - t0, spans, summaries
+
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+    llm = FakeLLM(latency)
+    install_fake_backends(llm)
+    import chroma_setup
+
+    chroma_setup.get_writer().verbose = False
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as ckpt_dir:
+        with tempfile.TemporaryDirectory() as one:
+            _check_multi_flush(one)
+        _write_dump(root, n_files, per_file)
+        traces = n_files * per_file
+        print(f"[BENCH] files={n_files + 1} traces={traces} fake_llm_latency={latency}s workers={workers}")
+        dt, spans, summaries = _serial(root)
+        print(
+            f"  serial          {dt:6.2f}s {spans / dt:9.0f} spans/s {summaries / dt:7.0f} traces/s "
+            f"summaries={summaries} (unique traces {traces})"
+        )
+        for label, kw in (
+            ("backfill dry", dict(dry_run=True)),
+            ("backfill", dict(concurrency=16, max_inflight=64)),
+        ):
+            ckpt = os.path.join(ckpt_dir, f"ckpt-{label.replace(' ', '-')}.json")
+            calls0 = llm.calls
+            res = Backfill(workers=workers, decoder="json", checkpoint=ckpt, progress_sec=1e9, **kw).run([root])
+            print(
+                f"  {label:<15} {res['elapsed_sec']:6.2f}s {res['spans_per_sec']:9.0f} spans/s "
+                f"{res['traces_per_sec']:7.0f} traces/s summaries={res['summarized']} llm_calls={llm.calls - calls0}"
+            )
+            if not kw.get("dry_run"):
+                again = Backfill(workers=workers, decoder="json", checkpoint=ckpt, progress_sec=1e9).run([root])
+                print(f"  resume          files={again['files']} skipped={again['skipped_files']}")
+
+
+if __name__ == "__main__":
+    main()
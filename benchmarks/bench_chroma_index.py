@@ -0,0 +1,112 @@
+# Chroma HNSW 파라미터/컬렉션 크기별 검색 recall@k와 query 지연 (로컬 PersistentClient, 임시 디렉터리)
+# 군집된 합성 임베딩을 크기 단계별로 추가하며 측정, 정답은 numpy brute-force cosine top-k.
+# 마지막에 기본 설정 컬렉션을 chroma_retention.prune(max_docs)로 가장 작은 크기까지 줄인 뒤와
+# chroma_retention.rebuild 후를 비교 (삭제가 쌓인 인덱스 vs 재구성 인덱스)
+# 실행: python -m benchmarks.bench_chroma_index [sizes] [queries] [dim] [k]
+#   예: python -m benchmarks.bench_chroma_index 2000,10000,30000 200 256 10
+import sys
+import tempfile
+import time
+
+import numpy as np
+from chromadb import PersistentClient
+
+import chroma_retention
+from chroma_setup import get_embed_fn, hnsw_metadata
+
+CONFIGS = (
+    # label, M, construction_ef, search_ef (0 = Chroma 기본값)
+    ("default", 0, 0, 0),
+    ("search_ef=10", 0, 0, 10),
+    ("M=32 cef=200 ef=200", 32, 200, 200),
+)
+
+
+def _data(n: int, dim: int, seed: int = 0):
+    # 요약 임베딩처럼 비슷한 trace끼리 뭉친 분포: 중심 n/50개 + 잡음, 정규화
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 50), dim))
+    x = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.normal(size=(n, dim))
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _queries(data: np.ndarray, n: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    q = data[rng.integers(0, len(data), n)] + 0.1 * rng.normal(size=(n, data.shape[1]))
+    return (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _truth(data: np.ndarray, ids: np.ndarray, queries: np.ndarray, k: int):
+    sims = queries @ data.T
+    top = np.argpartition(-sims, k, axis=1)[:, :k]
+    return [set(ids[row]) for row in top]
+
+
+def _measure(col, queries: np.ndarray, truth, k: int):
+    lat, hit = [], 0
+    for q, want in zip(queries, truth):
+        t0 = time.perf_counter()
+        res = col.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+        lat.append(time.perf_counter() - t0)
+        hit += len(want & set(res["ids"][0]))
+    lat_ms = np.array(lat) * 1000
+    return hit / (k * len(truth)), float(np.percentile(lat_ms, 50)), float(np.percentile(lat_ms, 95))
+
+
+def _add(col, data: np.ndarray, start: int, end: int):
+    for s in range(start, end, 1000):
+        e = min(end, s + 1000)
+        col.add(
+            ids=[f"d{i}" for i in range(s, e)],
+            embeddings=data[s:e],
+            metadatas=[{"type": "trace_summary", "indexed_at": i} for i in range(s, e)],
+        )
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1].split(",")] if len(sys.argv) > 1 else [2000, 10000, 30000]
+    n_q = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    dim = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+    k = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+    data = _data(max(sizes), dim)
+    all_ids = np.array([f"d{i}" for i in range(len(data))])
+    queries = _queries(data[: min(sizes)], n_q)  # 가장 작은 크기에도 있는 문서 근처를 질의
+    print(f"[BENCH] sizes={sizes} queries={n_q} dim={dim} recall@{k} (PersistentClient)")
+    with tempfile.TemporaryDirectory() as root:
+        client = PersistentClient(path=root)
+        embed_fn = get_embed_fn()  # 질의/추가는 임베딩을 직접 넘김 (rebuild와 같은 설정으로 열기 위해서만)
+        for label, m, cef, ef in CONFIGS:
+            col = client.create_collection(
+                f"bench-{label.replace(' ', '-').replace('=', '')}",
+                metadata=hnsw_metadata(m, cef, ef),
+                embedding_function=embed_fn,
+            )
+            done = 0
+            for n in sorted(sizes):
+                t0 = time.perf_counter()
+                _add(col, data, done, n)
+                add_s = time.perf_counter() - t0
+                recall, p50, p95 = _measure(col, queries, _truth(data[:n], all_ids[:n], queries, k), k)
+                print(
+                    f"  {label:<22} n={n:<7} recall={recall:.3f} p50={p50:6.2f}ms p95={p95:6.2f}ms "
+                    f"add={(n - done) / add_s:7.0f} docs/s"
+                )
+                done = n
+
+        # 보존 정리: 기본 설정 컬렉션을 가장 작은 크기로 (오래된 = indexed_at 작은 문서부터 삭제)
+        small = min(sizes)
+        col = client.get_collection("bench-default", embedding_function=embed_fn)
+        kept = data[len(data) - small :], all_ids[len(data) - small :]
+        q2 = _queries(kept[0], n_q)
+        truth = _truth(kept[0], kept[1], q2, k)
+        chroma_retention.prune(col, days=0, max_docs=small)
+        recall, p50, p95 = _measure(col, q2, truth, k)
+        print(f"  {'default pruned':<22} n={col.count():<7} recall={recall:.3f} p50={p50:6.2f}ms p95={p95:6.2f}ms")
+        chroma_retention.rebuild(col.name, client=client, embed_fn=embed_fn)
+        col = client.get_collection("bench-default", embedding_function=embed_fn)
+        recall, p50, p95 = _measure(col, q2, truth, k)
+        print(f"  {'default rebuilt':<22} n={col.count():<7} recall={recall:.3f} p50={p50:6.2f}ms p95={p95:6.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
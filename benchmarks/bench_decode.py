@@ -0,0 +1,48 @@
+# span 디코더 벤치마크: 기존(키별 스캔) vs 단일 패스
+# 실행: python -m benchmarks.bench_decode [scale]
+import json
+import sys
+import time
+from pathlib import Path
+
+from preprocess import _span_to_event_scan, span_to_event
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_spans(scale: int):
+    payload = json.loads((ROOT / "trace.json").read_text(encoding="utf-8"))
+    spans = [
+        span
+        for rs in payload.get("resourceSpans", []) or []
+        for ss in rs.get("scopeSpans", []) or []
+        for span in ss.get("spans", []) or []
+    ]
+    return spans * scale
+
+
+def bench(fn, spans):
+    t0 = time.perf_counter()
+    out = [fn(s) for s in spans]
+    return time.perf_counter() - t0, out
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    spans = load_spans(scale)
+    print(f"[BENCH] spans={len(spans)} (trace.json x{scale})")
+
+    t_scan, ref = bench(_span_to_event_scan, spans)
+    t_fast, got = bench(span_to_event, spans)
+    if ref != got:
+        raise SystemExit("[ERR] 디코더 출력이 기존 span_to_event와 다릅니다.")
+
+    for label, t in (("scan", t_scan), ("single-pass", t_fast)):
+        print(
+            f"  {label:<12} {t:8.3f}s  {len(spans) / t:12,.0f} spans/s"
+        )
+    print(f"  speedup      {t_scan / t_fast:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
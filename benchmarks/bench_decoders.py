@@ -0,0 +1,82 @@
+# 페이로드 디코더 비교: 처리량(spans/s)과 와이어 크기(bytes/span)
+# 실행: python -m benchmarks.bench_decoders [traces]
+import json
+import sys
+import time
+
+from benchmarks.synth import SynthConfig, generate
+from decoders import available_decoders, get_decoder
+
+
+def otlp_json_to_proto(payload):
+    # OTLP/JSON(dict, hex id) -> ExportTraceServiceRequest 바이트
+    from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+        ExportTraceServiceRequest,
+    )
+
+    def fill_attrs(dst, attrs):
+        for kv in attrs or []:
+            a = dst.add()
+            a.key = kv["key"]
+            v = kv.get("value", {})
+            if "stringValue" in v:
+                a.value.string_value = v["stringValue"]
+            elif "intValue" in v:
+                a.value.int_value = int(v["intValue"])
+            elif "boolValue" in v:
+                a.value.bool_value = bool(v["boolValue"])
+            elif "doubleValue" in v:
+                a.value.double_value = float(v["doubleValue"])
+
+    req = ExportTraceServiceRequest()
+    for rs in payload.get("resourceSpans", []):
+        prs = req.resource_spans.add()
+        fill_attrs(prs.resource.attributes, rs.get("resource", {}).get("attributes"))
+        for ss in rs.get("scopeSpans", []):
+            pss = prs.scope_spans.add()
+            pss.scope.name = ss.get("scope", {}).get("name", "")
+            for sp in ss.get("spans", []):
+                p = pss.spans.add()
+                p.trace_id = bytes.fromhex(sp.get("traceId") or "")
+                p.span_id = bytes.fromhex(sp.get("spanId") or "")
+                p.parent_span_id = bytes.fromhex(sp.get("parentSpanId") or "")
+                p.name = sp.get("name", "")
+                p.kind = sp.get("kind", 0)
+                p.start_time_unix_nano = int(sp.get("startTimeUnixNano") or 0)
+                p.end_time_unix_nano = int(sp.get("endTimeUnixNano") or 0)
+                fill_attrs(p.attributes, sp.get("attributes"))
+    return req.SerializeToString()
+
+
+def main():
+    traces = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cfg = SynthConfig(traces=traces, spans_per_trace=20, attr_count=30)
+    payloads = generate(cfg)
+    n_spans = cfg.traces * cfg.spans_per_trace
+    json_msgs = [json.dumps(p, ensure_ascii=False).encode("utf-8") for p in payloads]
+    names = available_decoders()
+    proto_msgs = None
+    if "otlp-proto" in names:
+        proto_msgs = [otlp_json_to_proto(p) for p in payloads]
+
+    ref = [e for m in json_msgs for e in get_decoder("json").iter_events(m)]
+    print(f"[BENCH] spans={n_spans} messages={len(payloads)}")
+    base = None
+    for name in names:
+        dec = get_decoder(name)
+        msgs = proto_msgs if name == "otlp-proto" else json_msgs
+        t0 = time.perf_counter()
+        got = [e for m in msgs for e in dec.iter_events(m)]
+        dt = time.perf_counter() - t0
+        if got != ref:
+            raise SystemExit(f"[ERR] {name} 디코더 출력이 json 디코더와 다릅니다.")
+        size = sum(len(m) for m in msgs)
+        base = base or dt
+        print(
+            f"  {name:<11} {n_spans / dt:12,.0f} spans/s  x{base / dt:5.2f}  "
+            f"{size / n_spans:7.0f} bytes/span"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# 판단 그래프(judge_graph) 처리량 + 노드별 지연: fake ChatOpenAI/검색기/컬렉션 사용
+# 실행: python -m benchmarks.bench_judge [traces] [llm_latency_sec]
+import asyncio
+import sys
+import time
+
+from benchmarks.fakes import FakeChatModel, FakeCollection, FakeRetriever, install_fake_judge
+from benchmarks.synth import SynthConfig, generate
+from metrics import STAGE_LATENCY
+from decision_cache import DecisionCache, set_decision_cache, trace_fingerprint
+from llm_scheduler import PRIORITY_NORMAL
+from preprocess import build_clean_text, build_summary_meta, extract_events_from_otlp, group_by_trace
+from summary_cache import SummaryCache
+
+NODES = ("search_similar_logs_bulk", "search_similar_logs", "llm_judgment", "final_decision", "save_final_decision")
+
+
+def _items(n: int):
+    # (trace_id, clean_text, priority, fingerprint)
+    payloads = generate(SynthConfig(traces=n, spans_per_trace=12))
+    events = [e for p in payloads for e in extract_events_from_otlp(p)]
+    return [
+        (tid, build_clean_text(evs), PRIORITY_NORMAL, trace_fingerprint(build_summary_meta(evs)))
+        for tid, evs in group_by_trace(events).items()
+    ][:n]
+
+
+def _node_stats():
+    out = {}
+    for name in NODES:
+        h = STAGE_LATENCY.labels(name)
+        n = sum(h.counts)
+        out[name] = (n, h.sum / n * 1000 if n else 0.0)
+    return out
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.02
+    items = _items(n)
+    llm, retriever = FakeChatModel(latency), FakeRetriever(latency / 4)
+    collection = install_fake_judge(llm, retriever, FakeCollection())
+    import chroma_setup
+    import judge_graph
+
+    chroma_setup.get_writer().verbose = False
+    judge_graph.get_graph()
+    print(f"[BENCH] traces={len(items)} fake_llm_latency={latency}s")
+    plain = [it[:3] for it in items]  # fingerprint 없음 → 판단 캐시 미사용
+    for c in (1, 4, 16):
+        t0 = time.perf_counter()
+        res = judge_graph.judge_many(plain, concurrency=c)
+        dt = time.perf_counter() - t0
+        dist = {}
+        for r in res:
+            dist[r["decision"]] = dist.get(r["decision"], 0) + 1
+        print(f"  judge_many  concurrency={c:<3} {dt:6.2f}s {len(res) / dt:7.1f} traces/s {dist}")
+    t0 = time.perf_counter()
+    res = asyncio.run(judge_graph.ajudge_many(plain, concurrency=16))
+    dt = time.perf_counter() - t0
+    print(f"  ajudge_many concurrency=16  {dt:6.2f}s {len(res) / dt:7.1f} traces/s")
+    # 판단 캐시: 같은 행위 구조의 trace가 다시 들어오는 경우 (cold → warm)
+    cache = DecisionCache(SummaryCache(10000, 3600))
+    set_decision_cache(cache)
+    for label in ("cold", "warm"):
+        calls0 = llm.calls
+        batch = [(f"{label}-{tid}", txt, p, fp) for tid, txt, p, fp in items]
+        t0 = time.perf_counter()
+        judge_graph.judge_many(batch, concurrency=4)
+        dt = time.perf_counter() - t0
+        print(
+            f"  decision_cache {label:<5} concurrency=4 {dt:6.2f}s {len(batch) / dt:8.1f} traces/s "
+            f"llm_calls={llm.calls - calls0} {cache.report()}"
+        )
+    chroma_setup.get_writer().flush()
+    print(f"  llm_calls={llm.calls} retriever_calls={retriever.calls} saved={collection.count()}")
+    for name, (cnt, avg) in _node_stats().items():
+        print(f"  node {name:<22} n={cnt:<5} avg={avg:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# LLM 스케줄러: 로컬 fake OpenAI 서버(429/503)에 실제 openai 클라이언트로 요약 요청.
+# sigma trace(high)가 일반 trace 뒤에 밀리지 않는지, 429에서 trace를 잃지 않는지 측정
+# 실행: python -m benchmarks.bench_llm_scheduler [requests] [server_rpm] [error_rate]
+import statistics
+import sys
+import threading
+import time
+
+from openai import OpenAI
+
+import summarize_embed
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from llm_scheduler import (
+    PRIORITY_HIGH,
+    PRIORITY_NAMES,
+    PRIORITY_NORMAL,
+    LLMScheduler,
+    LLMShedError,
+    set_scheduler,
+)
+
+
+def run(n: int, server_rpm: float, error_rate: float, sched_rpm: float, threads: int = 64):
+    srv = FakeOpenAIServer(rpm=server_rpm, error_rate=error_rate).start()
+    summarize_embed.set_client(OpenAI(api_key="fake", base_url=srv.base_url, max_retries=0))
+    sched = LLMScheduler(
+        sched_rpm, 0, max_concurrency=8, deadline_sec=60, max_retries=8,
+        backoff_base=0.05, backoff_max=2.0,
+    )
+    set_scheduler(sched)
+    latency = {PRIORITY_HIGH: [], PRIORITY_NORMAL: []}
+    errors = {"shed": 0, "error": 0}
+    lock = threading.Lock()
+    jobs = [(PRIORITY_HIGH if i % 10 == 9 else PRIORITY_NORMAL, i) for i in range(n)]
+    it = iter(jobs)
+
+    def worker():
+        while True:
+            with lock:
+                job = next(it, None)
+            if job is None:
+                return
+            prio, i = job
+            t0 = time.perf_counter()
+            try:
+                summarize_embed.summarize_korean(f"ProcessCreate proc=cmd.exe #{i}", prio)
+            except LLMShedError:
+                with lock:
+                    errors["shed"] += 1
+                continue
+            except Exception:
+                with lock:
+                    errors["error"] += 1
+                continue
+            with lock:
+                latency[prio].append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    ths = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in ths:
+        t.start()
+    for t in ths:
+        t.join()
+    dt = time.perf_counter() - t0
+    srv.stop()
+    set_scheduler(None)
+    return dt, latency, errors, srv.stats, dict(sched.stats)
+
+
+def _q(xs, p):
+    if not xs:
+        return float("nan")
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p * len(xs)))]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    server_rpm = float(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    print(f"[BENCH] requests={n} server_rpm={server_rpm} error_rate={error_rate}")
+    # sched_rpm: 0이면 스케줄러 rate limit 없음(서버 429에만 의존), 서버 한도의 90%면 선제 조절
+    for label, sched_rpm in (("retry-only", 0), ("rate-limited", server_rpm * 0.9)):
+        dt, latency, errors, srv, sched = run(n, server_rpm, error_rate, sched_rpm)
+        done = sum(len(v) for v in latency.values())
+        print(f"  {label:<13} {dt:6.2f}s  done={done}/{n} shed={errors['shed']} error={errors['error']}")
+        print(f"    server: {srv}  scheduler: {sched}")
+        for p, xs in latency.items():
+            if xs:
+                print(
+                    f"    {PRIORITY_NAMES[p]:<7} n={len(xs):<4} p50={statistics.median(xs) * 1000:7.1f}ms "
+                    f"p95={_q(xs, 0.95) * 1000:7.1f}ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# TraceAggregator 버퍼 이벤트당 메모리: dict 이벤트 vs EventRecord(__slots__ + intern)
+# 실행: python -m benchmarks.bench_memory [copies]
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+from preprocess import iter_events_from_otlp, trace_key
+from trace_aggregator import TraceAggregator
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def measure(raw: str, copies: int, compact: bool):
+    # 메시지마다 json.loads 하므로 문자열은 복사본마다 별도 객체 (Kafka 수신과 동일)
+    agg = TraceAggregator(inactivity_sec=1e9, max_events=10**9)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for _ in range(copies):
+        payload = json.loads(raw)
+        if compact:
+            agg.add_payload(payload)
+        else:
+            for e in iter_events_from_otlp(payload):
+                tid = trace_key(e)
+                agg.buckets.setdefault(tid, []).append(e)
+        del payload
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    n = sum(len(v) for v in agg.buckets.values())
+    return used, n
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    raw = (ROOT / "trace.json").read_text(encoding="utf-8")
+    print(f"[BENCH] trace.json x{copies}")
+    before, n = measure(raw, copies, compact=False)
+    after, _ = measure(raw, copies, compact=True)
+    print(f"  dict events   {before / n:8.0f} B/event  ({before / 2**20:.1f} MiB, {n} events)")
+    print(f"  EventRecord   {after / n:8.0f} B/event  ({after / 2**20:.1f} MiB)")
+    print(f"  reduction     {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
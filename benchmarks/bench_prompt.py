@@ -0,0 +1,48 @@
+# 프롬프트 토큰 절감: trace.json의 trace별 clean text를 기존 방식 vs compact_clean_text로 비교
+# 실행: python -m benchmarks.bench_prompt [trace.json] [repeat] [budget]
+#   repeat: 각 trace 이벤트를 N번 반복해 장시간 반복 행위(같은 DNS/NET 수백 줄)를 흉내
+import json
+import sys
+
+from preprocess import build_clean_text, extract_events_from_otlp, group_by_trace
+from prompt_builder import compact_clean_text, count_tokens
+
+
+def run(groups, repeat: int, budget: int):
+    rows = []
+    for tid, evs in groups.items():
+        clean = build_clean_text(evs * repeat)
+        rows.append(
+            (
+                tid,
+                len(evs) * repeat,
+                count_tokens(clean),  # summarize_korean 기존 본문
+                count_tokens(" ".join(clean)),  # langgraph 기존 " ".join(cleaned_trace)
+                count_tokens(compact_clean_text(clean, budget)),
+            )
+        )
+    return rows
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else "trace.json"
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    budget = int(sys.argv[3]) if len(sys.argv) > 3 else 1500
+    with open(path, "rb") as fp:
+        groups = group_by_trace(extract_events_from_otlp(json.load(fp)))
+    for r in (1, repeat):
+        rows = run(groups, r, budget)
+        raw = sum(x[2] for x in rows)
+        joined = sum(x[3] for x in rows)
+        sent = sum(x[4] for x in rows)
+        print(f"[BENCH] {path} traces={len(rows)} repeat={r} budget={budget}")
+        print(
+            f"  summarize: {raw:>8} -> {sent:>7} tokens ({100 * (1 - sent / raw):5.1f}% 절감)\n"
+            f"  judgment : {joined:>8} -> {sent:>7} tokens ({100 * (1 - sent / joined):5.1f}% 절감, 기존 join 버그 포함)"
+        )
+        worst = max(rows, key=lambda x: x[2])
+        print(f"  최대 trace {worst[0]} events={worst[1]}: {worst[2]} -> {worst[4]} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# 유사 로그 검색: trace별 임베딩+query vs 일괄 임베딩+멀티 query(+where 사전 필터)
+# 실제 chromadb(in-memory) 컬렉션 + FakeEmbedding(호출당 고정 지연 = 임베딩 API 왕복)
+# 실행: python -m benchmarks.bench_search [docs] [queries] [embed_latency_sec]
+import os
+import sys
+import time
+import uuid
+
+os.environ.setdefault("CHROMA_LIST_META", "1")  # process_names $contains 필터 측정용 (배열 메타)
+
+import chromadb
+
+import chroma_setup
+from benchmarks.fakes import FakeEmbedding
+
+PROCS = ["Code.exe", "chrome.exe", "svchost.exe", "powershell.exe", "cmd.exe", "docker.exe"]
+
+
+def _meta(i: int):
+    return chroma_setup._safe_meta(
+        {
+            "type": "trace_summary" if i % 4 else "final_decision",
+            "process_names": sorted({PROCS[i % 6], PROCS[(i * 7) % 6]}),
+            "sigma_hit": i % 10 == 0,
+            "event_count": i % 50,
+        }
+    )
+
+
+def main():
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_q = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.03
+    embed = FakeEmbedding(dim=256)
+    client = chromadb.EphemeralClient()
+    col = client.create_collection(f"bench-{uuid.uuid4().hex[:8]}", metadata={"hnsw:space": "cosine"})
+    docs = [f"[PROC+] {PROCS[i % 6]} pid={i} cmd=run {i}" for i in range(n_docs)]
+    for s in range(0, n_docs, 1000):
+        col.add(
+            ids=[f"d{i}" for i in range(s, min(n_docs, s + 1000))],
+            documents=docs[s : s + 1000],
+            embeddings=embed(docs[s : s + 1000]),
+            metadatas=[_meta(i) for i in range(s, min(n_docs, s + 1000))],
+        )
+    embed.latency = latency
+    chroma_setup.set_collection(col, embed)
+    queries = [f"[NET] {PROCS[i % 6]} 10.0.0.{i % 250}:{i} -> 1.2.3.4:443 tcp" for i in range(n_q)]
+    print(f"[BENCH] docs={n_docs} queries={n_q} embed_latency={latency}s")
+
+    calls0 = embed.calls
+    t0 = time.perf_counter()
+    for q in queries:
+        col.query(query_embeddings=embed([q]), n_results=4)
+    dt = time.perf_counter() - t0
+    print(f"  per-trace        {dt:7.3f}s  {n_q / dt:8.1f} q/s  embed_calls={embed.calls - calls0} queries={n_q}")
+
+    cases = (
+        ("bulk", None),
+        ("bulk+type", chroma_setup.build_where(type="trace_summary")),
+        ("bulk+sigma", chroma_setup.build_where(type="trace_summary", sigma_hit=True)),
+        ("bulk+process", chroma_setup.build_where(process_names=["powershell.exe"])),
+    )
+    for label, where in cases:
+        qs = [f"{q} #{label}" for q in queries]  # 임베딩 캐시 히트 방지
+        calls0 = embed.calls
+        t0 = time.perf_counter()
+        res = chroma_setup.search_similar_bulk(qs, k=4, where=where, max_distance=None)
+        dt = time.perf_counter() - t0
+        hits = sum(len(r) for r in res)
+        print(
+            f"  {label:<16} {dt:7.3f}s  {n_q / dt:8.1f} q/s  embed_calls={embed.calls - calls0} "
+            f"queries=1 hits={hits}"
+        )
+    # trace별 where 목록 → 같은 조건끼리 묶어 질의
+    wheres = [chroma_setup.build_where(process_names=[PROCS[i % 6]]) for i in range(n_q)]
+    qs = [f"{q} #per-where" for q in queries]
+    t0 = time.perf_counter()
+    res = chroma_setup.search_similar_bulk(qs, k=4, where=wheres, max_distance=None)
+    dt = time.perf_counter() - t0
+    ok = all(
+        PROCS[i % 6] in r["metadata"]["process_names"] for i, hits in enumerate(res) for r in hits
+    )
+    print(f"  bulk+per-trace-where {dt:7.3f}s  groups={len(set(map(str, wheres)))} filter_ok={ok}")
+
+
+if __name__ == "__main__":
+    main()
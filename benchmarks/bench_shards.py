@@ -0,0 +1,107 @@
+# trace-affinity 샤딩: memory_broker(in-memory Kafka 대역) + 샤드 프로세스 수별 처리량
+# 각 trace의 span을 두 메시지로 나눠 서로 다른 파티션에 보냄 → 파티션 단위로 consumer를 늘리면
+# 부분 요약으로 쪼개질 trace(cross-partition)가 샤딩 모드에서는 한 샤드로 모이는지, 커밋이 끝까지 가는지 확인.
+# flushes > traces는 같은 trace가 비활성 만료로 여러 번 flush된 경우 (같은 샤드의 rolling 요약으로 병합됨)
+# 실행: python -m benchmarks.bench_shards [traces] [partitions] [llm_latency_sec] [shards,...]
+import os
+import sys
+
+os.environ.setdefault("TRACE_INACTIVITY_SEC", "1.0")
+os.environ.setdefault("FLUSH_TICK_SEC", "0.2")
+os.environ.setdefault("KAFKA_COMMIT_INTERVAL_SEC", "0.5")
+os.environ.setdefault("KAFKA_AUTO_OFFSET_RESET", "earliest")
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("SUMMARY_CACHE_SIZE", "0")  # 샤드 수와 무관하게 매번 fake LLM 호출
+
+import copy
+import json
+import threading
+import time
+
+from benchmarks.fakes import install_shard_fakes
+from benchmarks.synth import SynthConfig, generate
+from config import RAW_TOPIC
+from decoders import get_decoder
+from memory_broker import MemoryBroker
+from trace_shards import run_sharded
+
+
+def _split(payload):
+    # payload의 span을 짝/홀 인덱스로 나눈 두 payload
+    halves = [copy.copy(payload), copy.copy(payload)]
+    for h in halves:
+        h["resourceSpans"] = []
+    for rs in payload.get("resourceSpans", []):
+        parts = [dict(rs, scopeSpans=[]), dict(rs, scopeSpans=[])]
+        for ss in rs.get("scopeSpans", []):
+            spans = ss.get("spans", [])
+            for k in (0, 1):
+                parts[k]["scopeSpans"].append(dict(ss, spans=spans[k::2]))
+        for k in (0, 1):
+            halves[k]["resourceSpans"].append(parts[k])
+    return halves
+
+
+def _fill(broker: MemoryBroker, payloads, partitions: int):
+    decoder = get_decoder("json")
+    where = {}  # trace -> 파티션 집합
+    n_events = 0
+    for i, p in enumerate(payloads):
+        for k, half in enumerate(_split(p)):
+            value = json.dumps(half).encode()
+            part = (i + k) % partitions
+            broker.produce(RAW_TOPIC, value, partition=part)
+            for e in decoder.iter_events(value, compact=True):
+                where.setdefault(e.trace_id or e.span_id, set()).add(part)
+                n_events += 1
+    return where, n_events
+
+
+def _run(payloads, partitions: int, shards: int):
+    broker = MemoryBroker(partitions)
+    where, n_events = _fill(broker, payloads, partitions)
+    ends = broker.end_offsets(RAW_TOPIC)
+    consumer = broker.consumer("bench-shards", auto_offset_reset="earliest", max_poll_records=50)
+    stop = threading.Event()
+    out = {}
+
+    def target():
+        out["router"] = run_sharded(
+            consumer, get_decoder("json"), shards, True, stop, install_shard_fakes
+        )
+
+    t0 = time.perf_counter()
+    th = threading.Thread(target=target, daemon=True)
+    th.start()
+    # 모든 파티션의 커밋 offset이 끝에 도달 = 모든 trace 요약이 Chroma(fake)에 기록됨
+    while any(broker.committed("bench-shards", tp) != end for tp, end in ends.items()):
+        time.sleep(0.05)
+    dt = time.perf_counter() - t0
+    stop.set()
+    th.join()
+    router = out["router"]
+    flushes = sum(st["summarized"] for st in router.stats if st)
+    split = sum(1 for parts in where.values() if len(parts) > 1)
+    return dt, n_events, len(where), split, flushes
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    partitions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.01
+    shard_counts = [int(x) for x in sys.argv[4].split(",")] if len(sys.argv) > 4 else [1, 2, 4]
+    os.environ["BENCH_LLM_LATENCY"] = str(latency)
+    payloads = generate(SynthConfig(traces=n, spans_per_trace=12, orphan_ratio=0.0))
+    rows = []
+    for shards in shard_counts:
+        rows.append((shards, *_run(payloads, partitions, shards)))
+    print(f"[BENCH] traces={n} partitions={partitions} fake_llm_latency={latency}s cpus={os.cpu_count()}")
+    for shards, dt, n_events, traces, split, flushes in rows:
+        print(
+            f"  shards={shards:<3} {dt:6.2f}s {n_events / dt:9.1f} events/s  traces={traces} "
+            f"cross-partition={split} flushes={flushes}"
+        )
+
+
+if __name__ == "__main__":
+    main()
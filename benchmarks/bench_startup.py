@@ -0,0 +1,71 @@
+# import 시간과 첫 trace 처리 지연 측정 (모듈마다 새 프로세스에서 측정)
+# 실행: python -m benchmarks.bench_startup [--fake]
+#   --fake : OpenAI/Chroma 대신 fake 클라이언트 주입 (네트워크 없이 warmup/첫 trace 측정)
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ["chroma_setup", "summarize_embed", "pipeline", "kafka_trace_consumer", "langgraph_node"]
+
+_IMPORT = """
+import time
+t0 = time.perf_counter()
+import {mod}
+print(time.perf_counter() - t0)
+"""
+
+_FIRST_TRACE = """
+import json, time
+t0 = time.perf_counter()
+import pipeline, summarize_embed
+t_import = time.perf_counter() - t0
+if {fake}:
+    from benchmarks.fakes import FakeLLM, install_fake_backends
+    install_fake_backends(FakeLLM())
+t_warm = summarize_embed.warmup()
+from preprocess import extract_events_from_otlp, group_by_trace
+payload = json.load(open("trace.json", encoding="utf-8"))
+tid, evs = next(iter(group_by_trace(extract_events_from_otlp(payload)).items()))
+t1 = time.perf_counter()
+pipeline.summarize_trace(tid, evs)
+t_first = time.perf_counter() - t1
+print(json.dumps({{"import_s": t_import, "warmup_s": t_warm, "first_trace_s": t_first}}))
+"""
+
+
+def _run(code: str):
+    p = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True
+    )
+    if p.returncode != 0:
+        err = (p.stderr.strip().splitlines() or ["?"])[-1]
+        return None, err
+    # atexit flush 로그 등이 섞일 수 있으므로 결과 줄(숫자/JSON)만 사용
+    lines = [ln for ln in p.stdout.splitlines() if ln[:1] in "{0123456789"]
+    return lines[-1], None
+
+
+def main():
+    fake = "--fake" in sys.argv
+    print("[BENCH] import time (fresh process)")
+    for mod in MODULES:
+        out, err = _run(_IMPORT.format(mod=mod))
+        if err:
+            print(f"  {mod:<22} ERROR {err}")
+        else:
+            print(f"  {mod:<22} {float(out) * 1000:8.1f} ms")
+
+    print(f"[BENCH] warmup + first trace ({'fake' if fake else 'live'} backends)")
+    out, err = _run(_FIRST_TRACE.format(fake=fake))
+    if err:
+        print(f"  ERROR {err}")
+        return
+    r = json.loads(out)
+    for k, v in r.items():
+        print(f"  {k:<22} {v * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# SummaryWorkerPool 처리량: 가짜 LLM(고정 지연)으로 concurrency별 traces/s 측정
+# 실행: python -m benchmarks.bench_worker_pool [traces] [llm_latency_sec]
+import sys
+import time
+
+from worker_pool import SummaryWorkerPool
+
+
+def fake_summarize(latency: float):
+    def handler(trace_id, evs):
+        time.sleep(latency)  # OpenAI 호출 대신 고정 지연
+        return trace_id
+
+    return handler
+
+
+def run(n: int, latency: float, concurrency: int):
+    pool = SummaryWorkerPool(fake_summarize(latency), concurrency, concurrency * 2)
+    rejected = 0
+    t0 = time.perf_counter()
+    for i in range(n):
+        # consumer와 같이 가득 차면 제출하지 않고 대기 (파티션 pause 구간)
+        while not pool.submit(f"trace-{i}", []):
+            rejected += 1
+            time.sleep(latency / 10)
+    pool.shutdown(wait=True)
+    dt = time.perf_counter() - t0
+    assert pool.done == n
+    return dt, rejected
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    print(f"[BENCH] traces={n} fake_llm_latency={latency}s")
+    for c in (1, 2, 4, 8, 16, 32):
+        dt, rejected = run(n, latency, c)
+        print(
+            f"  concurrency={c:<3} {dt:7.2f}s  {n / dt:8.1f} traces/s  backpressure_waits={rejected}"
+        )
+
+
+if __name__ == "__main__":
+    main()
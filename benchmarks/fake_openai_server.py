@@ -0,0 +1,136 @@
+# 로컬 fake OpenAI 서버: /v1/chat/completions 만 구현.
+# 분당 요청 한도를 넘기면 429(retry-after), 일정 비율로 503을 돌려준다.
+# 실행: python -m benchmarks.fake_openai_server [port] [rpm] [error_rate]
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rpm: float = 600,
+        error_rate: float = 0.0,
+        latency_sec: float = 0.01,
+        window_sec: float = 1.0,
+    ):
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.latency = latency_sec
+        # 짧은 창으로 분당 한도를 근사 (벤치마크가 몇 초 안에 끝나도록)
+        self.window = window_sec
+        self.stats = {"ok": 0, "429": 0, "5xx": 0}
+        self._hits = deque()
+        self._lock = threading.Lock()
+        handler = type("Handler", (_Handler,), {"server_ref": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.base_url = f"http://{host}:{self.port}/v1"
+        self._thread = None
+
+    def admit(self):
+        # 반환: None(허용) | (status, retry_after)
+        now = time.monotonic()
+        limit = max(1, int(self.rpm * self.window / 60.0))
+        with self._lock:
+            while self._hits and now - self._hits[0] >= self.window:
+                self._hits.popleft()
+            if len(self._hits) >= limit:
+                self.stats["429"] += 1
+                return 429, self.window - (now - self._hits[0])
+            if self.error_rate and random.random() < self.error_rate:
+                self.stats["5xx"] += 1
+                return 503, None
+            self._hits.append(now)
+            self.stats["ok"] += 1
+        return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_ref: FakeOpenAIServer = None
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, body: dict, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        srv = self.server_ref
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            return self._send(404, {"error": {"message": "not found"}})
+        denied = srv.admit()
+        if denied is not None:
+            status, retry_after = denied
+            headers = {"retry-after": f"{retry_after:.3f}"} if retry_after else None
+            return self._send(
+                status, {"error": {"message": "rate limited" if status == 429 else "overloaded"}}, headers
+            )
+        if srv.latency:
+            time.sleep(srv.latency)
+        user = (body.get("messages") or [{}])[-1].get("content", "")
+        content = "요약: " + user.split("\n", 1)[0][:80]
+        prompt_tokens = len(user) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        self._send(
+            200,
+            {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8089
+    rpm = float(sys.argv[2]) if len(sys.argv) > 2 else 600
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    srv = FakeOpenAIServer(port=port, rpm=rpm, error_rate=error_rate)
+    print(f"[INFO] fake OpenAI: OPENAI_BASE_URL={srv.base_url} rpm={rpm} error_rate={error_rate}")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        srv.stop()
+
+
+if __name__ == "__main__":
+    main()
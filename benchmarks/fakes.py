@@ -0,0 +1,229 @@
+# 벤치마크용 in-process LLM / 임베딩 / 벡터스토어 stand-in (네트워크 호출 없음)
+import hashlib
+import json
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class FakeLLM:
+    # summarize_korean 대체: 고정 지연 + 토큰 수 근사 (문자 4개 ≈ 1 token)
+    def __init__(self, latency_sec: float = 0.0):
+        self.latency = latency_sec
+        self.calls = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+
+    def summarize(self, clean_text: str):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += len(clean_text) // 4 + 1
+        first = (clean_text or "").split("\n", 1)[0]
+        return f"요약: {first[:80]}"
+
+
+class FakeEmbedding:
+    # 문서 해시 기반 결정적 벡터. 호출(배치) 수와 문서 수를 센다
+    def __init__(self, dim: int = 64, latency_sec: float = 0.0):
+        self.dim = dim
+        self.latency = latency_sec
+        self.calls = 0
+        self.docs = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, docs: List[str]):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            self.docs += len(docs)
+        return [self.embed(d) for d in docs]
+
+    def embed(self, doc: str):
+        h = hashlib.sha256(doc.encode("utf-8")).digest()
+        vec = [(h[i % len(h)] - 127.5) / 127.5 for i in range(self.dim)]
+        norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+        return [x / norm for x in vec]
+
+
+class FakeCollection:
+    # chromadb Collection의 upsert/get/count만 흉내 낸 in-memory 저장소
+    def __init__(self, name: str = "fake"):
+        self.name = name
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.upserts = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        with self._lock:
+            self.upserts += 1
+            for i, doc_id in enumerate(ids):
+                self.docs[doc_id] = {
+                    "document": documents[i] if documents else None,
+                    "metadata": metadatas[i] if metadatas else None,
+                    "embedding": embeddings[i] if embeddings else None,
+                }
+
+    add = upsert
+
+    def count(self):
+        return len(self.docs)
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, include=None):
+        # brute-force cosine distance (벡터는 FakeEmbedding이 정규화해서 넣음)
+        with self._lock:
+            items = [
+                (i, d) for i, d in self.docs.items()
+                if d["embedding"] is not None and _match(d["metadata"] or {}, where)
+            ]
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for q in query_embeddings or []:
+            scored = sorted(
+                (1.0 - sum(a * b for a, b in zip(q, d["embedding"])), i, d) for i, d in items
+            )[:n_results]
+            out["ids"].append([i for _, i, _ in scored])
+            out["documents"].append([d["document"] for _, _, d in scored])
+            out["metadatas"].append([d["metadata"] for _, _, d in scored])
+            out["distances"].append([dist for dist, _, _ in scored])
+        return out
+
+
+def _match(meta: Dict[str, Any], where) -> bool:
+    # Chroma where 부분 구현: $and / $or / $contains / $eq / $ne / 값 직접 비교
+    if not where:
+        return True
+    if "$and" in where:
+        return all(_match(meta, w) for w in where["$and"])
+    if "$or" in where:
+        return any(_match(meta, w) for w in where["$or"])
+    for k, cond in where.items():
+        v = meta.get(k)
+        if isinstance(cond, dict):
+            for op, x in cond.items():
+                if op == "$contains" and not (isinstance(v, list) and x in v):
+                    return False
+                if op == "$eq" and v != x:
+                    return False
+                if op == "$ne" and v == x:
+                    return False
+        elif v != cond:
+            return False
+    return True
+
+
+class _Obj:
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class FakeOpenAI:
+    # openai.OpenAI 의 chat.completions.create 만 흉내 (응답 content + usage)
+    def __init__(self, llm: FakeLLM):
+        self.llm = llm
+        self.chat = _Obj(completions=_Obj(create=self._create))
+
+    def _create(self, model=None, messages=None, **kw):
+        user = (messages or [{}])[-1].get("content", "")
+        content = self.llm.summarize(user)
+        usage = _Obj(prompt_tokens=len(user) // 4 + 1, completion_tokens=len(content) // 4 + 1)
+        return _Obj(
+            choices=[_Obj(message=_Obj(content=content))], usage=usage, model=model
+        )
+
+
+def _bucket(text: str, n: int = 100):
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16) % n
+
+
+class FakeChatModel:
+    # langgraph_node의 ChatOpenAI 대체: invoke(messages) → JSON 판단 (프롬프트 해시로 결정)
+    def __init__(self, latency_sec: float = 0.0):
+        self.latency = latency_sec
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = getattr(messages[-1], "content", str(messages[-1]))
+        with self._lock:
+            self.calls += 1
+        b = _bucket(prompt)
+        decision = "normal" if b < 60 else "suspicious" if b < 85 else "anomaly"
+        if "원래 로그" in prompt:
+            decision = "anomaly" if b % 2 else "normal"  # final_decision 재판단
+        content = json.dumps({"decision": decision, "reason": f"fake {b}"}, ensure_ascii=False)
+        usage = {"prompt_tokens": len(prompt) // 4 + 1, "completion_tokens": len(content) // 4 + 1}
+        return _Obj(content=content, response_metadata={"token_usage": usage})
+
+
+class FakeRetriever:
+    # VectorStoreRetriever 대체: 질의 해시로 0~3개의 라벨 달린 유사 문서 반환
+    def __init__(self, latency_sec: float = 0.0, empty_ratio: float = 0.4):
+        self.latency = latency_sec
+        self.empty = int(empty_ratio * 100)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, query: str):
+        from langchain_core.documents import Document
+
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        b = _bucket(query)
+        if b < self.empty:
+            return []
+        labels = ("normal", "suspicious", "anomaly", "unknown")
+        return [
+            Document(page_content=f"similar {b}-{i}", metadata={"label": labels[(b + i) % 4]})
+            for i in range(1 + b % 3)
+        ]
+
+    get_relevant_documents = invoke
+
+
+def install_fake_judge(llm: FakeChatModel, retriever: FakeRetriever, collection=None):
+    # 판단 그래프(judge_graph)용: ChatOpenAI/검색기/Chroma 컬렉션만 fake로 주입
+    import chroma_setup
+    import langgraph_node
+    from llm_scheduler import LLMScheduler, set_scheduler
+
+    collection = collection if collection is not None else FakeCollection()
+    langgraph_node.set_llm(llm)
+    langgraph_node.set_retriever(retriever)
+    chroma_setup.set_collection(collection, FakeEmbedding())
+    set_scheduler(LLMScheduler(0, 0, max_concurrency=64))
+    return collection
+
+
+def install_fake_backends(
+    llm: FakeLLM, embed: Optional[FakeEmbedding] = None, collection=None
+):
+    # 실제 summarize_embed/chroma_setup 코드를 그대로 쓰고 OpenAI 클라이언트와
+    # Chroma 컬렉션/임베딩 함수만 fake로 주입 (네트워크 없이 e2e 측정)
+    import chroma_setup
+    import summarize_embed
+    from llm_scheduler import LLMScheduler, set_scheduler
+
+    embed = embed or FakeEmbedding()
+    collection = collection if collection is not None else FakeCollection()
+    summarize_embed.set_client(FakeOpenAI(llm))
+    # fake LLM에는 rate limit이 없으므로 스케줄러 한도 해제 (우선순위 큐만 사용)
+    set_scheduler(LLMScheduler(0, 0, max_concurrency=64))
+    chroma_setup.set_collection(collection, embed)
+    return embed, collection
+
+
+def install_shard_fakes():
+    # trace_shards 샤드 프로세스용 shard_init: spawn된 프로세스마다 fake LLM/컬렉션 주입
+    # (지연은 부모가 설정한 BENCH_LLM_LATENCY 환경변수)
+    import os
+    import chroma_setup
+
+    install_fake_backends(FakeLLM(float(os.getenv("BENCH_LLM_LATENCY", "0.01"))))
+    chroma_setup.get_writer().verbose = False
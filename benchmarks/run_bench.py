@@ -0,0 +1,190 @@
+# 전처리/집계 hot path 벤치마크 스위트. 결과는 JSON으로 저장해 실행 간 비교
+# 실행: python -m benchmarks.run_bench --traces 2000 --spans-per-trace 20 --out result.json
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from dataclasses import asdict
+from typing import Any, Callable, Dict
+
+from benchmarks.fakes import FakeLLM, FakeEmbedding, FakeCollection, install_fake_backends
+from benchmarks.synth import SynthConfig, generate
+from preprocess import (
+    build_clean_text,
+    build_summary_meta,
+    extract_events_from_otlp,
+    group_by_trace,
+)
+from trace_aggregator import TraceAggregator
+
+
+def _measure(fn: Callable[[], Any], items: int, unit: str, memory: bool = True):
+    # 처리량은 tracemalloc 없이, peak 메모리는 한 번 더 돌려서 측정
+    t0 = time.perf_counter()
+    result = fn()
+    dt = time.perf_counter() - t0
+    out: Dict[str, Any] = {
+        "seconds": round(dt, 4),
+        "items": items,
+        "unit": unit,
+        "per_sec": round(items / dt, 1) if dt else None,
+    }
+    if memory:
+        tracemalloc.start()
+        fn()
+        out["peak_mem_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    return out, result
+
+
+def bench_preprocess(payloads, n_spans: int):
+    res: Dict[str, Any] = {}
+
+    def extract():
+        return [e for p in payloads for e in extract_events_from_otlp(p)]
+
+    res["extract_events_from_otlp"], events = _measure(extract, n_spans, "spans")
+    res["group_by_trace"], groups = _measure(
+        lambda: group_by_trace(events), len(events), "events"
+    )
+    buckets = list(groups.values())
+    res["build_clean_text"], _ = _measure(
+        lambda: [build_clean_text(b) for b in buckets], len(buckets), "traces"
+    )
+    res["build_summary_meta"], _ = _measure(
+        lambda: [build_summary_meta(b) for b in buckets], len(buckets), "traces"
+    )
+    return res, len(buckets)
+
+
+def bench_aggregator(payloads, n_spans: int, max_events: int):
+    res: Dict[str, Any] = {}
+    clock = [0.0]
+
+    def add():
+        agg = TraceAggregator(5.0, max_events, clock=lambda: clock[0])
+        clock[0] = 0.0
+        for p in payloads:
+            agg.add_payload(p)
+        return agg
+
+    res["aggregator_add"], agg = _measure(add, n_spans, "spans")
+    open_traces = len(agg.buckets)
+
+    def pop():
+        clock[0] = 1e9  # 모든 trace 비활성 만료
+        return agg.pop_ready()
+
+    res["aggregator_pop_ready"], ready = _measure(pop, open_traces, "traces", memory=False)
+    res["aggregator_pop_ready"]["flushed"] = len(ready)
+    # flush 후 메타/clean text: 누적 features 마무리 vs 이벤트 전체 재계산
+    res["flush_finalize_features"], _ = _measure(
+        lambda: [(f.meta(), f.clean_text()) for _, _, f, _ in ready], len(ready), "traces"
+    )
+    res["flush_finalize_rebuild"], _ = _measure(
+        lambda: [(build_summary_meta(evs), build_clean_text(evs)) for _, evs, _, _ in ready],
+        len(ready),
+        "traces",
+    )
+    return res
+
+
+def bench_e2e(payloads, n_spans: int, max_events: int, latency: float, concurrency: int):
+    import chroma_setup
+
+    llm, embed, collection = FakeLLM(latency), FakeEmbedding(), FakeCollection()
+    install_fake_backends(llm, embed, collection)
+    chroma_setup.get_writer().verbose = False
+    from pipeline import summarize_trace
+    from worker_pool import SummaryWorkerPool
+
+    t0 = time.perf_counter()
+    agg = TraceAggregator(0.0, max_events)
+    pool = SummaryWorkerPool(summarize_trace, concurrency, concurrency * 4)
+    for p in payloads:
+        agg.add_payload(p)
+    for tid, evs, feats, _ in agg.pop_ready():
+        while not pool.submit(tid, evs, feats):
+            time.sleep(0.001)
+    pool.shutdown(wait=True)
+    chroma_setup.get_writer().flush()
+    dt = time.perf_counter() - t0
+    return {
+        "seconds": round(dt, 4),
+        "spans_per_sec": round(n_spans / dt, 1),
+        "traces_per_sec": round(pool.done / dt, 1),
+        "traces": pool.done,
+        "failed": pool.failed,
+        "llm_calls": llm.calls,
+        "llm_prompt_tokens": llm.prompt_tokens,
+        "embed_calls": embed.calls,
+        "documents": collection.count(),
+        "fake_llm_latency_sec": latency,
+        "concurrency": concurrency,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--traces", type=int, default=2000)
+    ap.add_argument("--spans-per-trace", type=int, default=20)
+    ap.add_argument("--attrs", type=int, default=30)
+    ap.add_argument("--orphan-ratio", type=float, default=0.1)
+    ap.add_argument("--traces-per-payload", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--max-events", type=int, default=500)
+    ap.add_argument("--e2e", action="store_true", help="fake LLM/임베딩으로 end-to-end 측정")
+    ap.add_argument("--llm-latency", type=float, default=0.01)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--out", default="", help="결과 JSON 저장 경로 (없으면 stdout)")
+    args = ap.parse_args()
+
+    cfg = SynthConfig(
+        traces=args.traces,
+        spans_per_trace=args.spans_per_trace,
+        attr_count=args.attrs,
+        orphan_ratio=args.orphan_ratio,
+        traces_per_payload=args.traces_per_payload,
+        seed=args.seed,
+    )
+    t0 = time.perf_counter()
+    payloads = generate(cfg)
+    n_spans = cfg.traces * cfg.spans_per_trace
+    print(f"[BENCH] generated {n_spans} spans in {time.perf_counter() - t0:.2f}s")
+
+    result: Dict[str, Any] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": asdict(cfg),
+        "spans": n_spans,
+    }
+    result["stages"], result["groups"] = bench_preprocess(payloads, n_spans)
+    result["stages"].update(bench_aggregator(payloads, n_spans, args.max_events))
+    if args.e2e:
+        result["e2e"] = bench_e2e(
+            payloads, n_spans, args.max_events, args.llm_latency, args.concurrency
+        )
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"[BENCH] saved -> {args.out}")
+    for name, r in result["stages"].items():
+        print(
+            f"  {name:<26} {r['per_sec']:>12,.0f} {r['unit']}/s"
+            + (f"  peak={r['peak_mem_mb']}MB" if "peak_mem_mb" in r else "")
+        )
+    if args.e2e:
+        e = result["e2e"]
+        print(
+            f"  {'e2e':<26} {e['traces_per_sec']:>12,.1f} traces/s  "
+            f"llm_calls={e['llm_calls']} embed_calls={e['embed_calls']}"
+        )
+    if not args.out:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# trace.json의 span 형태를 템플릿으로 한 합성 OTLP 부하 생성기
+import json
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+ROOT = Path(__file__).resolve().parent.parent
+BASE_NS = 1755145189530065900
+
+
+@dataclass
+class SynthConfig:
+    traces: int = 1000
+    spans_per_trace: int = 20
+    attr_count: int = 30  # span당 attribute 수 (템플릿보다 적으면 템플릿 그대로)
+    orphan_ratio: float = 0.1  # traceId 없이 보내는 trace 비율
+    traces_per_payload: int = 50  # Kafka 메시지 하나에 담기는 trace 수
+    hosts: int = 8
+    seed: int = 42
+
+
+def load_templates(path: Path = ROOT / "trace.json"):
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    resources, spans = [], []
+    for rs in payload.get("resourceSpans", []) or []:
+        resources.append(rs.get("resource", {}))
+        for ss in rs.get("scopeSpans", []) or []:
+            spans.extend(ss.get("spans", []) or [])
+    return resources[0], spans
+
+
+def _attr(key: str, value: Dict[str, Any]):
+    return {"key": key, "value": value}
+
+
+def _utc(ns: int):
+    dt = datetime.fromtimestamp(ns / 1e9, tz=timezone.utc)
+    return dt.strftime("%Y-%m-%d %H:%M:%S.") + f"{dt.microsecond // 1000:03d}"
+
+
+class SynthGenerator:
+    def __init__(self, cfg: SynthConfig):
+        self.cfg = cfg
+        self.rng = random.Random(cfg.seed)
+        self.resource, self.templates = load_templates()
+        self.pids = [str(self.rng.randint(1000, 30000)) for _ in range(64)]
+        self.dst_ips = [
+            f"{self.rng.randint(11, 223)}.{self.rng.randint(0, 255)}."
+            f"{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+            for _ in range(256)
+        ]
+        self.ns = BASE_NS
+
+    def _hex(self, n: int):
+        return "%0*x" % (n, self.rng.getrandbits(n * 4))
+
+    def _span(self, tmpl: Dict[str, Any], trace_id: str):
+        rng = self.rng
+        self.ns += rng.randint(100_000, 50_000_000)
+        attrs: List[Dict[str, Any]] = []
+        for kv in tmpl.get("attributes", []):
+            k = kv.get("key")
+            if k == "ProcessId":
+                attrs.append(_attr(k, {"intValue": rng.choice(self.pids)}))
+            elif k == "SourcePort":
+                attrs.append(_attr(k, {"intValue": str(rng.randint(49152, 65535))}))
+            elif k == "DestinationIp":
+                attrs.append(_attr(k, {"stringValue": rng.choice(self.dst_ips)}))
+            elif k == "UtcTime":
+                attrs.append(_attr(k, {"stringValue": _utc(self.ns)}))
+            else:
+                attrs.append(kv)  # 변하지 않는 값은 템플릿 객체 공유
+        for i in range(len(attrs), self.cfg.attr_count):
+            attrs.append(_attr(f"pad.{i}", {"stringValue": "x" * 16}))
+        span = {
+            "spanId": self._hex(16),
+            "parentSpanId": tmpl.get("parentSpanId"),
+            "flags": tmpl.get("flags"),
+            "name": tmpl.get("name"),
+            "kind": tmpl.get("kind"),
+            "startTimeUnixNano": str(self.ns),
+            "endTimeUnixNano": str(self.ns + 1_000_000),
+            "attributes": attrs,
+        }
+        if trace_id:
+            span["traceId"] = trace_id
+        return span
+
+    def _resource(self, host: int):
+        attrs = []
+        for kv in self.resource.get("attributes", []):
+            if kv.get("key") == "service.instance.id":
+                kv = _attr(kv["key"], {"stringValue": f"synth-host-{host:04d}"})
+            attrs.append(kv)
+        return {"attributes": attrs}
+
+    def payloads(self) -> Iterator[Dict[str, Any]]:
+        cfg, rng = self.cfg, self.rng
+        remaining = cfg.traces
+        while remaining > 0:
+            n = min(cfg.traces_per_payload, remaining)
+            remaining -= n
+            host = rng.randrange(cfg.hosts)
+            spans = []
+            for _ in range(n):
+                tid = "" if rng.random() < cfg.orphan_ratio else self._hex(32)
+                for _ in range(cfg.spans_per_trace):
+                    spans.append(self._span(rng.choice(self.templates), tid))
+            yield {
+                "resourceSpans": [
+                    {
+                        "resource": self._resource(host),
+                        "scopeSpans": [{"scope": {"name": "sysmon.etw"}, "spans": spans}],
+                    }
+                ]
+            }
+
+
+def generate(cfg: SynthConfig) -> List[Dict[str, Any]]:
+    return list(SynthGenerator(cfg).payloads())
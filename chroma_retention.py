@@ -0,0 +1,272 @@
+import argparse, gzip, json, os, threading, time
+from typing import Any, Dict, List, Optional, Tuple
+
+from chroma_setup import (
+    CHROMA_ARCHIVE_DIR,
+    CHROMA_HNSW_CONSTRUCTION_EF,
+    CHROMA_HNSW_M,
+    CHROMA_HNSW_SEARCH_EF,
+    CHROMA_MAX_DOCS,
+    CHROMA_RETENTION_DAYS,
+    CHROMA_RETENTION_INTERVAL_SEC,
+    get_client,
+    get_collection,
+    get_decision_collection,
+    get_embed_fn,
+    hnsw_metadata,
+)
+from metrics import ERRORS, REGISTRY
+
+# 요약/판단 컬렉션 보존 정리. 기준은 BatchWriter가 기록하는 indexed_at(epoch 초)
+#   - days: indexed_at이 N일 지난 문서 삭제
+#   - max_docs: 문서 수가 상한을 넘으면 오래된 순으로 삭제
+#   삭제 전 archive_dir이 있으면 id/문서/메타/임베딩을 <컬렉션>-<시각>.jsonl.gz로 보관
+# indexed_at이 없는 예전 문서는 기간 정리에서 제외, 용량 정리에서는 가장 오래된 것으로 취급
+# --rebuild: 현재 HNSW 설정(CHROMA_HNSW_*)으로 새 컬렉션에 복사 후 교체 (원본은 교체가 끝난 뒤 삭제)
+#   (M/construction_ef 변경, 삭제가 쌓인 인덱스 compaction). 복사 중 기록은 빠지므로 consumer를 멈추고 실행
+# --migrate-decisions: 요약 컬렉션에 섞여 있던 final_decision 문서를 판단 컬렉션으로 이동
+# 실행: python -m chroma_retention --days 30 --max-docs 200000 [--archive-dir ./archive] [--dry-run]
+
+PRUNED = REGISTRY.counter(
+    "trace_chroma_pruned_total",
+    "Documents removed by retention (reason: age, size)",
+    ("collection", "reason"),
+)
+
+_PAGE = 1000  # get/delete/upsert 한 번에 다루는 문서 수
+
+
+def _pages(collection, include: List[str], where=None):
+    # offset 페이지 순회 (순회 중 삭제하지 말 것)
+    offset = 0
+    while True:
+        kw: Dict[str, Any] = {"include": include, "limit": _PAGE, "offset": offset}
+        if where:
+            kw["where"] = where
+        res = collection.get(**kw)
+        ids = res.get("ids") or []
+        if not ids:
+            return
+        yield res
+        offset += len(ids)
+
+
+def _column(res, key: str, n: int):
+    col = res.get(key)
+    return [None] * n if col is None else col
+
+
+def plan(collection, days: float = 0, max_docs: int = 0, now: Optional[float] = None):
+    # 삭제할 id 목록: (기간 초과, 용량 초과, indexed_at 없는 문서 수)
+    cutoff = (now or time.time()) - days * 86400
+    expired: List[str] = []
+    keep: List[Tuple[float, str]] = []
+    unstamped = 0
+    for res in _pages(collection, ["metadatas"]):
+        ids = res["ids"]
+        for doc_id, meta in zip(ids, _column(res, "metadatas", len(ids))):
+            ts = (meta or {}).get("indexed_at")
+            if not isinstance(ts, (int, float)):
+                unstamped += 1
+                keep.append((float("-inf"), doc_id))
+            elif days > 0 and ts < cutoff:
+                expired.append(doc_id)
+            else:
+                keep.append((float(ts), doc_id))
+    overflow: List[str] = []
+    if max_docs > 0 and len(keep) > max_docs:
+        keep.sort()
+        overflow = [doc_id for _, doc_id in keep[: len(keep) - max_docs]]
+    return expired, overflow, unstamped
+
+
+def _archive_path(archive_dir: str, name: str):
+    os.makedirs(archive_dir, exist_ok=True)
+    return os.path.join(archive_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+
+
+def _tolist(v):
+    return v.tolist() if hasattr(v, "tolist") else v
+
+
+def _delete(collection, ids: List[str], fp=None):
+    for i in range(0, len(ids), _PAGE):
+        batch = ids[i : i + _PAGE]
+        if fp is not None:
+            res = collection.get(ids=batch, include=["documents", "metadatas", "embeddings"])
+            n = len(res["ids"])
+            for row in zip(
+                res["ids"],
+                _column(res, "documents", n),
+                _column(res, "metadatas", n),
+                _column(res, "embeddings", n),
+            ):
+                doc_id, doc, meta, emb = row
+                rec = {"id": doc_id, "document": doc, "metadata": meta, "embedding": _tolist(emb)}
+                fp.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        collection.delete(ids=batch)
+
+
+def prune(
+    collection,
+    days: float = CHROMA_RETENTION_DAYS,
+    max_docs: int = CHROMA_MAX_DOCS,
+    archive_dir: str = CHROMA_ARCHIVE_DIR,
+    dry_run: bool = False,
+):
+    t0 = time.perf_counter()
+    before = collection.count()
+    expired, overflow, unstamped = plan(collection, days, max_docs)
+    archived = ""
+    if not dry_run and (expired or overflow):
+        if archive_dir:
+            archived = _archive_path(archive_dir, collection.name)
+            with gzip.open(archived, "wt", encoding="utf-8") as fp:
+                _delete(collection, expired, fp)
+                _delete(collection, overflow, fp)
+        else:
+            _delete(collection, expired)
+            _delete(collection, overflow)
+        PRUNED.labels(collection.name, "age").inc(len(expired))
+        PRUNED.labels(collection.name, "size").inc(len(overflow))
+    stats = {
+        "collection": collection.name,
+        "before": before,
+        "expired": len(expired),
+        "overflow": len(overflow),
+        "unstamped": unstamped,
+        "after": before if dry_run else collection.count(),
+        "archive": archived,
+        "dry_run": dry_run,
+        "elapsed_sec": round(time.perf_counter() - t0, 3),
+    }
+    print(
+        f"[CHROMA] retention {collection.name}: {before} → {stats['after']} "
+        f"(age={len(expired)} size={len(overflow)} unstamped={unstamped}"
+        f"{' dry-run' if dry_run else ''}{' archive=' + archived if archived else ''})"
+    )
+    return stats
+
+
+def _copy(src, dst, where=None):
+    # 임베딩까지 그대로 복사 (재임베딩 없음). 복사한 id 목록 반환
+    copied: List[str] = []
+    for res in _pages(src, ["documents", "metadatas", "embeddings"], where):
+        ids = res["ids"]
+        kw: Dict[str, Any] = {"ids": ids, "metadatas": _column(res, "metadatas", len(ids))}
+        if res.get("embeddings") is not None:
+            kw["embeddings"] = res["embeddings"]
+        if res.get("documents") is not None:
+            kw["documents"] = res["documents"]
+        dst.upsert(**kw)
+        copied.extend(ids)
+    return copied
+
+
+def rebuild(
+    name: str,
+    m: int = CHROMA_HNSW_M,
+    construction_ef: int = CHROMA_HNSW_CONSTRUCTION_EF,
+    search_ef: int = CHROMA_HNSW_SEARCH_EF,
+    client=None,
+    embed_fn=None,
+):
+    # 새 HNSW 파라미터로 <name>-rebuild에 복사 → 개수 확인 → 기존을 <name>-backup으로 이름 변경
+    # → 새 컬렉션을 <name>으로 → 성공한 뒤에만 backup 삭제 (중간에 실패해도 원본이 남음)
+    client = client or get_client()
+    embed_fn = embed_fn if embed_fn is not None else get_embed_fn()
+    t0 = time.perf_counter()
+    tmp, backup = f"{name}-rebuild", f"{name}-backup"
+    existing = [c.name for c in client.list_collections()]
+    if backup in existing:
+        if name in existing:
+            client.delete_collection(backup)  # 이전 rebuild가 교체 후 삭제 전에 중단
+        else:
+            # 이전 rebuild가 원본을 backup으로 옮긴 뒤 중단 → 원본 복구
+            print(f"[WARN] rebuild {name}: 중단된 rebuild의 {backup}을 {name}으로 복구")
+            client.get_collection(backup, embedding_function=embed_fn).modify(name=name)
+    if tmp in existing:
+        client.delete_collection(tmp)  # 이전에 중단된 rebuild
+    old = client.get_collection(name, embedding_function=embed_fn)
+    new = client.create_collection(
+        tmp, embedding_function=embed_fn, metadata=hnsw_metadata(m, construction_ef, search_ef)
+    )
+    n = len(_copy(old, new))
+    if new.count() != old.count():
+        client.delete_collection(tmp)
+        raise RuntimeError(f"rebuild {name}: 복사 개수 불일치 ({new.count()} != {old.count()})")
+    old.modify(name=backup)
+    try:
+        new.modify(name=name)
+    except Exception:
+        old.modify(name=name)  # 원본을 되돌리고 새 컬렉션은 <name>-rebuild로 남김
+        raise
+    client.delete_collection(backup)
+    print(
+        f"[CHROMA] rebuild {name}: {n}건, {hnsw_metadata(m, construction_ef, search_ef)} "
+        f"({time.perf_counter() - t0:.1f}s)"
+    )
+    return n
+
+
+def migrate_decisions(src=None, dst=None):
+    # 예전 버전이 요약 컬렉션에 기록한 final_decision 문서 → 판단 컬렉션
+    src = src if src is not None else get_collection()
+    dst = dst if dst is not None else get_decision_collection()
+    ids = _copy(src, dst, {"type": "final_decision"})
+    _delete(src, ids)
+    print(f"[CHROMA] final_decision {len(ids)}건 이동: {src.name} → {dst.name}")
+    return len(ids)
+
+
+def _collections(which: str):
+    out = []
+    if which in ("summaries", "all"):
+        out.append(get_collection())
+    if which in ("decisions", "all"):
+        out.append(get_decision_collection())
+    return out
+
+
+def start_retention(interval_sec: float = CHROMA_RETENTION_INTERVAL_SEC):
+    # consumer 안에서 주기적으로 prune (interval 또는 보존 조건이 0이면 시작하지 않음)
+    if interval_sec <= 0 or (CHROMA_RETENTION_DAYS <= 0 and CHROMA_MAX_DOCS <= 0):
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval_sec)
+            for collection in _collections("all"):
+                try:
+                    prune(collection)
+                except Exception as e:
+                    print(f"[ERR] retention {getattr(collection, 'name', '?')}: {e}")
+                    ERRORS.labels("retention").inc()
+
+    th = threading.Thread(target=loop, name="chroma-retention", daemon=True)
+    th.start()
+    return th
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Chroma 요약/판단 컬렉션 보존 정리 / HNSW rebuild")
+    ap.add_argument("--collection", choices=("summaries", "decisions", "all"), default="all")
+    ap.add_argument("--days", type=float, default=CHROMA_RETENTION_DAYS, help="이 일수보다 오래된 문서 삭제 (0=비활성)")
+    ap.add_argument("--max-docs", type=int, default=CHROMA_MAX_DOCS, help="컬렉션별 문서 수 상한 (0=비활성)")
+    ap.add_argument("--archive-dir", default=CHROMA_ARCHIVE_DIR, help="삭제 전 jsonl.gz 보관 디렉터리")
+    ap.add_argument("--dry-run", action="store_true", help="삭제 대상 수만 출력")
+    ap.add_argument("--rebuild", action="store_true", help="CHROMA_HNSW_* 설정으로 컬렉션 재구성 (consumer 중지 후)")
+    ap.add_argument("--migrate-decisions", action="store_true", help="요약 컬렉션의 final_decision 문서를 판단 컬렉션으로 이동")
+    args = ap.parse_args(argv)
+    if args.migrate_decisions and not args.dry_run:
+        migrate_decisions()
+    if args.days > 0 or args.max_docs > 0:
+        for collection in _collections(args.collection):
+            prune(collection, args.days, args.max_docs, args.archive_dir, args.dry_run)
+    if args.rebuild and not args.dry_run:
+        for collection in _collections(args.collection):
+            rebuild(collection.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -51,16 +51,58 @@
 #     return trace_id
 
 # chroma_setup.py (교체/패치용)
+import atexit
+import json
+from array import array
 import os
-import chromadb
-from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from summary_cache import get_embed_cache, make_key
+from dead_letter import get_dead_letter
+from metrics import REGISTRY, STAGE_LATENCY
+
+# chromadb import, 서버 연결(heartbeat), 컬렉션 준비, 임베딩 함수 생성은 모두
+# 처음 사용할 때(get_*) 한 번만 수행한다. import만으로는 네트워크/디스크 접근 없음.
 
 CHROMA_HOST = os.getenv("CHROMA_HOST", "127.0.0.1")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
-CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "my_log_db")
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "my_log_db")  # trace 요약 (유사 로그 검색 대상)
+# 최종 판단 문서는 별도 컬렉션 (같은 trace id로 요약을 덮어쓰지 않고 검색 인덱스도 키우지 않음)
+CHROMA_DECISION_COLLECTION = os.getenv(
+    "CHROMA_DECISION_COLLECTION", f"{CHROMA_COLLECTION}_decisions"
+)
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
 OPENAI_KEY = os.getenv("CHROMA_OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
 CHROMA_DIR = os.getenv("CHROMA_DIR", "./.chroma")  # 로컬 저장 경로
+# 배치 writer: N건이 모이거나 가장 오래된 문서가 N초 지나면 한 번에 임베딩+upsert (1이면 즉시 기록)
+CHROMA_BATCH_SIZE = int(os.getenv("CHROMA_BATCH_SIZE", "32"))
+CHROMA_BATCH_MAX_AGE_SEC = float(os.getenv("CHROMA_BATCH_MAX_AGE_SEC", "2.0"))
+# flush 실패: 지수 backoff로 N회 재시도 → 그래도 실패하면 배치를 반씩 나눠 실패 문서만 dead-letter로
+CHROMA_FLUSH_MAX_RETRIES = int(os.getenv("CHROMA_FLUSH_MAX_RETRIES", "6"))
+CHROMA_FLUSH_BACKOFF_SEC = float(os.getenv("CHROMA_FLUSH_BACKOFF_SEC", "1.0"))
+CHROMA_FLUSH_BACKOFF_MAX_SEC = float(os.getenv("CHROMA_FLUSH_BACKOFF_MAX_SEC", "60"))
+# 나눠 기록해도 첫 묶음이 전부 실패하면 장애로 보고 N번까지 최대 backoff로 재시도, 그 뒤엔 실패 문서를 모두 dead-letter로
+CHROMA_FLUSH_MAX_SPLIT_ROUNDS = int(os.getenv("CHROMA_FLUSH_MAX_SPLIT_ROUNDS", "3"))
+# 대기 문서 상한: 넘으면 add()가 기록될 때까지 대기 (요약 워커 → Kafka pause로 backpressure)
+CHROMA_MAX_BUFFER = int(os.getenv("CHROMA_MAX_BUFFER", "5000"))
+# 리스트 메타데이터(process_names 등)를 Chroma 배열로 저장 ($contains 필터용, chromadb>=1.1 서버 필요).
+# 기본 0: 기존처럼 문자열 (기존 컬렉션 메타 형식 유지, 배열을 거부하는 이전 서버에서도 동작)
+CHROMA_LIST_META = os.getenv("CHROMA_LIST_META", "0") == "1"
+# 유사 로그 검색: 상위 K개 중 cosine distance <= N (기존 retriever score_threshold 0.7 == distance 0.3)
+SEARCH_K = int(os.getenv("SEARCH_K", "4"))
+SEARCH_MAX_DISTANCE = float(os.getenv("SEARCH_MAX_DISTANCE", "0.3"))
+# HNSW 인덱스 파라미터 (0이면 Chroma 기본값)
+# M/construction_ef는 컬렉션 생성 시에만 적용 → 기존 컬렉션은 python -m chroma_retention --rebuild
+# search_ef는 기존 컬렉션을 열 때도 반영 (클수록 recall↑ 지연↑)
+CHROMA_HNSW_M = int(os.getenv("CHROMA_HNSW_M", "0"))
+CHROMA_HNSW_CONSTRUCTION_EF = int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "0"))
+CHROMA_HNSW_SEARCH_EF = int(os.getenv("CHROMA_HNSW_SEARCH_EF", "0"))
+# 보존 정리 (chroma_retention): 요약/판단 컬렉션 각각에 적용, 0이면 비활성
+CHROMA_RETENTION_DAYS = float(os.getenv("CHROMA_RETENTION_DAYS", "0"))  # indexed_at이 N일 지난 문서 삭제
+CHROMA_MAX_DOCS = int(os.getenv("CHROMA_MAX_DOCS", "0"))  # 문서 수 상한, 넘으면 오래된 순으로 삭제
+CHROMA_ARCHIVE_DIR = os.getenv("CHROMA_ARCHIVE_DIR", "")  # 삭제 전 jsonl.gz로 보관할 디렉터리
+CHROMA_RETENTION_INTERVAL_SEC = float(os.getenv("CHROMA_RETENTION_INTERVAL_SEC", "0"))  # consumer 내 주기 실행
 
 
 def _make_embed_fn():
@@ -69,10 +111,14 @@ def _make_embed_fn():
             "[WARN] OPENAI_API_KEY/CHROMA_OPENAI_API_KEY가 없어 임베딩 없이 동작합니다."
         )
         return None
+    from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
     return OpenAIEmbeddingFunction(api_key=OPENAI_KEY, model_name=EMBED_MODEL)
 
 
 def _connect_client():
+    import chromadb
+
     # 1) 먼저 HttpClient 시도
     try:
         client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
@@ -91,29 +137,498 @@ def _connect_client():
         return PersistentClient(path=CHROMA_DIR)
 
 
-client = _connect_client()
-embed_fn = _make_embed_fn()
+def hnsw_metadata(
+    m: int = CHROMA_HNSW_M,
+    construction_ef: int = CHROMA_HNSW_CONSTRUCTION_EF,
+    search_ef: int = CHROMA_HNSW_SEARCH_EF,
+):
+    # create_collection metadata (chromadb 0.4~1.x 공통 "hnsw:*" 키)
+    meta: Dict[str, Any] = {"hnsw:space": "cosine"}
+    if m > 0:
+        meta["hnsw:M"] = m
+    if construction_ef > 0:
+        meta["hnsw:construction_ef"] = construction_ef
+    if search_ef > 0:
+        meta["hnsw:search_ef"] = search_ef
+    return meta
+
+
+def set_search_ef(collection, search_ef: int):
+    # 기존 컬렉션의 search_ef 변경 (chromadb>=1.0은 configuration, 이전 버전은 metadata)
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+    except TypeError:
+        meta = {k: v for k, v in (collection.metadata or {}).items() if k != "hnsw:space"}
+        collection.modify(metadata={**meta, "hnsw:search_ef": search_ef})
+
 
-# 컬렉션 준비
-names = [c.name for c in client.list_collections()]
-if CHROMA_COLLECTION in names:
-    collection = client.get_collection(CHROMA_COLLECTION, embedding_function=embed_fn)
-else:
-    collection = client.create_collection(
-        name=CHROMA_COLLECTION,
+def _open_collection(client, embed_fn, name: str = CHROMA_COLLECTION):
+    # 컬렉션 준비
+    names = [c.name for c in client.list_collections()]
+    if name in names:
+        collection = client.get_collection(name, embedding_function=embed_fn)
+        if CHROMA_HNSW_SEARCH_EF > 0:
+            try:
+                set_search_ef(collection, CHROMA_HNSW_SEARCH_EF)
+            except Exception as e:
+                print(f"[WARN] {name} search_ef 변경 실패: {e}")
+        return collection
+    return client.create_collection(
+        name=name,
         embedding_function=embed_fn,
-        metadata={"hnsw:space": "cosine"},
+        metadata=hnsw_metadata(),
     )
 
 
-def upsert_trace_summary(doc_id: str, text: str, metadata: dict):
-    # Chroma는 metadata value 타입이 str/int/float/bool/None 여야 함
+_init_lock = threading.RLock()
+_client = None
+_embed_fn = None
+_embed_ready = False
+_collection = None
+_writer = None
+_decision_collection = None
+_decision_writer = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                _client = _connect_client()
+    return _client
+
+
+def get_embed_fn():
+    global _embed_fn, _embed_ready
+    if not _embed_ready:
+        with _init_lock:
+            if not _embed_ready:
+                _embed_fn = _make_embed_fn()
+                _embed_ready = True
+    return _embed_fn
+
+
+def get_collection():
+    global _collection
+    if _collection is None:
+        with _init_lock:
+            if _collection is None:
+                _collection = _open_collection(get_client(), get_embed_fn())
+    return _collection
+
+
+def get_decision_collection():
+    global _decision_collection
+    if _decision_collection is None:
+        with _init_lock:
+            if _decision_collection is None:
+                _decision_collection = _open_collection(
+                    get_client(), get_embed_fn(), CHROMA_DECISION_COLLECTION
+                )
+    return _decision_collection
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _init_lock:
+            if _writer is None:
+                _writer = BatchWriter(get_collection(), get_embed_fn())
+    return _writer
+
+
+def get_decision_writer():
+    global _decision_writer
+    if _decision_writer is None:
+        with _init_lock:
+            if _decision_writer is None:
+                _decision_writer = BatchWriter(get_decision_collection(), get_embed_fn())
+    return _decision_writer
+
+
+def set_collection(collection, embed_fn=None, decision_collection=None):
+    # 테스트/벤치마크용: 실제 Chroma 대신 주입한 컬렉션/임베딩 함수 사용
+    # decision_collection을 생략하면 판단 문서도 같은 컬렉션에 기록
+    global _collection, _embed_fn, _embed_ready, _writer
+    global _decision_collection, _decision_writer
+    with _init_lock:
+        for w in (_writer, _decision_writer):
+            if w is not None:
+                w.close()
+        _collection, _embed_fn, _embed_ready, _writer = collection, embed_fn, True, None
+        _decision_collection = decision_collection if decision_collection is not None else collection
+        _decision_writer = None
+
+
+def warmup():
+    # 첫 trace 전에 연결/컬렉션/writer를 미리 준비
+    t0 = time.perf_counter()
+    get_writer()
+    return time.perf_counter() - t0
+
+
+def __getattr__(name: str):
+    # 기존 모듈 속성(client/collection/embed_fn/writer) 호환: 접근 시점에 초기화
+    getters = {
+        "client": get_client,
+        "collection": get_collection,
+        "decision_collection": get_decision_collection,
+        "embed_fn": get_embed_fn,
+        "writer": get_writer,
+        "decision_writer": get_decision_writer,
+    }
+    if name in getters:
+        return getters[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _safe_meta(metadata: Optional[Dict[str, Any]]):
+    # Chroma는 metadata value 타입이 str/int/float/bool/None 또는 같은 타입의 비어있지 않은 리스트여야 함
     safe_meta = {}
     for k, v in (metadata or {}).items():
         if isinstance(v, (str, int, float, bool)) or v is None:
             safe_meta[k] = v
+        elif (
+            CHROMA_LIST_META
+            and isinstance(v, (list, tuple))
+            and all(isinstance(x, (str, int, float, bool)) for x in v)
+        ):
+            if v and len({type(x) for x in v}) == 1:
+                safe_meta[k] = list(v)
+            elif v:
+                safe_meta[k] = [str(x) for x in v]
+            # 빈 리스트는 저장 불가 → 키 생략
         else:
             safe_meta[k] = str(v)
-    # upsert
-    collection.upsert(documents=[text], metadatas=[safe_meta], ids=[doc_id])
-    return doc_id
+    return safe_meta
+
+
+def embed_documents(docs: List[str], embed_fn=None):
+    # 캐시에 없는 문서만 한 번의 요청으로 임베딩 (BatchWriter와 검색이 같은 캐시 공유)
+    embed_fn = embed_fn or get_embed_fn()
+    if not embed_fn:
+        return None
+    cache = get_embed_cache()
+    if cache is None:
+        return [[float(x) for x in v] for v in embed_fn(docs)]
+    keys = [make_key("emb", EMBED_MODEL, d) for d in docs]
+    out = [cache.get(k) for k in keys]
+    out = [None if v is None else v.tolist() for v in out]
+    miss = [i for i, v in enumerate(out) if v is None]
+    if miss:
+        vecs = embed_fn([docs[i] for i in miss])
+        for i, v in zip(miss, vecs):
+            v = [float(x) for x in v]
+            out[i] = v
+            cache.put(keys[i], array("f", v))  # float32 4바이트/차원 (float 객체 리스트의 약 1/8)
+    return out
+
+
+def build_where(
+    type: Optional[str] = None,
+    sigma_hit: Optional[bool] = None,
+    process_names: Optional[List[str]] = None,
+    **eq: Any,
+):
+    # 메타데이터 사전 필터 (collection.query의 where). 조건이 없으면 None
+    clauses: List[Dict[str, Any]] = []
+    if type is not None:
+        clauses.append({"type": type})
+    if sigma_hit is not None:
+        clauses.append({"sigma_hit": bool(sigma_hit)})
+    if process_names:
+        procs = [{"process_names": {"$contains": p}} for p in process_names]
+        clauses.append(procs[0] if len(procs) == 1 else {"$or": procs})
+    clauses.extend({k: v} for k, v in eq.items() if v is not None)
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+_SEARCH = STAGE_LATENCY.labels("similarity_search")
+
+
+def search_similar_bulk(
+    texts: List[str],
+    k: int = SEARCH_K,
+    where: Any = None,
+    max_distance: Optional[float] = SEARCH_MAX_DISTANCE,
+):
+    # 여러 trace를 한 번에 임베딩하고 where 조건별로 collection.query 1회씩 실행해 trace별로 되돌림.
+    # where: None | dict(전체 공통) | list(trace별, 같은 조건끼리 묶어서 질의)
+    # 반환: texts와 같은 순서의 [{"id", "document", "metadata", "distance"}, ...] 리스트
+    if not texts:
+        return []
+    wheres = where if isinstance(where, list) else [where] * len(texts)
+    groups: Dict[str, List[int]] = {}
+    for i, w in enumerate(wheres):
+        groups.setdefault(json.dumps(w, sort_keys=True, default=str), []).append(i)
+    out: List[List[Dict[str, Any]]] = [[] for _ in texts]
+    with _SEARCH.time():
+        collection = get_collection()
+        with _EMBED.time():
+            embeddings = embed_documents(texts)
+        for idx in groups.values():
+            kw: Dict[str, Any] = {"n_results": k, "include": ["documents", "metadatas", "distances"]}
+            if wheres[idx[0]]:
+                kw["where"] = wheres[idx[0]]
+            if embeddings is None:
+                res = collection.query(query_texts=[texts[i] for i in idx], **kw)
+            else:
+                res = collection.query(query_embeddings=[embeddings[i] for i in idx], **kw)
+            for j, i in enumerate(idx):
+                docs = (res.get("documents") or [[]] * len(idx))[j] or []
+                metas = (res.get("metadatas") or [[]] * len(idx))[j] or []
+                dists = (res.get("distances") or [[]] * len(idx))[j] or []
+                for doc_id, doc, meta, dist in zip(res["ids"][j], docs, metas, dists):
+                    if max_distance is None or dist <= max_distance:
+                        out[i].append(
+                            {"id": doc_id, "document": doc, "metadata": meta or {}, "distance": dist}
+                        )
+    return out
+
+
+_EMBED = STAGE_LATENCY.labels("embed")
+_UPSERT = STAGE_LATENCY.labels("chroma_upsert")
+_DOCS = REGISTRY.counter("trace_chroma_documents_total", "Documents written to Chroma")
+_FLUSH_ERRORS = REGISTRY.counter(
+    "trace_chroma_flush_errors_total",
+    "Failed Chroma batch flushes (retry: backed off, split: batch split after retries, all_failed: split round requeued)",
+    ("result",),
+)
+_DROPPED = REGISTRY.counter(
+    "trace_chroma_dropped_documents_total",
+    "Documents that failed on their own after retries (dead_letter: stored, lost: not stored)",
+    ("result",),
+)
+
+
+class BatchWriter:
+    # trace 요약/최종 판단 문서를 모아 한 번의 임베딩 요청 + 한 번의 upsert로 기록
+    def __init__(
+        self,
+        collection,
+        embed_fn=None,
+        max_batch: int = CHROMA_BATCH_SIZE,
+        max_age_sec: float = CHROMA_BATCH_MAX_AGE_SEC,
+        max_retries: int = CHROMA_FLUSH_MAX_RETRIES,
+        backoff_sec: float = CHROMA_FLUSH_BACKOFF_SEC,
+        backoff_max_sec: float = CHROMA_FLUSH_BACKOFF_MAX_SEC,
+        max_buffer: int = CHROMA_MAX_BUFFER,
+        max_split_rounds: int = CHROMA_FLUSH_MAX_SPLIT_ROUNDS,
+    ):
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.max_batch = max(1, max_batch)
+        self.max_age = max_age_sec
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff_sec
+        self.backoff_max = backoff_max_sec
+        self.max_buffer = max(self.max_batch, max_buffer)
+        self._buf: Dict[str, tuple] = {}  # id -> (document, metadata), 같은 id는 마지막 값 우선
+        self._callbacks: Dict[str, List[Callable[[], Any]]] = {}  # id -> upsert 성공 시 호출
+        self._first_ts: Optional[float] = None
+        self.max_split_rounds = max(0, max_split_rounds)
+        self._failures = 0  # 연속 flush 실패 횟수
+        self._split_rounds = 0  # 나눠 기록해도 전부 실패해 다시 넣은 횟수
+        self._retry_at = 0.0  # backoff 중이면 다음 시도 시각
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # flush 순서 보장
+        self._stop = threading.Event()
+        self.last_flush_ms = 0.0
+        self.flushes = 0
+        self.dropped = 0
+        self.verbose = True
+        self._thread = None
+        if self.max_batch > 1 and self.max_age > 0:
+            self._thread = threading.Thread(
+                target=self._age_loop, name="chroma-writer", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.close)
+
+    def add(
+        self,
+        doc_id: str,
+        document: str,
+        metadata: Optional[Dict[str, Any]],
+        on_durable: Optional[Callable[[], Any]] = None,
+    ):
+        # on_durable: 이 문서가 포함된 배치의 upsert가 성공한 뒤 flush 스레드에서 호출
+        # indexed_at(epoch 초): 보존 기간/용량 정리 기준 (chroma_retention)
+        meta = _safe_meta(metadata)
+        meta.setdefault("indexed_at", int(time.time()))
+        self._wait_for_room(doc_id)
+        with self._lock:
+            if not self._buf:
+                self._first_ts = time.time()
+            self._buf[doc_id] = (document, meta)
+            if on_durable is not None:
+                self._callbacks.setdefault(doc_id, []).append(on_durable)
+            full = len(self._buf) >= self.max_batch
+        if full:
+            self.flush()
+        return doc_id
+
+    def _wait_for_room(self, doc_id: str):
+        # 버퍼가 가득 차면 (주로 Chroma 장애로 backoff 중) 기록되거나 dead-letter로 빠질 때까지 대기
+        while True:
+            with self._lock:
+                if len(self._buf) < self.max_buffer or doc_id in self._buf:
+                    return
+                delay = self._retry_at - time.time()
+            if delay > 0:
+                time.sleep(min(delay, 1.0))
+            else:
+                self.flush()
+
+    def _age_loop(self):
+        while not self._stop.wait(self.max_age / 2):
+            first = self._first_ts
+            if first is not None and time.time() - first >= self.max_age:
+                self.flush()
+
+    def _write(self, ids: List[str], docs: List[str], metas: List[Any]):
+        # 임베딩 + upsert 1회. (임베딩 초, upsert 초)
+        t0 = time.perf_counter()
+        embeddings = self._embed(docs)
+        t1 = time.perf_counter()
+        if embeddings is None:
+            self.collection.upsert(ids=ids, documents=docs, metadatas=metas)
+        else:
+            self.collection.upsert(
+                ids=ids, documents=docs, metadatas=metas, embeddings=embeddings
+            )
+        return t1 - t0, time.perf_counter() - t1
+
+    def _write_split(self, ids: List[str], docs: List[str], metas: List[Any]):
+        # 반씩 나눠 기록 → 혼자서도 실패하는 문서만 골라냄. (기록된 id, [(실패 id, 오류)])
+        try:
+            self._write(ids, docs, metas)
+            return list(ids), []
+        except Exception as e:
+            if len(ids) == 1:
+                return [], [(ids[0], e)]
+        mid = len(ids) // 2
+        ok1, bad1 = self._write_split(ids[:mid], docs[:mid], metas[:mid])
+        ok2, bad2 = self._write_split(ids[mid:], docs[mid:], metas[mid:])
+        return ok1 + ok2, bad1 + bad2
+
+    def flush(self, force: bool = False):
+        # force: backoff 대기 무시 (종료 시)
+        with self._flush_lock:
+            with self._lock:
+                if not self._buf:
+                    return 0
+                if not force and time.time() < self._retry_at:
+                    return 0
+                batch, self._buf, self._first_ts = self._buf, {}, None
+                callbacks, self._callbacks = self._callbacks, {}
+            ids = list(batch.keys())
+            docs = [d for d, _ in batch.values()]
+            metas = [m for _, m in batch.values()]
+            t0 = time.perf_counter()
+            try:
+                t_embed, t_upsert = self._write(ids, docs, metas)
+            except Exception as e:
+                self._failures += 1
+                if self._failures <= self.max_retries:
+                    delay = min(self.backoff_max, self.backoff * 2 ** (self._failures - 1))
+                    print(
+                        f"[ERR] chroma batch flush 실패 (n={len(ids)}, {self._failures}/{self.max_retries}), "
+                        f"{delay:.1f}s 후 재시도: {e}"
+                    )
+                    _FLUSH_ERRORS.labels("retry").inc()
+                    self._requeue(batch, callbacks, time.time() + delay)
+                    return 0
+                _FLUSH_ERRORS.labels("split").inc()
+                return self._finish_split(batch, callbacks, e)
+            self._failures, self._retry_at, self._split_rounds = 0, 0.0, 0
+            _EMBED.observe(t_embed)
+            _UPSERT.observe(t_upsert)
+            _DOCS.inc(len(ids))
+            self.flushes += 1
+            self.last_flush_ms = (time.perf_counter() - t0) * 1000
+            self._fire(callbacks, ids)
+            if self.verbose:
+                print(
+                    f"[CHROMA] flush n={len(ids)} embed={t_embed * 1000:.1f}ms "
+                    f"upsert={t_upsert * 1000:.1f}ms total={self.last_flush_ms:.1f}ms"
+                )
+            return len(ids)
+
+    def _requeue(self, batch: Dict[str, tuple], callbacks, retry_at: float):
+        with self._lock:
+            # 실패한 배치를 다시 버퍼에 (그 사이 들어온 같은 id는 최신 값 유지)
+            for doc_id, v in batch.items():
+                self._buf.setdefault(doc_id, v)
+            for doc_id, cbs in callbacks.items():
+                self._callbacks[doc_id] = cbs + self._callbacks.get(doc_id, [])
+            if self._first_ts is None:
+                self._first_ts = time.time()
+            self._retry_at = retry_at
+
+    def _finish_split(self, batch: Dict[str, tuple], callbacks, err: Exception):
+        # 재시도 한도 초과: max_batch 단위로 나눠 기록, 실패한 묶음은 반씩 나눠 혼자서도 실패하는 문서만 dead-letter로
+        ids = list(batch.keys())
+        ok: List[str] = []
+        bad: List[tuple] = []
+        for i in range(0, len(ids), self.max_batch):
+            part = ids[i : i + self.max_batch]
+            o, b = self._write_split(part, [batch[d][0] for d in part], [batch[d][1] for d in part])
+            if not ok and not o and len(part) > 1 and self._split_rounds < self.max_split_rounds:
+                # 첫 묶음이 문서 하나하나까지 전부 실패 = Chroma 장애일 가능성 → 최대 backoff로 재시도.
+                # max_split_rounds번 넘게 계속되면 (문서가 모두 거부되는 경우 등) 아래에서 dead-letter로 → 무한 재시도 없음
+                self._split_rounds += 1
+                print(
+                    f"[ERR] chroma flush 전부 실패 (n={len(ids)}, {self._split_rounds}/{self.max_split_rounds}), "
+                    f"{self.backoff_max:.1f}s 후 재시도: {err}"
+                )
+                _FLUSH_ERRORS.labels("all_failed").inc()
+                self._requeue(batch, callbacks, time.time() + self.backoff_max)
+                return 0
+            ok += o
+            bad += b
+        self._failures, self._retry_at, self._split_rounds = 0, 0.0, 0
+        _DOCS.inc(len(ok))
+        done = list(ok)
+        dead = get_dead_letter()
+        for doc_id, e in bad:
+            doc, meta = batch[doc_id]
+            stored = dead.write(
+                "chroma_document",
+                {"collection": getattr(self.collection, "name", ""), "id": doc_id,
+                 "document": doc, "metadata": meta, "error": f"{type(e).__name__}: {e}"},
+            )
+            _DROPPED.labels("dead_letter" if stored else "lost").inc()
+            self.dropped += 1
+            print(f"[ERR] chroma 문서 기록 포기 id={doc_id} ({'dead-letter 보관' if stored else '보관 실패, 커밋 보류'}): {e}")
+            if stored:
+                done.append(doc_id)  # dead-letter에 남았으므로 offset 진행 허용
+        self._fire(callbacks, done)
+        return len(ok)
+
+    def _fire(self, callbacks, ids: List[str]):
+        for doc_id in ids:
+            for cb in callbacks.get(doc_id, ()):
+                try:
+                    cb()
+                except Exception as e:
+                    print(f"[ERR] chroma flush callback 실패: {e}")
+
+    def _embed(self, docs):
+        # 캐시 히트된 요약은 재임베딩하지 않음
+        if not self.embed_fn:
+            return None
+        return embed_documents(docs, self.embed_fn)
+
+    def close(self):
+        self._stop.set()
+        self.flush(force=True)
+
+
+def upsert_trace_summary(doc_id: str, text: str, metadata: dict, on_durable=None):
+    # 배치 writer에 적재 (CHROMA_BATCH_SIZE/CHROMA_BATCH_MAX_AGE_SEC 기준으로 flush)
+    # 같은 trace id는 같은 문서 id로 upsert → 재처리(replay)해도 중복 문서 없음
+    return get_writer().add(doc_id, text, metadata, on_durable)
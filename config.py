@@ -14,7 +14,92 @@ CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "my_log_db")
 
 KAFKA_BOOTSTRAP = os.getenv("KAFKA_BOOTSTRAP", "127.0.0.1:29092")
 RAW_TOPIC = os.getenv("RAW_TOPIC", "raw_trace")
+KAFKA_GROUP_ID = os.getenv("KAFKA_GROUP_ID", "trace-summary-writer")
+# offset commit: auto(기본, 기존 auto commit) | durable(요약이 Chroma에 기록된 trace까지만 커밋, at-least-once)
+KAFKA_COMMIT_MODE = os.getenv("KAFKA_COMMIT_MODE", "auto")
+KAFKA_COMMIT_INTERVAL_SEC = float(os.getenv("KAFKA_COMMIT_INTERVAL_SEC", "5"))
+KAFKA_MAX_POLL_RECORDS = int(os.getenv("KAFKA_MAX_POLL_RECORDS", "50"))
+KAFKA_AUTO_OFFSET_RESET = os.getenv("KAFKA_AUTO_OFFSET_RESET", "latest")  # 커밋된 offset이 없을 때만 적용
 
 TRACE_INACTIVITY_SEC = float(os.getenv("TRACE_INACTIVITY_SEC", "5"))  # 5초 단위로 받아오게됨
 TRACE_MAX_EVENTS = int(os.getenv("TRACE_MAX_EVENTS", "500"))
 FLUSH_TICK_SEC = float(os.getenv("FLUSH_TICK_SEC", "1.0"))
+
+# TraceAggregator 전역 메모리 상한 (0이면 무제한) / 희생 trace 선택 정책 / spill 저장소
+AGG_MAX_BUFFERED_EVENTS = int(os.getenv("AGG_MAX_BUFFERED_EVENTS", "200000"))
+AGG_MAX_OPEN_TRACES = int(os.getenv("AGG_MAX_OPEN_TRACES", "20000"))
+AGG_EVICTION = os.getenv("AGG_EVICTION", "oldest")  # oldest | largest
+AGG_SPILL_PATH = os.getenv("AGG_SPILL_PATH", "")  # 예: ./.spill/aggregator.sqlite3
+
+# 재시도 한도를 넘겨 기록/요약하지 못한 항목 보관 (dead_letter.py, 비우면 보관하지 않고 커밋 보류)
+DEAD_LETTER_PATH = os.getenv("DEAD_LETTER_PATH", "./.dead_letter.jsonl")
+
+# traceId 없는 span 그룹핑: span(기본, 기존처럼 span마다 개별) | process | host
+# process/host는 no-trace 문서 id가 바뀌므로 명시적으로 켤 때만
+ORPHAN_GROUPING = os.getenv("ORPHAN_GROUPING", "span")
+ORPHAN_WINDOW_SEC = float(os.getenv("ORPHAN_WINDOW_SEC", "60"))
+
+# 1이면 Kafka 메시지를 dict로 디코딩하지 않고 span 단위로 스트리밍 파싱 (ijson 필요)
+STREAM_DECODE = os.getenv("STREAM_DECODE", "0") == "1"
+# 메시지 디코더: json | orjson | stream | otlp-proto (decoders.py)
+PAYLOAD_DECODER = os.getenv("PAYLOAD_DECODER", "stream" if STREAM_DECODE else "json")
+
+# 요약+업서트 워커 풀 / Kafka backpressure
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_MAX_INFLIGHT = int(os.getenv("SUMMARY_MAX_INFLIGHT", "32"))
+POLL_TIMEOUT_MS = int(os.getenv("POLL_TIMEOUT_MS", "500"))
+BUSY_POLL_TIMEOUT_MS = int(os.getenv("BUSY_POLL_TIMEOUT_MS", "20"))  # 파티션 pause 중 poll 대기
+
+# trace_id 해시 기준 aggregator 샤드 프로세스 수 (1이면 단일 프로세스, 0이면 CPU 코어 수)
+CONSUMER_SHARDS = int(os.getenv("CONSUMER_SHARDS", "1"))
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "64"))  # 샤드별 대기 poll 배치 수, 넘으면 파티션 pause
+
+# Prometheus 포맷 메트릭 엔드포인트 (0이면 비활성)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# 긴 trace 증분 요약: N 이벤트 단위 구간 요약 후 병합 (병합 1회당 최대 FANIN개 요약)
+SUMMARY_CHUNK_EVENTS = int(os.getenv("SUMMARY_CHUNK_EVENTS", "100"))
+SUMMARY_MERGE_FANIN = int(os.getenv("SUMMARY_MERGE_FANIN", "8"))
+# Kafka consumer / backfill 실행 단위: 여러 번 flush되는 trace의 누적 요약 보관 상한
+ROLLING_MAX_TRACES = int(os.getenv("ROLLING_MAX_TRACES", "10000"))
+ROLLING_TTL_SEC = float(os.getenv("ROLLING_TTL_SEC", "3600"))
+
+# 요약 후 LangGraph 판단 (search → judgment → [suspicious면 final_decision] → save)
+JUDGE_ENABLED = os.getenv("JUDGE_ENABLED", "0") == "1"
+JUDGE_CONCURRENCY = int(os.getenv("JUDGE_CONCURRENCY", "4"))
+JUDGE_BATCH_SIZE = int(os.getenv("JUDGE_BATCH_SIZE", "16"))
+JUDGE_BATCH_MAX_WAIT_SEC = float(os.getenv("JUDGE_BATCH_MAX_WAIT_SEC", "0.5"))
+JUDGE_MAX_PENDING = int(os.getenv("JUDGE_MAX_PENDING", "64"))
+
+# LLM 프롬프트 본문(clean text) 토큰 예산. 반복 줄 접기 후 중요도 순으로 잘라냄 (0이면 무제한)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+
+# LLM 스케줄러: 0이면 CHAT_MODEL 기본 한도 (llm_scheduler.MODEL_LIMITS)
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_DEADLINE_SEC = float(os.getenv("LLM_DEADLINE_SEC", "120"))  # 대기+재시도 포함 요청 수명
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE_SEC = float(os.getenv("LLM_BACKOFF_BASE_SEC", "0.5"))
+LLM_BACKOFF_MAX_SEC = float(os.getenv("LLM_BACKOFF_MAX_SEC", "20"))
+LLM_BURST_SEC = float(os.getenv("LLM_BURST_SEC", "1"))  # 순간 허용량 = 한도의 N초 분량
+
+# 요약/임베딩 캐시 (메모리 LRU + 선택적 SQLite). SUMMARY_CACHE_SIZE=0이면 비활성
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "4096"))
+SUMMARY_CACHE_TTL_SEC = float(os.getenv("SUMMARY_CACHE_TTL_SEC", "86400"))
+SUMMARY_CACHE_DB = os.getenv("SUMMARY_CACHE_DB", "")  # 예: ./.summary_cache.sqlite3
+SUMMARY_CACHE_DB_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_DB_MAX_ENTRIES", "100000"))
+# 임베딩 캐시: 요약 캐시와 분리된 메모리 LRU (벡터는 float32 배열로, 1536차원 ≈ 6KB/항목). 0이면 비활성
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "1024"))
+
+# trace 구조 fingerprint → 이전 판단 캐시 (히트 시 검색/LLM 판단 생략). DECISION_CACHE_SIZE=0이면 비활성
+DECISION_CACHE_SIZE = int(os.getenv("DECISION_CACHE_SIZE", "10000"))
+DECISION_CACHE_TTL_SEC = float(os.getenv("DECISION_CACHE_TTL_SEC", "3600"))
+DECISION_CACHE_DB = os.getenv("DECISION_CACHE_DB", "")  # 예: ./.decision_cache.sqlite3
+
+# LLM 판단 전 로컬 이상 점수 게이트 (numpy 필요). 점수 = 트래픽 통계 대비 z-score 상위 3개 평균
+ANOMALY_GATE = os.getenv("ANOMALY_GATE", "1") == "1"
+ANOMALY_THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "3.0"))  # 이 점수 이상만 LLM 판단
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "200"))  # 통계가 쌓이기 전엔 모두 통과
+ANOMALY_DECAY = float(os.getenv("ANOMALY_DECAY", "0.999"))  # trace 1건당 기존 통계 유지 비율
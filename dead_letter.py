@@ -0,0 +1,66 @@
+import json, os, threading, time
+from typing import Any, Dict, Iterator, Optional
+
+from config import DEAD_LETTER_PATH
+from metrics import REGISTRY
+
+# 재시도 한도를 넘겨 끝내 기록하지 못한 항목 보관 (JSONL, 한 줄에 하나).
+# 여기 기록된 뒤에만 Kafka offset 커밋을 허용 → 유실 대신 나중에 재처리 가능.
+# 경로가 비어 있거나 기록에 실패하면 False → 호출자는 커밋을 보류 (trace_kafka_held_traces로 보임)
+
+DEAD_LETTERS = REGISTRY.counter(
+    "trace_dead_letter_total", "Items written to the dead-letter store", ("kind",)
+)
+
+
+class DeadLetterStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, kind: str, record: Dict[str, Any]):
+        if not self.path:
+            return False
+        line = json.dumps({"kind": kind, "ts": time.time(), **record}, ensure_ascii=False, default=str)
+        try:
+            with self._lock:
+                d = os.path.dirname(self.path)
+                if d:
+                    os.makedirs(d, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as fp:
+                    fp.write(line + "\n")
+                    fp.flush()
+                    os.fsync(fp.fileno())
+        except OSError as e:
+            print(f"[ERR] dead-letter 기록 실패 ({self.path}): {e}")
+            return False
+        DEAD_LETTERS.labels(kind).inc()
+        return True
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as fp:
+            for line in fp:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+_store: Optional[DeadLetterStore] = None
+_store_lock = threading.Lock()
+
+
+def get_dead_letter():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DeadLetterStore(DEAD_LETTER_PATH)
+    return _store
+
+
+def set_dead_letter(store: Optional[DeadLetterStore]):
+    # 테스트/벤치마크용 교체
+    global _store
+    _store = store
@@ -0,0 +1,124 @@
+import argparse, json, threading, time
+from typing import Any, Dict, Optional
+from config import DECISION_CACHE_SIZE, DECISION_CACHE_TTL_SEC, DECISION_CACHE_DB
+from metrics import REGISTRY
+from summary_cache import SummaryCache, make_key
+
+# 같은 행위 구조(이벤트 유형/프로세스/도메인/목적지 IP·포트/sigma)의 trace는 이전 판단을 재사용.
+# 키는 build_summary_meta(= TraceFeatures.meta())의 정렬된 집합들로 만든 fingerprint
+
+FINGERPRINT_KEYS = ("event_types", "process_names", "domains", "dst_ips", "dst_ports", "sigma_hit")
+
+LOOKUPS = REGISTRY.counter(
+    "trace_judgment_cache_total", "Decision cache lookups by result (hit, miss)", ("result",)
+)
+SAVED_SECONDS = REGISTRY.counter(
+    "trace_judgment_cache_saved_seconds_total",
+    "Estimated judgment time skipped by decision cache hits (avg miss latency per hit)",
+)
+
+
+def trace_fingerprint(meta: Dict[str, Any]):
+    parts = [meta.get(k) for k in FINGERPRINT_KEYS]
+    return make_key("fp", json.dumps(parts, ensure_ascii=False, sort_keys=True))
+
+
+class DecisionCache:
+    def __init__(self, cache: SummaryCache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_sec = 0.0
+        self._miss_avg: Optional[float] = None  # 그래프 실행 1건당 평균 시간 (EMA)
+
+    def get(self, fingerprint: Optional[str]):
+        if not fingerprint:
+            return None
+        hit = self.cache.get(fingerprint)
+        with self._lock:
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if self._miss_avg:
+                    self.saved_sec += self._miss_avg
+                    SAVED_SECONDS.inc(self._miss_avg)
+        LOOKUPS.labels("miss" if hit is None else "hit").inc()
+        return hit
+
+    def put(self, fingerprint: Optional[str], decision: str, reason: str):
+        if fingerprint and decision not in ("error", "unknown"):
+            self.cache.put(fingerprint, {"decision": decision, "reason": reason, "ts": time.time()})
+
+    def observe_miss(self, seconds_per_trace: float):
+        with self._lock:
+            a = self._miss_avg
+            self._miss_avg = seconds_per_trace if a is None else a * 0.8 + seconds_per_trace * 0.2
+
+    def invalidate(self, fingerprint: str):
+        return self.cache.delete(fingerprint)
+
+    def clear(self):
+        return self.cache.clear()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        total = self.hits + self.misses
+        return {
+            "lookups": total,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate(), 4),
+            "saved_sec": round(self.saved_sec, 3),
+            "saved_ms_per_trace": round(self.saved_sec * 1000 / total, 2) if total else 0.0,
+            "saved_ms_per_hit": round(self.saved_sec * 1000 / self.hits, 2) if self.hits else 0.0,
+        }
+
+
+_cache: Optional[DecisionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_decision_cache():
+    # 프로세스 단위 판단 캐시 (DECISION_CACHE_SIZE=0이면 None)
+    global _cache
+    if _cache is None and DECISION_CACHE_SIZE > 0:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DecisionCache(
+                    SummaryCache(
+                        DECISION_CACHE_SIZE, DECISION_CACHE_TTL_SEC, DECISION_CACHE_DB or None
+                    )
+                )
+    return _cache
+
+
+def set_decision_cache(cache: Optional[DecisionCache]):
+    # 테스트/벤치마크용 교체
+    global _cache
+    _cache = cache
+
+
+def main():
+    # 수동 무효화: python -m decision_cache --clear | --invalidate <fingerprint>
+    ap = argparse.ArgumentParser(description="trace 판단 캐시 관리 (DECISION_CACHE_DB 대상)")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--clear", action="store_true", help="모든 판단 캐시 삭제")
+    g.add_argument("--invalidate", metavar="FINGERPRINT", help="fingerprint 하나 삭제")
+    args = ap.parse_args()
+    cache = get_decision_cache()
+    if cache is None:
+        print("[WARN] DECISION_CACHE_SIZE=0 → 판단 캐시 비활성")
+        return
+    if args.clear:
+        print(f"[INFO] 판단 캐시 {cache.clear()}건 삭제")
+    else:
+        print(f"[INFO] invalidate {args.invalidate}: {'삭제' if cache.invalidate(args.invalidate) else '없음'}")
+    cache.cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import io, json
+from typing import Any, Dict, Iterator, Optional
+from preprocess import (
+    DICT_FIELDS,
+    EventRecord,
+    SPAN_KEYS,
+    decode_fields,
+    iter_events_from_json_stream,
+    iter_events_from_otlp,
+)
+
+# Kafka 메시지/파일 바이트 -> 이벤트(dict 또는 EventRecord) 디코더.
+# 모든 디코더는 같은 입력이면 span_to_event와 같은 이벤트를 만든다.
+#   json       : 표준 json.loads (기본)
+#   orjson     : orjson.loads (pip install orjson)
+#   stream     : ijson 기반 span 단위 스트리밍 파싱 (pip install ijson)
+#   otlp-proto : 바이너리 OTLP ExportTraceServiceRequest (pip install opentelemetry-proto)
+
+
+class JsonDecoder:
+    name = "json"
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+    def iter_events(self, data: bytes, compact: bool = False) -> Iterator[Any]:
+        return iter_events_from_otlp(self.loads(data), compact)
+
+    def iter_events_from_file(self, fp, compact: bool = False) -> Iterator[Any]:
+        return self.iter_events(fp.read(), compact)
+
+
+class OrjsonDecoder(JsonDecoder):
+    # json.loads만 orjson.loads로 교체한다. orjson은 전체 dict 트리를 만드는 것 외의
+    # 디코딩 방식이 없고, 시간 대부분이 파싱이라 이벤트 매핑은 json 경로를 그대로 쓴다.
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self.loads = orjson.loads
+
+
+class StreamDecoder(JsonDecoder):
+    name = "stream"
+
+    def iter_events(self, data: bytes, compact: bool = False):
+        return iter_events_from_json_stream(io.BytesIO(data), compact)
+
+    def iter_events_from_file(self, fp, compact: bool = False):
+        return iter_events_from_json_stream(fp, compact)
+
+
+class OtlpProtoDecoder:
+    name = "otlp-proto"
+
+    def __init__(self):
+        from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+            ExportTraceServiceRequest,
+        )
+
+        self._request_cls = ExportTraceServiceRequest
+
+    @staticmethod
+    def _value(v):
+        # AnyValue oneof -> JSON 경로(_attr_value)와 같은 파이썬 타입
+        kind = v.WhichOneof("value")
+        if kind == "string_value":
+            return v.string_value
+        if kind == "int_value":
+            return v.int_value
+        if kind == "bool_value":
+            return v.bool_value
+        if kind == "double_value":
+            return v.double_value
+        return None
+
+    def _resource_id(self, resource) -> Optional[str]:
+        found: Dict[str, Any] = {}
+        for kv in resource.attributes:
+            if kv.key in ("service.instance.id", "host.name") and kv.key not in found:
+                found[kv.key] = self._value(kv.value)
+        return found.get("service.instance.id") or found.get("host.name")
+
+    def iter_events(self, data: bytes, compact: bool = False) -> Iterator[Any]:
+        req = self._request_cls.FromString(data)
+        value = self._value
+        for rs in req.resource_spans:
+            rid = self._resource_id(rs.resource)
+            for ss in rs.scope_spans:
+                for span in ss.spans:
+                    a: Dict[str, Any] = {}
+                    for kv in span.attributes:
+                        k = kv.key
+                        if k in SPAN_KEYS and k not in a:
+                            a[k] = value(kv.value)
+                    fields = decode_fields(
+                        span.trace_id.hex() or None,
+                        span.span_id.hex() or None,
+                        span.name,
+                        span.start_time_unix_nano or "",
+                        a,
+                        rid,
+                    )
+                    if compact:
+                        yield EventRecord(*fields)
+                    else:
+                        yield dict(zip(DICT_FIELDS, fields))
+
+    def iter_events_from_file(self, fp, compact: bool = False):
+        return self.iter_events(fp.read(), compact)
+
+
+_DECODERS = {
+    "json": JsonDecoder,
+    "orjson": OrjsonDecoder,
+    "stream": StreamDecoder,
+    "otlp-proto": OtlpProtoDecoder,
+}
+
+
+def get_decoder(name: str = "json"):
+    try:
+        cls = _DECODERS[name]
+    except KeyError:
+        raise ValueError(
+            f"unknown payload decoder '{name}' (choices: {', '.join(_DECODERS)})"
+        ) from None
+    return cls()
+
+
+def available_decoders():
+    out = []
+    for name in _DECODERS:
+        try:
+            get_decoder(name)
+            out.append(name)
+        except ImportError:
+            pass
+    return out
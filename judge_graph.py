@@ -0,0 +1,319 @@
+import asyncio, atexit, queue, threading, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import JUDGE_CONCURRENCY, JUDGE_BATCH_SIZE, JUDGE_BATCH_MAX_WAIT_SEC, JUDGE_MAX_PENDING
+from langgraph_node import (
+    TraceState,
+    search_similar_logs,
+    search_similar_logs_bulk,
+    llm_judgment,
+    final_decision,
+    save_final_decision_to_chroma,
+)
+from llm_scheduler import PRIORITY_HIGH, PRIORITY_NORMAL
+from metrics import ERRORS, REGISTRY
+from decision_cache import get_decision_cache
+from anomaly_scorer import FEATURES, get_scorer
+
+# langgraph_node의 노드를 연결한 판단 그래프:
+#   search → judgment ─(suspicious)→ final_decision → save → END
+#                     └(normal/anomaly)────────────→ save → END
+# 그래프 실행 전: 판단 캐시 → 로컬 이상 점수 게이트(anomaly_scorer) → 배치 내 fingerprint 중복 제거
+
+JUDGED = REGISTRY.counter("trace_judgment_total", "Judged traces by final decision", ("decision",))
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def route_after_judgment(state: TraceState):
+    # 의심(suspicious)일 때만 유사 로그와 함께 재판단
+    return "final_decision" if (state.get("decision") or "").lower() == "suspicious" else "save"
+
+
+def build_graph():
+    from langgraph.graph import StateGraph, END
+
+    g = StateGraph(TraceState)
+    g.add_node("search", search_similar_logs)
+    g.add_node("judgment", llm_judgment)
+    g.add_node("final_decision", final_decision)
+    g.add_node("save", save_final_decision_to_chroma)
+    g.set_entry_point("search")
+    g.add_edge("search", "judgment")
+    g.add_conditional_edges(
+        "judgment", route_after_judgment, {"final_decision": "final_decision", "save": "save"}
+    )
+    g.add_edge("final_decision", "save")
+    g.add_edge("save", END)
+    return g.compile()
+
+
+def get_graph():
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = build_graph()
+    return _graph
+
+
+def _initial_state(
+    trace_id: str,
+    cleaned_trace: str,
+    priority: int = PRIORITY_NORMAL,
+    fingerprint: Optional[str] = None,
+    sigma_lines=None,
+    where=None,
+):
+    st = {"trace_id": trace_id, "cleaned_trace": cleaned_trace, "priority": priority}
+    if fingerprint:
+        st["fingerprint"] = fingerprint
+    if sigma_lines:
+        st["sigma_lines"] = sigma_lines  # 프롬프트 압축 시 sigma 탐지 줄 우선 (prompt_builder)
+    if where:
+        st["where"] = where  # 유사 로그 검색 메타데이터 사전 필터 (chroma_setup.build_where)
+    return st
+
+
+def _result(state: Dict[str, Any]):
+    decision = (state.get("decision") or "unknown").lower()
+    JUDGED.labels(decision).inc()
+    return {
+        "trace_id": state.get("trace_id"),
+        "decision": decision,
+        "reason": state.get("reason", ""),
+        "llm_output": state.get("llm_output", ""),
+    }
+
+
+def _reuse(state: Dict[str, Any], prior: Dict[str, Any], source: str = "판단 캐시 재사용"):
+    # 같은 fingerprint의 이전 판단 재사용(또는 게이트 판단): 검색/LLM 없이 저장만
+    st = {
+        **state,
+        "decision": prior["decision"],
+        "reason": prior.get("reason", ""),
+        "llm_output": f"{source}: {prior['decision']}",
+    }
+    save_final_decision_to_chroma(st)
+    return _result(st)
+
+
+_SIGMA = FEATURES.index("sigma")
+
+
+def _gate(
+    states: List[Dict[str, Any]],
+    vectors: List[Any],
+    results: List[Optional[Dict[str, Any]]],
+    todo: List[int],
+):
+    # 로컬 이상 점수 < threshold인 trace는 LLM 없이 normal로 확정. sigma/최우선 trace는 항상 통과
+    scorer = get_scorer()
+    scored = [i for i in todo if vectors[i] is not None]
+    if scorer is None or not scored:
+        return todo
+    force = [
+        bool(vectors[i][_SIGMA]) or states[i].get("priority", PRIORITY_NORMAL) <= PRIORITY_HIGH
+        for i in scored
+    ]
+    skipped = set()
+    for i, (ok, score) in zip(scored, scorer.gate([vectors[i] for i in scored], force)):
+        if not ok:
+            skipped.add(i)
+            results[i] = _reuse(
+                states[i],
+                {"decision": "normal", "reason": f"로컬 이상 점수 {score:.2f} < {scorer.threshold}"},
+                "로컬 이상 점수 게이트",
+            )
+    return [i for i in todo if i not in skipped]
+
+
+def _prepare(items: Iterable[Tuple], where=None, bulk_search: bool = True):
+    # items: (trace_id, cleaned_trace[, priority[, fingerprint[, anomaly 벡터[, sigma_lines[, where]]]]])
+    # where(인자): trace별 where가 없는 trace에 쓰는 공통 검색 필터
+    # 판단 캐시 히트는 바로 결과로, 이상 점수 게이트에서 걸러진 trace는 normal로,
+    # 같은 배치 안의 같은 fingerprint는 첫 trace만 그래프 실행
+    items = list(items)
+    states = [_initial_state(*it[:4], *it[5:7]) for it in items]
+    vectors = [it[4] if len(it) > 4 else None for it in items]
+    cache = get_decision_cache()
+    results: List[Optional[Dict[str, Any]]] = [None] * len(states)
+    todo: List[int] = []
+    for i, st in enumerate(states):
+        fp = st.get("fingerprint")
+        hit = cache.get(fp) if cache is not None and fp else None
+        if hit is not None:
+            results[i] = _reuse(st, hit)
+        else:
+            todo.append(i)
+    run: List[int] = []
+    followers: Dict[int, List[int]] = {}
+    leaders: Dict[str, int] = {}
+    for i in _gate(states, vectors, results, todo):
+        st = states[i]
+        fp = st.get("fingerprint")
+        if fp and fp in leaders:
+            followers.setdefault(leaders[fp], []).append(i)
+        else:
+            if fp:
+                leaders[fp] = i
+            run.append(i)
+    run_states = [states[i] for i in run]
+    if bulk_search and run_states:
+        # 배치 전체를 한 번에 검색해 두면 search 노드는 건너뜀 (실패 시 trace별 검색으로)
+        if any("where" in st for st in run_states):
+            where = [st.get("where", where) for st in run_states]  # 같은 조건끼리 묶어 질의
+        try:
+            run_states = search_similar_logs_bulk(run_states, where)
+        except Exception as e:
+            print(f"[WARN] 일괄 유사 로그 검색 실패, trace별 검색으로 진행: {e}")
+            ERRORS.labels("search_bulk").inc()
+    return states, results, run, run_states, followers, cache
+
+
+def _finish(plan, outs: List[Any], elapsed: float, concurrency: int):
+    states, results, run, run_states, followers, cache = plan
+    if run and cache is not None:
+        # trace 1건이 실행 슬롯을 점유한 평균 시간 ≈ 캐시 히트 1건이 아낀 시간
+        cache.observe_miss(elapsed * min(concurrency, len(run)) / len(run))
+    for i, st, out in zip(run, run_states, outs):
+        if isinstance(out, BaseException):
+            print(f"[ERR] judge trace={st['trace_id']} {out}")
+            ERRORS.labels("judge").inc()
+            for j in [i] + followers.get(i, []):
+                results[j] = {"trace_id": states[j]["trace_id"], "decision": "error", "reason": str(out)}
+            continue
+        results[i] = res = _result(out)
+        if cache is not None:
+            cache.put(st.get("fingerprint"), res["decision"], res["reason"])
+        for j in followers.get(i, []):
+            results[j] = _reuse(states[j], res)
+    return results
+
+
+def judge_many(
+    items: Iterable[Tuple],
+    concurrency: int = JUDGE_CONCURRENCY,
+    where=None,
+    bulk_search: bool = True,
+):
+    # N개 trace를 최대 concurrency개씩 동시에 판단. 실패한 trace는 decision="error"로 반환
+    plan = _prepare(items, where, bulk_search)
+    run_states = plan[3]
+    outs: List[Any] = []
+    t0 = time.perf_counter()
+    if run_states:
+        outs = get_graph().batch(
+            run_states, config={"max_concurrency": max(1, concurrency)}, return_exceptions=True
+        )
+    return _finish(plan, outs, time.perf_counter() - t0, max(1, concurrency))
+
+
+async def ajudge_many(
+    items: Iterable[Tuple],
+    concurrency: int = JUDGE_CONCURRENCY,
+    where=None,
+    bulk_search: bool = True,
+):
+    plan = await asyncio.to_thread(_prepare, items, where, bulk_search)
+    run_states = plan[3]
+    outs: List[Any] = []
+    t0 = time.perf_counter()
+    if run_states:
+        outs = await get_graph().abatch(
+            run_states, config={"max_concurrency": max(1, concurrency)}, return_exceptions=True
+        )
+    return _finish(plan, outs, time.perf_counter() - t0, max(1, concurrency))
+
+
+def judge_trace(
+    trace_id: str,
+    cleaned_trace: str,
+    priority: int = PRIORITY_NORMAL,
+    fingerprint: Optional[str] = None,
+    vector: Optional[List[float]] = None,
+    sigma_lines=None,
+    where=None,
+):
+    item = (trace_id, cleaned_trace, priority, fingerprint, vector, sigma_lines, where)
+    return judge_many([item], 1, bulk_search=False)[0]
+
+
+class JudgeBatcher:
+    # 요약 워커가 submit한 trace를 모아 judge_many로 판단하는 백그라운드 배처.
+    # 대기열이 max_pending을 넘으면 submit이 블록 → 요약 워커 풀 → Kafka pause로 backpressure 전파
+    def __init__(
+        self,
+        concurrency: int = JUDGE_CONCURRENCY,
+        max_batch: int = JUDGE_BATCH_SIZE,
+        max_wait_sec: float = JUDGE_BATCH_MAX_WAIT_SEC,
+        max_pending: int = JUDGE_MAX_PENDING,
+        on_result=None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_sec
+        self.on_result = on_result
+        self._q: "queue.Queue[Tuple]" = queue.Queue(maxsize=max(1, max_pending))
+        self._stop = threading.Event()
+        self.judged = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._loop, name="judge-batcher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(
+        self,
+        trace_id: str,
+        cleaned_trace: str,
+        priority: int = PRIORITY_NORMAL,
+        fingerprint: Optional[str] = None,
+        vector: Optional[List[float]] = None,
+        sigma_lines=None,
+        where=None,
+    ):
+        # where: 유사 로그 검색 사전 필터 (chroma_setup.build_where)
+        self._q.put((trace_id, cleaned_trace, priority, fingerprint, vector, sigma_lines, where))
+
+    @property
+    def pending(self):
+        return self._q.qsize()
+
+    def _take_batch(self):
+        # 첫 trace가 오면 max_wait 동안 또는 max_batch개가 찰 때까지 모음
+        try:
+            batch = [self._q.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        until = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            left = until - time.monotonic()
+            try:
+                batch.append(self._q.get(timeout=left) if left > 0 else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch: List[Tuple]):
+        for res in judge_many(batch, self.concurrency):
+            self.judged += 1
+            if self.on_result is not None:
+                self.on_result(res)
+        self.batches += 1
+
+    def _loop(self):
+        while not (self._stop.is_set() and self._q.empty()):
+            batch = self._take_batch()
+            if batch:
+                try:
+                    self._run_batch(batch)
+                except Exception as e:
+                    print(f"[ERR] judge batch {e}")
+                    ERRORS.labels("judge").inc()
+
+    def close(self, timeout: Optional[float] = None):
+        # 대기열을 모두 판단한 뒤 종료
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
@@ -1,79 +1,313 @@
-import json, time
-from typing import Any, Dict, List, Tuple
-from kafka import KafkaConsumer
+import os, time
+from collections import deque
+from kafka import ConsumerRebalanceListener, KafkaConsumer
 from config import (
     KAFKA_BOOTSTRAP,
     RAW_TOPIC,
+    KAFKA_GROUP_ID,
+    KAFKA_COMMIT_MODE,
+    KAFKA_COMMIT_INTERVAL_SEC,
+    KAFKA_MAX_POLL_RECORDS,
+    KAFKA_AUTO_OFFSET_RESET,
+    CONSUMER_SHARDS,
     TRACE_INACTIVITY_SEC,
     TRACE_MAX_EVENTS,
     FLUSH_TICK_SEC,
+    AGG_MAX_BUFFERED_EVENTS,
+    AGG_MAX_OPEN_TRACES,
+    AGG_EVICTION,
+    AGG_SPILL_PATH,
+    PAYLOAD_DECODER,
+    SUMMARY_CONCURRENCY,
+    SUMMARY_MAX_INFLIGHT,
+    SUMMARY_CHUNK_EVENTS,
+    ROLLING_MAX_TRACES,
+    ROLLING_TTL_SEC,
+    POLL_TIMEOUT_MS,
+    BUSY_POLL_TIMEOUT_MS,
+    METRICS_PORT,
+    METRICS_HOST,
+    JUDGE_ENABLED,
 )
-from preprocess import extract_events_from_otlp, build_clean_text, build_summary_meta
-from summarize_embed import summarize_korean, save_trace_summary
-
-
-class TraceAggregator:
-    def __init__(self, inactivity_sec: float, max_events: int):
-        self.inactivity = inactivity_sec
-        self.max_events = max_events
-        self.buckets: Dict[str, List[Dict[str, Any]]] = {}
-        self.last_seen: Dict[str, float] = {}
-
-    def add_payload(self, payload: Dict[str, Any]):
-        evs = extract_events_from_otlp(payload)
-        now = time.time()
-        for e in evs:
-            tid = e.get("trace_id") or f"no-trace:{e.get('span_id')}"
-            self.buckets.setdefault(tid, []).append(e)
-            self.last_seen[tid] = now
-
-    def pop_ready(self):
-        now = time.time()
-        ready_ids = []
-        for tid, ts in list(self.last_seen.items()):
-            if (now - ts) >= self.inactivity or len(
-                self.buckets.get(tid, [])
-            ) >= self.max_events:
-                ready_ids.append(tid)
-        out = []
-        for tid in ready_ids:
-            evs = self.buckets.pop(tid, [])
-            self.last_seen.pop(tid, None)
-            if evs:
-                out.append((tid, evs))
-        return out
-
-
-def run():
-    agg = TraceAggregator(TRACE_INACTIVITY_SEC, TRACE_MAX_EVENTS)
-    consumer = KafkaConsumer(
-        RAW_TOPIC,
-        bootstrap_servers=KAFKA_BOOTSTRAP,
-        value_deserializer=lambda m: json.loads(m.decode("utf-8")),
-        auto_offset_reset="latest",
-        enable_auto_commit=True,
-        group_id="trace-summary-writer",
-        consumer_timeout_ms=0,
-        max_poll_records=50,
-    )
-    print(f"[INFO] Consuming topic='{RAW_TOPIC}' @ {KAFKA_BOOTSTRAP}")
+from metrics import (
+    BUFFERED_EVENTS,
+    ERRORS,
+    INFLIGHT,
+    KAFKA_LAG,
+    OPEN_TRACES,
+    start_metrics_server,
+)
+from trace_aggregator import TraceAggregator
+from decoders import get_decoder
+from worker_pool import SummaryWorkerPool
+from pipeline import chunk_prefetcher, summarize_trace
+from rolling_summary import RollingSummaryStore
+from preprocess import EventRecord, TraceFeatures
+from llm_scheduler import trace_priority
+from decision_cache import trace_fingerprint
+from anomaly_scorer import get_scorer
+from summarize_embed import warmup
+from offset_tracker import OffsetTracker
+from chroma_setup import build_where, get_decision_writer, get_writer
+from dead_letter import get_dead_letter
+from chroma_retention import start_retention
+
+_judge = None  # JUDGE_ENABLED일 때 judge_graph.JudgeBatcher
+_offsets = None  # KAFKA_COMMIT_MODE=durable일 때 OffsetTracker
+_rolling = None  # 여러 번 flush되는 긴 trace의 누적 요약 (TraceProcessor가 생성, 프로세스 단위)
+
+
+def _summarize_and_log(trace_id, evs, features=None, token=None):
+    # token: OffsetTracker.hold() 결과. 요약 문서가 Chroma에 기록되면 놓아서 offset 커밋 허용
+    if features is None:
+        features = TraceFeatures.from_events(evs)
+    on_durable = None
+    if _offsets is not None and token is not None:
+        on_durable = lambda: _offsets.release(token)
+    try:
+        res = summarize_trace(trace_id, evs, features, on_durable, _rolling)
+    except Exception as e:
+        # LLM 재시도까지 실패한 trace: dead-letter에 보관된 뒤에만 offset을 놓음.
+        # 보관도 실패하면 커밋을 멈춘 채 둠 (trace_kafka_held_traces로 보임, 재시작 시 그 지점부터 재처리)
+        # 이벤트는 dict로 (EventRecord는 EVENT_FIELDS 순서의 dict) → 나중에 그대로 다시 요약 가능
+        events = [ev.to_dict() if isinstance(ev, EventRecord) else dict(ev) for ev in evs]
+        stored = get_dead_letter().write(
+            "trace", {"trace_id": trace_id, "events": events, "error": f"{type(e).__name__}: {e}"}
+        )
+        if not stored:
+            ERRORS.labels("dead_letter").inc()
+            if on_durable is not None:
+                print(f"[ERR] trace={trace_id} dead-letter 보관 실패, offset 커밋 보류")
+        elif on_durable is not None:
+            on_durable()
+        raise
+    print(f"[OK] upsert trace_summary id={res['doc_id']} events={len(evs)}")
+    if _judge is not None:
+        # 요약이 끝난 trace를 판단 그래프로 넘김 (대기열이 가득 차면 여기서 대기)
+        # 로컬 이상 점수 벡터를 같이 넘겨 점수가 낮은 trace는 LLM 판단을 건너뜀
+        # 유사 로그 검색은 요약 문서만, sigma 탐지 trace는 sigma 탐지 요약끼리 (조건이 두 가지뿐이라 일괄 질의 유지)
+        meta = features.meta()
+        scorer = get_scorer()
+        _judge.submit(
+            trace_id,
+            features.clean_text(),
+            trace_priority(meta),
+            trace_fingerprint(meta),
+            scorer.vectorize(evs) if scorer is not None else None,
+            features.sigma_lines,
+            build_where(type="trace_summary", sigma_hit=True if meta["sigma_hit"] else None),
+        )
+    return res
 
-    last_check = time.time()
-    for msg in consumer:
+
+def _log_judgment(res):
+    print(f"[JUDGE] trace={res['trace_id']} decision={res['decision']}")
+
+
+def _update_lag(consumer):
+    for tp in consumer.assignment():
         try:
-            payload = msg.value
-            agg.add_payload(payload)
-            now = time.time()
-            if now - last_check >= FLUSH_TICK_SEC:
-                last_check = now
-                for trace_id, evs in agg.pop_ready():
-                    clean = build_clean_text(evs)
-                    meta = build_summary_meta(evs)
-                    summary = summarize_korean(clean)
-                    doc_id = save_trace_summary(trace_id, summary, meta)
-                    print(f"[OK] upsert trace_summary id={doc_id} events={len(evs)}")
+            hw = consumer.highwater(tp)
+            if hw is not None:
+                KAFKA_LAG.labels(tp.topic, tp.partition).set(hw - consumer.position(tp))
+        except Exception:
+            pass
+
+
+class _RevokeCommit(ConsumerRebalanceListener):
+    # 파티션을 빼앗기기 전에 기록이 끝난 지점까지 커밋
+    # source: low_offsets()를 가진 TraceAggregator 또는 trace_shards.ShardRouter
+    def __init__(self, consumer, tracker: OffsetTracker, source):
+        self.consumer, self.tracker, self.source = consumer, tracker, source
+
+    def on_partitions_revoked(self, revoked):
+        if revoked:
+            self.tracker.commit(self.consumer, self.source.low_offsets(), revoked)
+            self.tracker.forget(revoked)
+
+    def on_partitions_assigned(self, assigned):
+        pass
+
+
+def start_judge():
+    global _judge
+    if JUDGE_ENABLED:
+        import judge_graph
+        import langgraph_node
+
+        judge_graph.get_graph()
+        langgraph_node.warmup()
+        _judge = judge_graph.JudgeBatcher(on_result=_log_judgment)
+    return _judge
+
+
+class TraceProcessor:
+    # aggregator → 요약 워커 풀 (+ durable 모드 offset 추적).
+    # 단일 프로세스 run()과 샤드 프로세스(trace_shards)가 같은 흐름을 공유 (프로세스당 1개)
+    def __init__(self, durable: bool, spill_path: str = AGG_SPILL_PATH):
+        global _offsets, _rolling
+        self.pool = SummaryWorkerPool(
+            _summarize_and_log, SUMMARY_CONCURRENCY, SUMMARY_MAX_INFLIGHT
+        )
+        # 긴 trace는 SUMMARY_CHUNK_EVENTS개가 찰 때마다 워커 여유가 있으면 미리 요약
+        self.agg = TraceAggregator(
+            TRACE_INACTIVITY_SEC,
+            TRACE_MAX_EVENTS,
+            max_buffered_events=AGG_MAX_BUFFERED_EVENTS,
+            max_open_traces=AGG_MAX_OPEN_TRACES,
+            eviction=AGG_EVICTION,
+            spill_path=spill_path or None,
+            chunk_events=SUMMARY_CHUNK_EVENTS,
+            on_chunk=chunk_prefetcher(self.pool),
+        )
+        _rolling = RollingSummaryStore(ROLLING_MAX_TRACES, ROLLING_TTL_SEC)
+        self.tracker = _offsets = OffsetTracker() if durable else None
+        self.pending = deque()  # flush 됐지만 워커 풀이 가득 차 아직 제출 못 한 trace
+        self._last_check = time.time()
+        OPEN_TRACES.set_function(lambda: len(self.agg.buckets))
+        BUFFERED_EVENTS.set_function(lambda: self.agg.buffered)
+        INFLIGHT.set_function(lambda: self.pool.inflight + len(self.pending))
+
+    def add(self, tp, offset: int, events):
+        try:
+            self.agg.add_events(events, (tp, offset) if self.tracker is not None else None)
         except Exception as e:
             print(f"[ERR] {e}")
+        if self.tracker is not None:
+            self.tracker.seen(tp, offset)
+
+    def tick(self, now: float):
+        # max_events에 도달한 trace는 tick을 기다리지 않고 바로 flush
+        if not (self.agg.has_ready() or now - self._last_check >= FLUSH_TICK_SEC):
+            return False
+        self._last_check = now
+        for tid, evs, feat, offsets in self.agg.pop_ready():
+            token = self.tracker.hold(offsets) if self.tracker is not None else None
+            self.pending.append((tid, evs, feat, token))
+        return True
+
+    def submit_pending(self):
+        while self.pending and self.pool.submit(*self.pending[0]):
+            self.pending.popleft()
+
+    def busy(self):
+        return bool(self.pending) or self.pool.is_full()
+
+    def low_offsets(self):
+        return self.agg.low_offsets()
+
+    def position(self):
+        return self.tracker.position(self.agg.low_offsets())
+
+    def close(self):
+        # 대기 trace를 모두 요약하고 남은 배치를 기록. 열린 trace는 커밋되지 않음 → 재시작 시 다시 읽어 복구
+        while self.pending:
+            if self.pool.submit(*self.pending[0]):
+                self.pending.popleft()
+            else:
+                self.pool.wait_for_room(FLUSH_TICK_SEC)
+        self.pool.shutdown(wait=True)
+        if _judge is not None:
+            _judge.close()
+        # 모드와 상관없이 남은 요약/판단 문서 기록 (backoff 중이어도 마지막으로 한 번 시도)
+        get_writer().flush(force=True)
+        get_decision_writer().flush(force=True)
+
+
+def _make_consumer(durable: bool):
+    return KafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP,
+        auto_offset_reset=KAFKA_AUTO_OFFSET_RESET,
+        enable_auto_commit=not durable,
+        group_id=KAFKA_GROUP_ID,
+        max_poll_records=KAFKA_MAX_POLL_RECORDS,
+    )
+
+
+def run(
+    decoder_name: str = PAYLOAD_DECODER,
+    consumer=None,
+    shards: int = CONSUMER_SHARDS,
+    stop=None,
+    shard_init=None,
+):
+    # consumer: KafkaConsumer 호환 객체 (기본은 KAFKA_* 설정으로 생성, 테스트는 memory_broker)
+    # shards > 1: trace_id 해시로 나눈 aggregator 샤드 프로세스로 처리 (trace_shards)
+    # stop: threading.Event, set되면 정리 후 종료 (기본은 Ctrl+C까지)
+    if KAFKA_COMMIT_MODE not in ("durable", "auto"):
+        raise ValueError(f"unknown KAFKA_COMMIT_MODE '{KAFKA_COMMIT_MODE}' (durable|auto)")
+    durable = KAFKA_COMMIT_MODE == "durable"
+    decoder = get_decoder(decoder_name)
+    if consumer is None:
+        consumer = _make_consumer(durable)
+    shards = shards if shards > 0 else (os.cpu_count() or 1)
+    # CHROMA_RETENTION_INTERVAL_SEC > 0이면 보존 정리를 주기 실행 (샤드 모드에서도 부모 프로세스 1곳)
+    start_retention()
+    if shards > 1:
+        from trace_shards import run_sharded
+
+        return run_sharded(consumer, decoder, shards, durable, stop, shard_init)
+
+    proc = TraceProcessor(durable)
+    consumer.subscribe(
+        [RAW_TOPIC],
+        listener=_RevokeCommit(consumer, proc.tracker, proc.agg) if durable else None,
+    )
+    start_metrics_server(METRICS_PORT, METRICS_HOST)
+    # OpenAI/Chroma 연결을 첫 trace flush 전에 미리 준비
+    print(f"[INFO] warmup 완료 ({warmup():.2f}s)")
+    start_judge()
+    print(
+        f"[INFO] Consuming topic='{RAW_TOPIC}' @ {KAFKA_BOOTSTRAP} decoder={decoder.name} "
+        f"(concurrency={proc.pool.concurrency}, max_inflight={proc.pool.max_inflight}, "
+        f"commit={KAFKA_COMMIT_MODE}, max_poll_records={KAFKA_MAX_POLL_RECORDS})"
+    )
+
+    last_commit = time.time()
+    try:
+        while stop is None or not stop.is_set():
+            # poll은 멈추지 않음: pause된 파티션은 빈 결과를 주고 heartbeat만 유지
+            # (pause 중에는 짧게 기다려 워커 풀이 비는 즉시 대기 trace를 제출)
+            records = consumer.poll(timeout_ms=_poll_timeout(proc.busy()))
+            for tp, msgs in records.items():
+                for msg in msgs:
+                    # 원본 바이트를 선택한 디코더로 바로 이벤트화 (value_deserializer 없음)
+                    proc.add(tp, msg.offset, decoder.iter_events(msg.value, compact=True))
+
+            now = time.time()
+            if proc.tick(now):
+                _update_lag(consumer)
+
+            if durable and now - last_commit >= KAFKA_COMMIT_INTERVAL_SEC:
+                # 요약이 Chroma에 기록된 trace까지만 (열린/대기 중인 trace의 최소 offset 직전까지) 커밋
+                last_commit = now
+                proc.tracker.commit(consumer, proc.low_offsets())
+
+            proc.submit_pending()
+            # backpressure: 워커 풀이 밀리면 파티션 pause, 비워지면 resume
+            _apply_backpressure(consumer, proc.busy())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proc.close()
+        if durable:
+            proc.tracker.commit(consumer, proc.low_offsets())
+        consumer.close(autocommit=not durable)
+
+
+def _poll_timeout(busy: bool):
+    return min(POLL_TIMEOUT_MS, BUSY_POLL_TIMEOUT_MS) if busy else POLL_TIMEOUT_MS
+
+
+def _apply_backpressure(consumer, busy: bool):
+    if busy:
+        assigned = consumer.assignment()
+        if assigned:
+            consumer.pause(*assigned)
+    else:
+        paused = consumer.paused()
+        if paused:
+            consumer.resume(*paused)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 # ───── 표준 라이브러리 ───────────────────────────────
-import json, re
-from typing import TypedDict, List
+import json, re, threading, time
+from typing import TypedDict, List, Set
 
 # ───── 환경 변수 로드 ────────────────────────────────
 from dotenv import load_dotenv
@@ -9,38 +9,118 @@ from dotenv import load_dotenv
 from langchain_core.documents import Document
 from langchain.schema import HumanMessage
 
-# ───── LangChain Chat 모델 ──────────────────────────
-from langchain_community.chat_models import ChatOpenAI
-
 # ───── LangChain 벡터 스토어 ────────────────────────
-from langchain_community.vectorstores import Chroma
 from langchain.vectorstores.base import VectorStoreRetriever
-from langchain_community.embeddings import OpenAIEmbeddings
 
 
 # ───── 사용자 정의 모듈 ──────────────────────────────
-from chroma_setup import vectorstore
+from config import CHAT_MODEL
+from chroma_setup import (
+    CHROMA_COLLECTION,
+    EMBED_MODEL,
+    get_client,
+    get_decision_writer,
+    search_similar_bulk,
+)
+from metrics import record_usage, timed
+from prompt_builder import compact_clean_text
+from llm_scheduler import (
+    PRIORITY_ELEVATED,
+    PRIORITY_NORMAL,
+    estimate_tokens,
+    get_scheduler,
+)
 
 load_dotenv()
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-
-# Chroma DB 연결
-vectorstore = Chroma(
-    collection_name="my_log_db",
-    embedding_function=embeddings,
-    client=vectorstore,
-)
-
-collection = vectorstore._collection
+# 임베딩/Chroma 래퍼/ChatOpenAI는 첫 사용 시점에 생성 (import 시 네트워크 연결 없음)
+_init_lock = threading.RLock()
+_vectorstore = None
+_retriever = None
+_llm = None
+
+
+def get_vectorstore():
+    global _vectorstore
+    if _vectorstore is None:
+        with _init_lock:
+            if _vectorstore is None:
+                from langchain_community.vectorstores import Chroma
+                from langchain_community.embeddings import OpenAIEmbeddings
+
+                # Chroma DB 연결 (chroma_setup과 같은 클라이언트/컬렉션 공유)
+                _vectorstore = Chroma(
+                    collection_name=CHROMA_COLLECTION,
+                    embedding_function=OpenAIEmbeddings(model=EMBED_MODEL),
+                    client=get_client(),
+                )
+    return _vectorstore
+
+
+def get_retriever(where=None):
+    # where가 있으면 그 필터를 건 retriever (기본 retriever와 같은 임계값)
+    if where:
+        return get_vectorstore().as_retriever(
+            search_type="similarity_score_threshold",
+            search_kwargs={"score_threshold": 0.7, "filter": where},
+        )
+    global _retriever
+    if _retriever is None:
+        with _init_lock:
+            if _retriever is None:
+                _retriever = get_vectorstore().as_retriever(
+                    search_type="similarity_score_threshold",
+                    search_kwargs={"score_threshold": 0.7},  # 유사도 임계값 설정
+                )
+    return _retriever
+
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _init_lock:
+            if _llm is None:
+                from langchain_community.chat_models import ChatOpenAI
+
+                # 재시도/backoff는 llm_scheduler가 담당
+                _llm = ChatOpenAI(model=CHAT_MODEL, temperature=0, max_retries=0)
+    return _llm
+
+
+def set_llm(llm):
+    # 테스트/벤치마크용 fake LLM 주입
+    global _llm
+    _llm = llm
+
+
+def set_retriever(retriever):
+    # 테스트/벤치마크용 fake 검색기 주입
+    global _retriever
+    _retriever = retriever
+
+
+def warmup():
+    # 첫 trace 판단 전에 벡터스토어/검색기/LLM 클라이언트 준비
+    t0 = time.perf_counter()
+    get_retriever()
+    get_llm()
+    get_decision_writer()
+    return time.perf_counter() - t0
+
+
+def _invoke_llm(prompt: str, priority: int):
+    # 요약 워커와 같은 스케줄러 큐/한도를 공유
+    return get_scheduler().call(
+        lambda: get_llm().invoke([HumanMessage(content=prompt)]),
+        priority=priority,
+        tokens=estimate_tokens(prompt),
+    )
 
-retriever = vectorstore.as_retriever(
-    search_type="similarity_score_threshold",
-    search_kwargs={"score_threshold": 0.7},  # 유사도 임계값 설정
-)
 
+def _record_llm_usage(response):
+    meta = getattr(response, "response_metadata", None) or {}
+    record_usage(CHAT_MODEL, meta.get("token_usage"))
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
 
 # ------- 상태 정의 ------- #
 
@@ -54,14 +134,24 @@ class TraceState(TypedDict):
     decision: str
     reason: str
     retriever: VectorStoreRetriever  # 벡터 DB 검색기
+    priority: int  # LLM 스케줄러 우선순위 (llm_scheduler.trace_priority)
+    fingerprint: str  # trace 구조 fingerprint (decision_cache)
+    sigma_lines: Set[str]  # sigma 탐지 이벤트의 clean line (prompt_builder 중요도)
+    where: dict  # 유사 로그 검색 메타데이터 사전 필터 (chroma_setup.build_where)
 
 
 
 
 # 유사 로그 검색: 벡터 DB에서 유사 로그 검색
+@timed("search_similar_logs")
 def search_similar_logs(state: TraceState):  #  -> TraceState
-    retriever = state["retriever"]
-    query = " ".join(state["cleaned_trace"])
+    if "similar_logs" in state:
+        return state  # search_similar_logs_bulk로 미리 검색된 trace
+    retriever = state.get("retriever") or get_retriever(state.get("where"))
+    # cleaned_trace는 문자열 (" ".join 하면 글자 사이마다 공백이 들어가 길이가 2배가 됨)
+    query = compact_clean_text(
+        state["cleaned_trace"], stage="search", sigma_lines=state.get("sigma_lines")
+    )
 
     try:
         results: List[Document] = retriever.get_relevant_documents(query)
@@ -82,11 +172,33 @@ def search_similar_logs(state: TraceState):  #  -> TraceState
     }
 
 
+# 여러 trace 유사 로그 일괄 검색: 임베딩 1회 + where 조건별 collection.query 1회
+# where: None | dict(공통) | list(trace별, chroma_setup.build_where)
+@timed("search_similar_logs_bulk")
+def search_similar_logs_bulk(states: List[dict], where=None):
+    queries = [
+        compact_clean_text(st["cleaned_trace"], stage="search", sigma_lines=st.get("sigma_lines"))
+        for st in states
+    ]
+    results = search_similar_bulk(queries, where=where)
+    return [
+        {
+            **st,
+            "similar_logs": [r["document"] for r in hits],
+            "similar_metadata": [r["metadata"] for r in hits],
+        }
+        for st, hits in zip(states, results)
+    ]
+
+
 # 이상 여부 판단
 # 유사 로그가 있는 경우 유사 로그의 메타데이터를 활용해 이상 여부 판단
 # 유사 로그가 없는 경우 전체 판단을 위해 LLM을 호출
+@timed("llm_judgment")
 def llm_judgment(state: TraceState):  #  -> TraceState
-    query = " ".join(state["cleaned_trace"])
+    query = compact_clean_text(
+        state["cleaned_trace"], stage="llm_judgment", sigma_lines=state.get("sigma_lines")
+    )
 
     similar_logs = state.get("similar_logs", [])
     similar_metadata = state.get("similar_metadata", [])
@@ -102,8 +214,8 @@ def llm_judgment(state: TraceState):  #  -> TraceState
         {{"decision": "<normal|anomaly|suspicious>", "reason": "<간단한 설명>"}}
         """
 
-        messages = [HumanMessage(content=prompt)]
-        response = llm.invoke(messages)
+        response = _invoke_llm(prompt, state.get("priority", PRIORITY_NORMAL))
+        _record_llm_usage(response)
         text = response.content if hasattr(response, "content") else str(response)
 
         cleaned = re.sub(r"^```[a-zA-Z]*\n?", "", text.strip())  # 앞부분 제거
@@ -155,13 +267,16 @@ def llm_judgment(state: TraceState):  #  -> TraceState
     return {**state, "llm_output": output, "decision": base_decision, "reason": reason}
 
 
+@timed("final_decision")
 def final_decision(state: TraceState):  #  -> TraceState
     decision = state.get("decision", "unknown").lower()
     if decision != "suspicious":
 
         return state
 
-    query = " ".join(state["cleaned_trace"])
+    query = compact_clean_text(
+        state["cleaned_trace"], stage="final_decision", sigma_lines=state.get("sigma_lines")
+    )
 
     similar_logs = state.get("similar_logs", [])[:5]  # 최대 5개
     similar_metadata = state.get("similar_metadata", [])[:5] if similar_logs else []
@@ -191,7 +306,10 @@ def final_decision(state: TraceState):  #  -> TraceState
         {{"decision": "<normal|anomaly|suspicious>", "reason": "<간단한 설명>"}}
         """
 
-    response = llm.invoke([HumanMessage(content=prompt)])
+    # suspicious 재판단은 일반 trace보다 먼저
+    priority = min(state.get("priority", PRIORITY_NORMAL), PRIORITY_ELEVATED)
+    response = _invoke_llm(prompt, priority)
+    _record_llm_usage(response)
     text = response.content if hasattr(response, "content") else str(response)
 
     # LLM 응답 정제
@@ -209,22 +327,22 @@ def final_decision(state: TraceState):  #  -> TraceState
     return {**state, "llm_output": output, "decision": decision, "reason": reason}
 
 
+@timed("save_final_decision")
 def save_final_decision_to_chroma(state: TraceState):
     trace_id = state.get("trace_id")
     cleaned_trace = state.get("cleaned_trace")
     decision = state.get("decision")
     reason = state.get("reason")
 
-    document = " ".join(cleaned_trace)
+    document = cleaned_trace
     metadata = {
+        "type": "final_decision",
         "decision": decision,
         "reason": reason,
     }
 
-    collection.add(
-        documents=[document],
-        metadatas=[metadata],
-        ids=[trace_id],  # ID 중복 시 overwrite ..
-    )
+    # 판단 전용 컬렉션(CHROMA_DECISION_COLLECTION)에 배치 기록 → 같은 trace id의 요약 문서를 덮어쓰지 않음
+    get_decision_writer().add(trace_id, document, metadata)
 
     print(f"[INFO] 최종 판단 결과 저장 완료 \n")
+    return state
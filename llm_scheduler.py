@@ -0,0 +1,310 @@
+import heapq, itertools, random, threading, time
+from typing import Any, Callable, Dict, Optional
+
+from config import (
+    CHAT_MODEL,
+    LLM_RPM,
+    LLM_TPM,
+    LLM_MAX_CONCURRENCY,
+    LLM_DEADLINE_SEC,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE_SEC,
+    LLM_BACKOFF_MAX_SEC,
+    LLM_BURST_SEC,
+)
+from metrics import REGISTRY
+
+# 모든 LLM 호출(요약, 병합, langgraph 판단)이 공유하는 우선순위 + rate limit 스케줄러.
+# 호출 스레드가 큐에서 차례를 기다렸다가 자기 스레드에서 직접 요청을 보낸다.
+
+PRIORITY_HIGH = 0  # sigma 탐지
+PRIORITY_ELEVATED = 1  # 이상/의심 신호
+PRIORITY_NORMAL = 2
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_ELEVATED: "elevated", PRIORITY_NORMAL: "normal"}
+
+# 모델별 기본 한도 (requests/min, tokens/min). LLM_RPM/LLM_TPM 환경변수가 우선
+MODEL_LIMITS: Dict[str, tuple] = {
+    "gpt-4o": (500, 30000),
+    "gpt-4o-mini": (500, 200000),
+    "gpt-4.1": (500, 30000),
+    "gpt-4.1-mini": (500, 200000),
+}
+DEFAULT_LIMITS = (500, 30000)
+
+QUEUE_WAIT = REGISTRY.histogram(
+    "llm_scheduler_queue_wait_seconds", "Time spent waiting for an LLM slot", ("priority",)
+)
+REQUESTS = REGISTRY.counter(
+    "llm_scheduler_requests_total", "LLM requests by outcome (ok, retry, shed, error)", ("outcome",)
+)
+QUEUE_DEPTH = REGISTRY.gauge("llm_scheduler_queue_depth", "Requests waiting for an LLM slot")
+
+
+class LLMShedError(Exception):
+    # deadline 안에 보낼 수 없어 버린 요청
+    pass
+
+
+class TokenBucket:
+    # 분당 한도를 초당 보충량으로 환산, 순간 burst는 burst_sec 분량까지만 허용
+    # (서버도 짧은 구간으로 나눠 한도를 적용). 실제 사용량 정산으로 음수까지 내려갈 수 있음
+    def __init__(
+        self,
+        per_minute: float,
+        burst_sec: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * burst_sec
+        self.tokens = self.capacity
+        self.clock = clock
+        self._t = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    def wait_time(self, n: float):
+        # n개를 꺼내기까지 남은 시간 (0이면 즉시 가능). 용량보다 큰 요청은 가득 찼을 때 허용
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        need = min(n, self.capacity)
+        if self.tokens >= need:
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+    def take(self, n: float):
+        if self.capacity > 0:
+            self._refill()
+            self.tokens -= n
+
+
+def _status_of(exc: BaseException):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc: BaseException):
+    # 429 / 5xx / 연결 오류·타임아웃만 재시도 (4xx 요청 오류는 즉시 실패)
+    status = _status_of(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(exc).__name__
+    return name in ("APIConnectionError", "APITimeoutError", "Timeout", "ConnectionError")
+
+
+def _retry_after(exc: BaseException):
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def usage_tokens(resp: Any):
+    # OpenAI 응답(usage) 또는 LangChain 메시지(response_metadata.token_usage)의 총 토큰
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        meta = getattr(resp, "response_metadata", None) or {}
+        usage = meta.get("token_usage")
+    if not usage:
+        return None
+    get = usage.get if isinstance(usage, dict) else (lambda k: getattr(usage, k, None))
+    total = get("total_tokens")
+    if total is None:
+        total = (get("prompt_tokens") or 0) + (get("completion_tokens") or 0)
+    return total or None
+
+
+def estimate_tokens(text: str, completion: int = 200):
+    # 문자 4개 ≈ 1 token + 예상 응답 길이 (한국어는 과대추정 쪽이라 rate limit에 안전)
+    return len(text) // 4 + completion
+
+
+class _Ticket:
+    __slots__ = ("priority", "tokens", "deadline", "granted", "dropped")
+
+    def __init__(self, priority: int, tokens: int, deadline: float):
+        self.priority = priority
+        self.tokens = tokens
+        self.deadline = deadline
+        self.granted = False
+        self.dropped = False
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        rpm: float,
+        tpm: float,
+        max_concurrency: int = 8,
+        deadline_sec: float = 120.0,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        burst_sec: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.requests = TokenBucket(rpm, burst_sec, clock)
+        self.tokens = TokenBucket(tpm, burst_sec, clock)
+        self.max_concurrency = max(1, max_concurrency)
+        self.deadline_sec = deadline_sec
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.sleep = sleep
+        self._cv = threading.Condition()
+        self._heap = []  # (priority, deadline, seq, ticket) — 취소된 ticket은 top에서 지연 제거
+        self._seq = itertools.count()
+        self._waiting = 0
+        self._active = 0
+        self.stats = {"ok": 0, "retry": 0, "shed": 0, "error": 0}
+
+    @property
+    def waiting(self):
+        return self._waiting
+
+    def _count(self, outcome: str):
+        self.stats[outcome] += 1
+        REQUESTS.labels(outcome).inc()
+
+    def _top(self):
+        while self._heap and self._heap[0][3].dropped:
+            heapq.heappop(self._heap)
+        return self._heap[0][3] if self._heap else None
+
+    def _acquire(self, priority: int, tokens: int, deadline: float):
+        t0 = self.clock()
+        ticket = _Ticket(priority, tokens, deadline)
+        with self._cv:
+            heapq.heappush(self._heap, (priority, deadline, next(self._seq), ticket))
+            self._waiting += 1
+            try:
+                while True:
+                    now = self.clock()
+                    if now >= deadline:
+                        ticket.dropped = True
+                        self._cv.notify_all()
+                        raise LLMShedError("deadline exceeded while queued")
+                    wait = deadline - now
+                    if self._top() is ticket and self._active < self.max_concurrency:
+                        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                        if wait <= 0:
+                            heapq.heappop(self._heap)
+                            ticket.granted = True
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            self._active += 1
+                            self._cv.notify_all()
+                            break
+                        if now + wait >= deadline:
+                            # 한도 회복 전에 deadline이 지나므로 미리 포기
+                            ticket.dropped = True
+                            self._cv.notify_all()
+                            raise LLMShedError("rate limit would exceed deadline")
+                    self._cv.wait(min(wait, deadline - now))
+            finally:
+                self._waiting -= 1
+        QUEUE_WAIT.labels(PRIORITY_NAMES.get(priority, str(priority))).observe(self.clock() - t0)
+
+    def _release(self, estimated: int, used: Optional[int]):
+        with self._cv:
+            self._active -= 1
+            if used is not None and used != estimated:
+                self.tokens.take(used - estimated)  # 실제 사용량으로 정산
+            self._cv.notify_all()
+
+    def _backoff(self, attempt: int, exc: BaseException):
+        ra = _retry_after(exc)
+        if ra is not None:
+            return min(ra, self.backoff_max) + random.uniform(0, self.backoff_base)
+        # full jitter exponential backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        priority: int = PRIORITY_NORMAL,
+        tokens: int = 0,
+        deadline: Optional[float] = None,
+    ):
+        # fn()을 우선순위/한도에 맞춰 실행. 429/5xx는 jitter backoff로 재시도,
+        # deadline(clock 기준 절대 시각)을 넘기면 LLMShedError
+        if deadline is None:
+            deadline = self.clock() + self.deadline_sec
+        attempt = 0
+        while True:
+            try:
+                self._acquire(priority, tokens, deadline)
+            except LLMShedError:
+                self._count("shed")
+                raise
+            try:
+                resp = fn()
+            except Exception as e:
+                self._release(tokens, None)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self._count("error")
+                    raise
+                delay = self._backoff(attempt, e)
+                if self.clock() + delay >= deadline:
+                    self._count("shed")
+                    raise LLMShedError(f"retry would exceed deadline: {e}") from e
+                self._count("retry")
+                print(
+                    f"[WARN] LLM 재시도 {attempt + 1}/{self.max_retries} "
+                    f"({delay:.2f}s 후): {type(e).__name__} status={_status_of(e)}"
+                )
+                self.sleep(delay)
+                attempt += 1
+                continue
+            self._release(tokens, usage_tokens(resp))
+            self._count("ok")
+            return resp
+
+
+def trace_priority(meta: Optional[Dict[str, Any]] = None, decision: Optional[str] = None):
+    # sigma 탐지 > 이상/의심 판단 > 일반
+    if meta and meta.get("sigma_hit"):
+        return PRIORITY_HIGH
+    if decision in ("anomaly", "suspicious"):
+        return PRIORITY_ELEVATED
+    return PRIORITY_NORMAL
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    # 프로세스 단위 공유 스케줄러 (요약 워커 + langgraph 노드)
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                rpm, tpm = MODEL_LIMITS.get(CHAT_MODEL, DEFAULT_LIMITS)
+                sched = LLMScheduler(
+                    LLM_RPM or rpm,
+                    LLM_TPM or tpm,
+                    LLM_MAX_CONCURRENCY,
+                    LLM_DEADLINE_SEC,
+                    LLM_MAX_RETRIES,
+                    LLM_BACKOFF_BASE_SEC,
+                    LLM_BACKOFF_MAX_SEC,
+                    LLM_BURST_SEC,
+                )
+                QUEUE_DEPTH.set_function(lambda: sched.waiting)
+                _scheduler = sched
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[LLMScheduler]):
+    # 테스트/벤치마크용 교체
+    global _scheduler
+    _scheduler = scheduler
@@ -1,9 +1,14 @@
+import argparse
 import json
-from pathlib import Path
-from pipeline import process_payload
+from pipeline import process_file
 
 if __name__ == "__main__":
-    payload = json.loads(Path("./trace.json").read_text(encoding="utf-8"))
-    results = process_payload(payload)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path", nargs="?", default="./trace.json")
+    ap.add_argument(
+        "--decoder", default="stream", help="json | orjson | stream | otlp-proto"
+    )
+    args = ap.parse_args()
+    results = process_file(args.path, args.decoder)
     print(json.dumps(results, ensure_ascii=False, indent=2))
     print(f"[INFO] 저장 완료: {len(results)} traces")
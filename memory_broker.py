@@ -0,0 +1,216 @@
+import itertools, threading, time, zlib
+from collections import namedtuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 로컬 테스트/벤치마크용 in-memory Kafka 대역.
+# kafka_trace_consumer.run이 쓰는 KafkaConsumer API(subscribe/poll/pause/resume/commit/...)만 흉내 낸다.
+# 같은 group_id의 consumer끼리 파티션을 나눠 갖고(멤버가 바뀌면 rebalance listener 호출),
+# 커밋된 offset은 broker에 남으므로 consumer를 새로 만들면 커밋 지점부터 다시 읽는다.
+
+TopicPartition = namedtuple("TopicPartition", "topic partition")  # kafka.structs.TopicPartition과 호환
+Record = namedtuple("Record", "topic partition offset key value timestamp")
+
+
+def partition_for(key: Optional[bytes], partitions: int, fallback: int = 0):
+    # Kafka 기본 파티셔너처럼 key 해시 기준 (key가 없으면 fallback)
+    if key is None:
+        return fallback % partitions
+    return zlib.crc32(key) % partitions
+
+
+class MemoryBroker:
+    def __init__(self, partitions: int = 4):
+        self.default_partitions = max(1, partitions)
+        self._logs: Dict[str, List[List[Record]]] = {}
+        self._committed: Dict[Tuple[str, TopicPartition], int] = {}
+        self._groups: Dict[str, List["MemoryConsumer"]] = {}
+        self._generation: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._rr = itertools.count()
+
+    def create_topic(self, topic: str, partitions: Optional[int] = None):
+        with self._cond:
+            if topic not in self._logs:
+                self._logs[topic] = [[] for _ in range(partitions or self.default_partitions)]
+            return len(self._logs[topic])
+
+    def partitions_for(self, topic: str):
+        self.create_topic(topic)
+        return list(range(len(self._logs[topic])))
+
+    def produce(self, topic: str, value: bytes, key: Optional[bytes] = None, partition: Optional[int] = None):
+        self.create_topic(topic)
+        with self._cond:
+            log = self._logs[topic]
+            p = partition if partition is not None else partition_for(key, len(log), next(self._rr))
+            rec = Record(topic, p, len(log[p]), key, value, int(time.time() * 1000))
+            log[p].append(rec)
+            self._cond.notify_all()
+        return rec
+
+    def end_offsets(self, topic: str):
+        self.create_topic(topic)
+        with self._cond:
+            return {TopicPartition(topic, p): len(log) for p, log in enumerate(self._logs[topic])}
+
+    def committed(self, group_id: str, tp: TopicPartition):
+        return self._committed.get((group_id, tuple(tp)))
+
+    def producer(self):
+        return MemoryProducer(self)
+
+    def consumer(self, group_id: str = "memory-group", **kwargs):
+        return MemoryConsumer(self, group_id, **kwargs)
+
+    # group 관리: 멤버 변경 시 generation 증가 → 각 consumer가 다음 poll에서 재할당
+    def _join(self, c: "MemoryConsumer"):
+        with self._cond:
+            self._groups.setdefault(c.group_id, []).append(c)
+            self._generation[c.group_id] = self._generation.get(c.group_id, 0) + 1
+
+    def _leave(self, c: "MemoryConsumer"):
+        with self._cond:
+            members = self._groups.get(c.group_id, [])
+            if c in members:
+                members.remove(c)
+                self._generation[c.group_id] += 1
+
+    def _assignment(self, c: "MemoryConsumer"):
+        with self._cond:
+            members = self._groups.get(c.group_id, [])
+            idx = members.index(c)
+            tps = [
+                TopicPartition(t, p)
+                for t in sorted(c.topics)
+                for p in range(self.create_topic(t))
+            ]
+            return self._generation[c.group_id], {tp for i, tp in enumerate(tps) if i % len(members) == idx}
+
+    def _fetch(self, tp: TopicPartition, offset: int, limit: int):
+        with self._cond:
+            return self._logs[tp.topic][tp.partition][offset : offset + limit]
+
+
+class MemoryProducer:
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+
+    def send(self, topic: str, value: bytes = None, key: Optional[bytes] = None, partition: Optional[int] = None):
+        return self.broker.produce(topic, value, key, partition)
+
+    def flush(self, timeout: Optional[float] = None):
+        pass
+
+    def close(self, timeout: Optional[float] = None):
+        pass
+
+
+class MemoryConsumer:
+    def __init__(
+        self,
+        broker: MemoryBroker,
+        group_id: str = "memory-group",
+        auto_offset_reset: str = "latest",
+        enable_auto_commit: bool = False,
+        max_poll_records: int = 500,
+        **_ignored: Any,
+    ):
+        self.broker = broker
+        self.group_id = group_id
+        self.auto_offset_reset = auto_offset_reset
+        self.enable_auto_commit = enable_auto_commit
+        self.max_poll_records = max(1, max_poll_records)
+        self.topics: List[str] = []
+        self.listener = None
+        self._generation = -1
+        self._assigned: set = set()
+        self._paused: set = set()
+        self._position: Dict[TopicPartition, int] = {}
+        self._closed = False
+
+    def subscribe(self, topics: Iterable[str] = (), listener=None):
+        self.topics = list(topics)
+        self.listener = listener
+        for t in self.topics:
+            self.broker.create_topic(t)
+        self.broker._join(self)
+
+    def _rebalance(self):
+        gen, assigned = self.broker._assignment(self)
+        if gen == self._generation:
+            return
+        revoked = self._assigned - assigned
+        added = assigned - self._assigned
+        if revoked and self.listener is not None:
+            self.listener.on_partitions_revoked(revoked)
+        if self.enable_auto_commit and revoked:
+            self.commit({tp: self._position[tp] for tp in revoked if tp in self._position})
+        for tp in revoked:
+            self._position.pop(tp, None)
+            self._paused.discard(tp)
+        for tp in added:
+            committed = self.broker.committed(self.group_id, tp)
+            if committed is None:
+                committed = 0 if self.auto_offset_reset == "earliest" else self.broker.end_offsets(tp.topic)[tp]
+            self._position[tp] = committed
+        self._assigned, self._generation = assigned, gen
+        if added and self.listener is not None:
+            self.listener.on_partitions_assigned(added)
+
+    def poll(self, timeout_ms: int = 0, max_records: Optional[int] = None):
+        self._rebalance()
+        limit = max_records or self.max_poll_records
+        deadline = time.monotonic() + timeout_ms / 1000
+        while True:
+            out: Dict[TopicPartition, List[Record]] = {}
+            for tp in sorted(self._assigned - self._paused):
+                if limit <= 0:
+                    break
+                recs = self.broker._fetch(tp, self._position[tp], limit)
+                if recs:
+                    out[tp] = recs
+                    self._position[tp] += len(recs)
+                    limit -= len(recs)
+            left = deadline - time.monotonic()
+            if out or left <= 0:
+                if out and self.enable_auto_commit:
+                    self.commit()
+                return out
+            with self.broker._cond:
+                self.broker._cond.wait(min(left, 0.05))
+
+    def assignment(self):
+        return set(self._assigned)
+
+    def pause(self, *partitions):
+        self._paused.update(partitions)
+
+    def resume(self, *partitions):
+        self._paused.difference_update(partitions)
+
+    def paused(self):
+        return set(self._paused)
+
+    def position(self, tp):
+        return self._position[tp]
+
+    def highwater(self, tp):
+        return self.broker.end_offsets(tp.topic)[TopicPartition(*tp)]
+
+    def committed(self, tp):
+        return self.broker.committed(self.group_id, tp)
+
+    def commit(self, offsets: Optional[Dict[Any, Any]] = None):
+        # offsets 값은 int 또는 OffsetAndMetadata (offset 속성)
+        if offsets is None:
+            offsets = dict(self._position)
+        for tp, off in offsets.items():
+            self.broker._committed[(self.group_id, tuple(tp))] = getattr(off, "offset", off)
+
+    def close(self, autocommit: bool = True):
+        if self._closed:
+            return
+        self._closed = True
+        if autocommit and self.enable_auto_commit:
+            self.commit()
+        self.broker._leave(self)
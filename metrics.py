@@ -0,0 +1,286 @@
+import abc, bisect, threading, time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 의존성 없는 Prometheus 텍스트 포맷 메트릭. 기록은 lock + 덧셈 정도라 운영 중 상시 사용 가능
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = ""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        # 라벨 값 조합 하나의 값 객체 (_Value / _HistValue)
+        ...
+
+    def _default(self):
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "fn", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.fn: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1.0):
+        with self._lock:
+            self.value += n
+
+    def dec(self, n: float = 1.0):
+        with self._lock:
+            self.value -= n
+
+    def set(self, v: float):
+        self.value = v
+
+    def set_function(self, fn: Callable[[], float]):
+        # scrape 시점에 계산 (기록 비용 0)
+        self.fn = fn
+
+    def get(self):
+        if self.fn is not None:
+            try:
+                return float(self.fn())
+            except Exception:
+                return float("nan")
+        return self.value
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_fmt_labels(labelnames, key)} {self.get()}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, n: float = 1.0):
+        self._default().inc(n)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, v: float):
+        self._default().set(v)
+
+    def inc(self, n: float = 1.0):
+        self._default().inc(n)
+
+    def dec(self, n: float = 1.0):
+        self._default().dec(n)
+
+    def set_function(self, fn: Callable[[], float]):
+        self._default().set_function(fn)
+
+
+class _HistValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, v: float):
+        i = bisect.bisect_left(self.bounds, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def render(self, name, labelnames, key):
+        lines, acc = [], 0
+        for b, c in zip(self.bounds, self.counts):
+            acc += c
+            le = _fmt_labels(labelnames, key, 'le="%s"' % b)
+            lines.append(f"{name}_bucket{le} {acc}")
+        acc += self.counts[-1]
+        le = _fmt_labels(labelnames, key, 'le="+Inf"')
+        lines.append(f"{name}_bucket{le} {acc}")
+        lines.append(f"{name}_sum{_fmt_labels(labelnames, key)} {self.sum}")
+        lines.append(f"{name}_count{_fmt_labels(labelnames, key)} {acc}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistValue(self.buckets)
+
+    def observe(self, v: float):
+        self._default().observe(v)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kw):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, *args, **kw)
+            return m
+
+    def counter(self, name, help, labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labelnames, buckets)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in list(self._metrics.values()):
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ───── 파이프라인 공통 메트릭 ──────────────────────────
+STAGE_LATENCY = REGISTRY.histogram(
+    "trace_pipeline_stage_seconds",
+    "Per-stage latency (decode, aggregate, summarize, embed, chroma_upsert, judgment nodes ...)",
+    ("stage",),
+)
+EVENTS = REGISTRY.counter("trace_pipeline_events_total", "Decoded span events")
+TRACES = REGISTRY.counter(
+    "trace_pipeline_traces_total", "Traces by outcome (flushed, summarized, failed ...)", ("status",)
+)
+ERRORS = REGISTRY.counter("trace_pipeline_errors_total", "Errors by stage", ("stage",))
+LLM_TOKENS = REGISTRY.counter(
+    "trace_pipeline_llm_tokens_total", "LLM token usage from response usage", ("model", "kind")
+)
+OPEN_TRACES = REGISTRY.gauge("trace_aggregator_open_traces", "Open trace buckets")
+BUFFERED_EVENTS = REGISTRY.gauge("trace_aggregator_buffered_events", "Buffered events")
+INFLIGHT = REGISTRY.gauge("trace_worker_inflight", "Queued + running summarize jobs")
+KAFKA_LAG = REGISTRY.gauge(
+    "trace_kafka_consumer_lag", "Highwater - position per partition", ("topic", "partition")
+)
+
+
+def stage(name: str):
+    # with stage("summarize"): ...
+    return STAGE_LATENCY.labels(name).time()
+
+
+def timed(name: str):
+    # 함수 데코레이터 버전 (langgraph 노드 등)
+    child = STAGE_LATENCY.labels(name)
+
+    def deco(fn):
+        def wrapper(*args, **kw):
+            with child.time():
+                return fn(*args, **kw)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        return wrapper
+
+    return deco
+
+
+def record_usage(model: str, usage):
+    # OpenAI 응답의 usage(객체 또는 dict)에서 토큰 수 기록
+    if not usage:
+        return
+    get = usage.get if isinstance(usage, dict) else (lambda k: getattr(usage, k, None))
+    for kind in ("prompt_tokens", "completion_tokens", "input_tokens", "output_tokens"):
+        n = get(kind)
+        if n:
+            LLM_TOKENS.labels(model, kind.split("_")[0]).inc(n)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    # 로컬 scrape 엔드포인트: http://host:port/metrics
+    if port <= 0:
+        return None
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"[INFO] metrics -> http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,90 @@
+import itertools, threading
+from typing import Any, Dict, Iterable, Optional
+
+from metrics import REGISTRY
+
+# at-least-once offset 커밋: 파티션별로 "요약이 아직 Chroma에 기록되지 않은 trace를 담은 가장 작은 offset"
+# 까지만 커밋한다. 열린 버킷은 TraceAggregator.offsets가, 요약 대기/진행 중인 trace는 hold() 토큰이
+# offset을 잡고 있다가 요약 문서 upsert가 성공하면(BatchWriter on_durable) release()로 놓는다.
+# 재시작하면 커밋 지점부터 다시 읽어 aggregator에 남아 있던 trace를 복구 (같은 trace id로 upsert → 중복 없음)
+
+COMMITS = REGISTRY.counter(
+    "trace_kafka_commits_total", "Manual offset commits by result (ok, error)", ("result",)
+)
+HELD = REGISTRY.gauge(
+    "trace_kafka_held_traces", "Flushed traces whose summary is not yet durable in Chroma"
+)
+
+
+class OffsetTracker:
+    def __init__(self):
+        self._lock = threading.Lock()  # release는 Chroma flush 스레드에서 호출
+        self._held: Dict[int, Dict[Any, int]] = {}  # token -> 파티션별 최소 offset
+        self._tokens = itertools.count()
+        self._next: Dict[Any, int] = {}  # 파티션별 aggregator에 넣은 마지막 메시지 offset + 1
+        self._committed: Dict[Any, int] = {}
+        HELD.set_function(lambda: len(self._held))
+
+    def seen(self, tp, offset: int):
+        # 메시지 하나의 이벤트를 모두 aggregator에 넣은 뒤 호출 (poll 스레드)
+        if offset >= self._next.get(tp, 0):
+            self._next[tp] = offset + 1
+
+    def hold(self, offsets: Optional[Dict[Any, int]]):
+        # aggregator에서 나온 trace의 offset을 요약이 기록될 때까지 잡아 둠 → release용 토큰
+        if not offsets:
+            return None
+        token = next(self._tokens)
+        with self._lock:
+            self._held[token] = offsets
+        return token
+
+    def release(self, token: Optional[int]):
+        if token is None:
+            return
+        with self._lock:
+            self._held.pop(token, None)
+
+    def position(self, low_open: Dict[Any, int]):
+        # 파티션별 "여기 전까지는 모두 기록됨" 위치 = min(다음 offset, 열린 버킷 최소, 대기 trace 최소)
+        with self._lock:
+            held = list(self._held.values())
+        low = dict(self._next)
+        for offsets in [low_open] + held:
+            for tp, off in offsets.items():
+                if tp in low and off < low[tp]:
+                    low[tp] = off
+        return low
+
+    def committable(self, low_open: Dict[Any, int], assigned: Optional[Iterable[Any]] = None):
+        # 파티션별 커밋할 offset(다음에 읽을 위치). 이미 커밋한 위치보다 앞선 파티션만 반환
+        low = self.position(low_open)
+        if assigned is not None:
+            assigned = set(assigned)
+            low = {tp: off for tp, off in low.items() if tp in assigned}
+        return {tp: off for tp, off in low.items() if off > self._committed.get(tp, -1)}
+
+    def commit(self, consumer, low_open: Dict[Any, int], partitions: Optional[Iterable[Any]] = None):
+        # 동기 커밋. 실패하면 다음 주기에 다시 시도 (그 사이 재시작하면 더 앞에서부터 재처리될 뿐)
+        from kafka.structs import OffsetAndMetadata
+
+        offsets = self.committable(
+            low_open, consumer.assignment() if partitions is None else partitions
+        )
+        if not offsets:
+            return 0
+        try:
+            consumer.commit({tp: OffsetAndMetadata(off, "", -1) for tp, off in offsets.items()})
+        except Exception as e:
+            print(f"[WARN] offset 커밋 실패, 다음 주기에 재시도: {type(e).__name__} {e}")
+            COMMITS.labels("error").inc()
+            return 0
+        self._committed.update(offsets)
+        COMMITS.labels("ok").inc()
+        return len(offsets)
+
+    def forget(self, partitions: Iterable[Any]):
+        # rebalance로 빼앗긴 파티션: 새 소유자가 커밋 지점부터 다시 읽음
+        for tp in partitions:
+            self._next.pop(tp, None)
+            self._committed.pop(tp, None)
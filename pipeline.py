@@ -1,22 +1,127 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional
 from preprocess import (
-    extract_events_from_otlp,
+    iter_events_from_otlp,
     group_by_trace,
-    build_clean_text,
-    build_summary_meta,
+    merge_summary_meta,
+    TraceFeatures,
 )
-from summarize_embed import summarize_korean, save_trace_summary
+from summarize_embed import summarize_cached, merge_summaries_korean, save_trace_summary
+from rolling_summary import RollingSummaryStore
+from llm_scheduler import trace_priority
+from config import SUMMARY_CHUNK_EVENTS, SUMMARY_MERGE_FANIN
+from decoders import get_decoder
+from metrics import TRACES, stage
 
 
 def process_payload(payload: Dict[str, Any]):
-    events = extract_events_from_otlp(payload)
-    by_trace = group_by_trace(events)
+    # compact: 고아 span 그룹핑에 필요한 service_instance_id는 EventRecord에만 있다
+    return process_events(iter_events_from_otlp(payload, compact=True))
+
+
+def process_file(path: str, decoder: str = "stream"):
+    # 기본은 대용량 OTLP JSON 파일을 span 단위로 스트리밍 처리, otlp-proto 등 선택 가능
+    with open(path, "rb") as fp:
+        return process_events(get_decoder(decoder).iter_events_from_file(fp, compact=True))
+
+
+def process_events(events: Iterable[Dict[str, Any]]):
+    with stage("decode_group"):
+        by_trace = group_by_trace(events)
     out: List[Dict[str, str]] = []
 
     for tid, evs in by_trace.items():
-        clean = build_clean_text(evs)
-        meta = build_summary_meta(evs)
-        summary = summarize_korean(clean)  # 한국어 요약
-        doc_id = save_trace_summary(tid, summary, meta)  # 요약을 임베딩하여 저장
-        out.append({"trace_id": tid, "doc_id": doc_id, "summary": summary})
+        out.append(summarize_trace(tid, evs))
     return out
+
+
+def _merge(parts: List[str], priority: int):
+    # 병합 1회당 프롬프트 크기를 제한하기 위해 FANIN개씩 계층적으로 병합
+    fanin = max(2, SUMMARY_MERGE_FANIN)
+    while len(parts) > 1:
+        parts = [
+            grp[0] if len(grp) == 1 else merge_summaries_korean(grp, priority)
+            for grp in (parts[i : i + fanin] for i in range(0, len(parts), fanin))
+        ]
+    return parts[0]
+
+
+def chunk_prefetcher(pool):
+    # TraceAggregator on_chunk: 다 찬 구간을 워커 풀에 여유가 있을 때만 flush 전에 미리 요약
+    def on_chunk(trace_id: str, features: TraceFeatures, clean: str):
+        priority = trace_priority(features.meta())
+        return pool.try_call(summarize_cached, clean, priority, set(features.sigma_lines))
+
+    return on_chunk
+
+
+def _reduce(parts: List[str], priority: int):
+    # 구간이 하나면 병합 LLM 호출 없이 그대로
+    if len(parts) == 1:
+        return parts[0]
+    with stage("summarize"):
+        return _merge(parts, priority)
+
+
+def _save(trace_id: str, summary: str, meta: Dict[str, Any], segments: int, on_durable):
+    if segments > 1:
+        meta = {**meta, "segments": segments}
+    with stage("save"):
+        return save_trace_summary(trace_id, summary, meta, on_durable)  # 요약을 임베딩하여 저장
+
+
+def summarize_trace(
+    trace_id: str,
+    evs: List[Any],
+    features: Optional[TraceFeatures] = None,
+    on_durable=None,
+    rolling: Optional[RollingSummaryStore] = None,
+):
+    # 배치 파이프라인과 Kafka consumer 워커가 공유하는 trace 단위 처리.
+    # SUMMARY_CHUNK_EVENTS 단위 구간마다 요약(map)하고 하나로 병합(reduce) → 프롬프트 크기 제한.
+    # on_durable: 요약 문서가 Chroma에 기록된 뒤 호출 (Kafka offset 커밋용)
+    # features: TraceAggregator가 수집하면서 누적한 메타/clean text (없으면 여기서 1회 계산).
+    #   features.chunks에 미리 요약된 구간(chunk_prefetcher)은 그 결과를 사용
+    # rolling: 스트리밍 consumer의 누적 요약. 같은 trace의 이전 flush 요약과 병합해 앞 구간 유실 없음.
+    #   None(process_payload/process_file 등 일회성 처리)이면 병합하지 않고 문서를 교체
+    if features is None:
+        with stage("features"):
+            features = TraceFeatures.from_events(evs)
+    size = max(1, SUMMARY_CHUNK_EVENTS)
+    n = len(features.lines)
+    with stage("summary_meta"):
+        meta = features.meta()
+    # sigma 탐지 trace는 LLM 스케줄러 큐에서 일반 trace보다 먼저 처리
+    priority = trace_priority(meta)
+    chunks = features.chunks or {}
+    parts: List[str] = []
+    for i in range(0, n, size) or [0]:
+        part = None
+        fut = chunks.get(i)
+        if fut is not None:
+            try:
+                part = fut.result()
+            except Exception as e:
+                print(f"[WARN] trace={trace_id} 구간 선요약 실패, 다시 요약: {e}")
+        if part is None:
+            with stage("clean_text"):
+                clean = features.clean_text(i, i + size)
+            with stage("summarize"):
+                part = summarize_cached(clean, priority, features.sigma_lines)  # 한국어 요약 (캐시 우선)
+        parts.append(part)
+
+    segments = len(parts)
+    if rolling is None:
+        summary = _reduce(parts, priority)
+        doc_id = _save(trace_id, summary, meta, segments, on_durable)
+    else:
+        with rolling.lock(trace_id):
+            prev = rolling.get(trace_id)
+            if prev is not None:
+                parts = [prev["summary"]] + parts
+                meta = merge_summary_meta(prev["meta"], meta)
+                segments += prev["segments"]
+            summary = _reduce(parts, priority)
+            rolling.put(trace_id, {"summary": summary, "meta": meta, "segments": segments})
+            doc_id = _save(trace_id, summary, meta, segments, on_durable)
+    TRACES.labels("summarized").inc()
+    return {"trace_id": trace_id, "doc_id": doc_id, "summary": summary}
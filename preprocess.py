@@ -1,6 +1,16 @@
 import ipaddress
+import json
+import sys
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+try:
+    import ijson  # 선택 의존성: 대용량 payload 스트리밍 파싱
+except ImportError:
+    ijson = None
+
+from config import ORPHAN_GROUPING, ORPHAN_WINDOW_SEC
 
 NANO = 1_000_000_000
 
@@ -65,7 +75,8 @@ def _safe_time_from_unix_nano(ns: str):
         return ""
 
 
-def span_to_event(span: Dict[str, Any]):
+def _span_to_event_scan(span: Dict[str, Any], resource_id: Optional[str] = None):
+    # 기존(키마다 attributes 전체를 스캔) 디코더. 벤치마크/검증용으로 남겨둔다.
     attrs = span.get("attributes", [])
     name = span.get("name", "") or ""
     proc_from_name, event_from_name = (
@@ -95,44 +106,359 @@ def span_to_event(span: Dict[str, Any]):
     }
 
 
-def extract_events_from_otlp(payload: Dict[str, Any]):
-    events: List[Dict[str, Any]] = []
+# span_to_event가 사용하는 attribute 키. 이 외의 키는 디코딩하지 않는다.
+SPAN_KEYS = frozenset(
+    (
+        "EventName",
+        "TimeStamp",
+        "UtcTime",
+        "Image",
+        "ProcessId",
+        "Protocol",
+        "SourceIp",
+        "SourcePort",
+        "DestinationIp",
+        "DestinationPort",
+        "QueryName",
+        "QueryResults",
+        "CommandLine",
+        "sigma.alert",
+        "sigma@alert",
+        "sigma.rule_title",
+    )
+)
+
+
+@lru_cache(maxsize=8192)
+def _ip_cached(s: str):
+    return _ip_or_none(s)
+
+
+@lru_cache(maxsize=8192)
+def _port_cached(p: Any):
+    return _port_fix(p)
+
+
+def _norm_ip(v: Any):
+    # 같은 IP 문자열이 반복되므로 정규화 결과를 캐시 (해시 불가 값은 그대로 처리)
+    if v is None:
+        return None
+    if v.__class__ is str:
+        return _ip_cached(v)
+    return _ip_or_none(v)
+
+
+def _norm_port(v: Any):
+    if v is None:
+        return None
+    if v.__class__ is str or v.__class__ is int:
+        return _port_cached(v)
+    return _port_fix(v)
+
+
+def _scan_attrs(attrs: List[Dict[str, Any]]):
+    # attributes를 한 번만 순회하면서 필요한 키만 디코딩 (중복 키는 첫 값 우선, _get_attr과 동일)
+    found: Dict[str, Any] = {}
+    for kv in attrs or []:
+        k = kv.get("key")
+        if k in SPAN_KEYS and k not in found:
+            found[k] = _attr_value(kv.get("value", {}))
+    return found
+
+
+EVENT_FIELDS = (
+    "trace_id",
+    "span_id",
+    "event_name",
+    "timestamp_local",
+    "timestamp_utc",
+    "process_name",
+    "process_path",
+    "process_id",
+    "protocol",
+    "source_ip",
+    "source_port",
+    "destination_ip",
+    "destination_port",
+    "query_name",
+    "query_results",
+    "command_line",
+    "sigma_alert",
+    "sigma_rule_title",
+    "service_instance_id",
+)
+
+# span_to_event(dict) 출력 키. service_instance_id는 고아 span 그룹핑용이라
+# EventRecord에만 두고 dict 이벤트 포맷은 그대로 유지한다.
+DICT_FIELDS = EVENT_FIELDS[:-1]
+
+
+def _decode_span(span: Dict[str, Any], resource_id: Optional[str] = None):
+    # EVENT_FIELDS 순서의 튜플로 디코딩
+    return decode_fields(
+        span.get("traceId"),
+        span.get("spanId"),
+        span.get("name", "") or "",
+        span.get("startTimeUnixNano", ""),
+        _scan_attrs(span.get("attributes", [])),
+        resource_id,
+    )
+
+
+def decode_fields(
+    trace_id: Optional[str],
+    span_id: Optional[str],
+    name: str,
+    start_ns: Any,
+    a: Dict[str, Any],
+    resource_id: Optional[str] = None,
+):
+    # 와이어 포맷(JSON/protobuf)과 무관한 공통 매핑. a는 SPAN_KEYS 키 -> 디코딩된 값
+    proc_from_name, event_from_name = (
+        (name.split("@", 1) + [None])[:2] if "@" in name else (None, None)
+    )
+    image = a.get("Image")
+    return (
+        trace_id,
+        span_id,
+        a.get("EventName", event_from_name) or "",
+        a.get("TimeStamp"),
+        a.get("UtcTime") or _safe_time_from_unix_nano(start_ns),
+        proc_from_name or _basename(image),
+        image,
+        a.get("ProcessId"),
+        a.get("Protocol"),
+        _norm_ip(a.get("SourceIp")),
+        _norm_port(a.get("SourcePort")),
+        _norm_ip(a.get("DestinationIp")),
+        _norm_port(a.get("DestinationPort")),
+        a.get("QueryName"),
+        a.get("QueryResults"),
+        a.get("CommandLine"),
+        a.get("sigma.alert") or a.get("sigma@alert"),
+        a.get("sigma.rule_title"),
+        resource_id,
+    )
+
+
+def span_to_event(span: Dict[str, Any], resource_id: Optional[str] = None):
+    return dict(zip(DICT_FIELDS, _decode_span(span, resource_id)))
+
+
+def _intern(v: Any):
+    return sys.intern(v) if v.__class__ is str else v
+
+
+class EventRecord:
+    # TraceAggregator 버킷용 compact 이벤트. dict 대신 __slots__를 쓰고
+    # 반복이 많은 문자열(경로/이벤트명/IP 등)은 intern 하여 공유한다.
+    # get()/[]를 지원하므로 build_clean_text/build_summary_meta에 그대로 넘길 수 있다.
+    __slots__ = EVENT_FIELDS
+
+    def __init__(
+        self,
+        trace_id,
+        span_id,
+        event_name,
+        timestamp_local,
+        timestamp_utc,
+        process_name,
+        process_path,
+        process_id,
+        protocol,
+        source_ip,
+        source_port,
+        destination_ip,
+        destination_port,
+        query_name,
+        query_results,
+        command_line,
+        sigma_alert,
+        sigma_rule_title,
+        service_instance_id=None,
+    ):
+        self.trace_id = _intern(trace_id)
+        self.span_id = span_id
+        self.event_name = _intern(event_name)
+        self.timestamp_local = timestamp_local
+        self.timestamp_utc = timestamp_utc
+        self.process_name = _intern(process_name)
+        self.process_path = _intern(process_path)
+        self.process_id = process_id
+        self.protocol = _intern(protocol)
+        self.source_ip = _intern(source_ip)
+        self.source_port = source_port
+        self.destination_ip = _intern(destination_ip)
+        self.destination_port = destination_port
+        self.query_name = _intern(query_name)
+        self.query_results = _intern(query_results)
+        self.command_line = command_line
+        self.sigma_alert = sigma_alert
+        self.sigma_rule_title = _intern(sigma_rule_title)
+        self.service_instance_id = _intern(service_instance_id)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in EVENT_FIELDS}
+
+    def __eq__(self, other):
+        if isinstance(other, EventRecord):
+            return all(getattr(self, k) == getattr(other, k) for k in EVENT_FIELDS)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"EventRecord({self.to_dict()!r})"
+
+
+def span_to_record(span: Dict[str, Any], resource_id: Optional[str] = None):
+    return EventRecord(*_decode_span(span, resource_id))
+
+
+def _resource_id(resource: Optional[Dict[str, Any]]):
+    # 고아 span 그룹핑용 호스트/에이전트 식별자
+    attrs = (resource or {}).get("attributes", [])
+    return _get_attr(attrs, "service.instance.id") or _get_attr(attrs, "host.name")
+
+
+def iter_events_from_otlp(
+    payload: Dict[str, Any], compact: bool = False
+) -> Iterator[Dict[str, Any]]:
+    conv = span_to_record if compact else span_to_event
     for rs in payload.get("resourceSpans", []) or []:
+        rid = _resource_id(rs.get("resource"))
         for ss in rs.get("scopeSpans", []) or []:
             for span in ss.get("spans", []) or []:
-                events.append(span_to_event(span))
-    return events
+                yield conv(span, rid)
+
+
+def extract_events_from_otlp(payload: Dict[str, Any]):
+    return list(iter_events_from_otlp(payload))
+
+
+_RS_PREFIX = "resourceSpans.item"
+_RESOURCE_PREFIX = "resourceSpans.item.resource"
+_SPAN_PREFIX = "resourceSpans.item.scopeSpans.item.spans.item"
+
+
+def _iter_stream_spans(fp):
+    # (resource_id, span) 를 span 하나씩 조립해서 반환. resource는 OTLP JSON 관례대로
+    # scopeSpans 앞에 온다고 가정 (뒤에 오면 해당 span들의 resource_id는 None)
+    builder = None
+    target = None
+    rid = None
+    for prefix, event, value in ijson.parse(fp):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == target and event == "end_map":
+                if target == _SPAN_PREFIX:
+                    yield rid, builder.value
+                else:
+                    rid = _resource_id(builder.value)
+                builder = None
+            continue
+        if event == "start_map":
+            if prefix == _SPAN_PREFIX or prefix == _RESOURCE_PREFIX:
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                target = prefix
+            elif prefix == _RS_PREFIX:
+                rid = None
+
+
+def iter_events_from_json_stream(fp, compact: bool = False) -> Iterator[Dict[str, Any]]:
+    # 파일/바이트 스트림에서 span 단위로 파싱 → 전체 문서를 메모리에 올리지 않음
+    if ijson is None:
+        print("[WARN] ijson이 없어 전체 JSON을 한 번에 파싱합니다.")
+        yield from iter_events_from_otlp(json.load(fp), compact)
+        return
+    conv = span_to_record if compact else span_to_event
+    for rid, span in _iter_stream_spans(fp):
+        yield conv(span, rid)
+
+
+@lru_cache(maxsize=4096)
+def _epoch_sec(ts_prefix: str):
+    try:
+        dt = datetime.fromisoformat(ts_prefix)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # Sysmon UtcTime은 tz 표기 없음
+    return int(dt.timestamp())
+
+
+def trace_key(
+    e: Dict[str, Any],
+    mode: str = ORPHAN_GROUPING,
+    window_sec: float = ORPHAN_WINDOW_SEC,
+):
+    # traceId가 없는 span의 버킷 키. batch(group_by_trace)와 스트리밍(TraceAggregator)이
+    # 같은 함수를 쓰므로 같은 입력이면 같은 그룹이 된다.
+    #   span    : span마다 개별 버킷 (기존 동작)
+    #   process : 같은 호스트 + 같은 프로세스(pid, 없으면 경로/이름) + 같은 시간 창
+    #   host    : 같은 호스트 + 같은 시간 창
+    tid = e.get("trace_id")
+    if tid:
+        return tid
+    if mode == "span":
+        return f"no-trace:{e.get('span_id')}"
+    sec = _epoch_sec((e.get("timestamp_utc") or "")[:19])
+    if sec is None:
+        return f"no-trace:{e.get('span_id')}"
+    window = int(sec // window_sec) if window_sec > 0 else 0
+    host = e.get("service_instance_id") or "-"
+    if mode == "host":
+        return f"no-trace:{host}:{window}"
+    proc = e.get("process_id") or e.get("process_path") or e.get("process_name") or "-"
+    return f"no-trace:{host}:{proc}:{window}"
 
 
-def group_by_trace(events: List[Dict[str, Any]]):
+def group_by_trace(events: Iterable[Dict[str, Any]]):
     d: Dict[str, List[Dict[str, Any]]] = {}
     for e in events:
-        tid = e.get("trace_id") or f"no-trace:{e.get('span_id')}"
+        tid = trace_key(e)
         d.setdefault(tid, []).append(e)
     return d
 
 
+def clean_line(e):
+    # build_clean_text의 이벤트 1건 렌더링 (TraceFeatures가 도착 시점에 미리 렌더링)
+    ev = e.get("event_name", "")
+    if "Dnsquery" in ev:
+        return f"[DNS] {e.get('process_name')} -> {e.get('query_name')} / result={e.get('query_results')}"
+    elif "Networkconnectiondetected" in ev:
+        return f"[NET] {e.get('process_name')} {e.get('source_ip')}:{e.get('source_port')} -> {e.get('destination_ip')}:{e.get('destination_port')} tcp"
+    elif "ProcessCreate" in ev:
+        return f"[PROC+] {e.get('process_name')} pid={e.get('process_id')} cmd={e.get('command_line')}"
+    elif "Processterminated" in ev or "ProcessTerminate" in ev:
+        return f"[PROC-] {e.get('process_name')} pid={e.get('process_id')}"
+    else:
+        return f"[{ev}] {e.get('process_name')} pid={e.get('process_id')}"
+
+
 def build_clean_text(events: List[Dict[str, Any]]):
-    lines: List[str] = []
-    for e in events:
-        ev = e.get("event_name", "")
-        if "Dnsquery" in ev:
-            lines.append(
-                f"[DNS] {e.get('process_name')} -> {e.get('query_name')} / result={e.get('query_results')}"
-            )
-        elif "Networkconnectiondetected" in ev:
-            lines.append(
-                f"[NET] {e.get('process_name')} {e.get('source_ip')}:{e.get('source_port')} -> {e.get('destination_ip')}:{e.get('destination_port')} tcp"
-            )
-        elif "ProcessCreate" in ev:
-            lines.append(
-                f"[PROC+] {e.get('process_name')} pid={e.get('process_id')} cmd={e.get('command_line')}"
-            )
-        elif "Processterminated" in ev or "ProcessTerminate" in ev:
-            lines.append(f"[PROC-] {e.get('process_name')} pid={e.get('process_id')}")
-        else:
-            lines.append(f"[{ev}] {e.get('process_name')} pid={e.get('process_id')}")
-    return "\n".join([ln for ln in lines if ln])
+    return "\n".join([ln for ln in map(clean_line, events) if ln])
+
+
+_META_LIST_KEYS = ("event_types", "process_names", "domains", "dst_ips", "dst_ports")
+
+
+def merge_summary_meta(a: Dict[str, Any], b: Dict[str, Any]):
+    # build_summary_meta 결과 두 개를 하나의 trace 메타로 병합
+    out: Dict[str, Any] = {
+        k: sorted(set(a.get(k) or []) | set(b.get(k) or [])) for k in _META_LIST_KEYS
+    }
+    out["sigma_hit"] = bool(a.get("sigma_hit") or b.get("sigma_hit"))
+    out["event_count"] = (a.get("event_count") or 0) + (b.get("event_count") or 0)
+    return out
 
 
 def build_summary_meta(events: List[Dict[str, Any]]):
@@ -167,3 +493,106 @@ def build_summary_meta(events: List[Dict[str, Any]]):
         "sigma_hit": sigma_hit,
         "event_count": len(events),
     }
+
+
+class TraceFeatures:
+    # trace 단위 누적기: 이벤트 도착 시 build_summary_meta의 집합/플래그/개수와
+    # clean text 줄을 갱신해 두고, flush 때는 정렬/join만 한다 (결과는 build_* 함수와 동일)
+    __slots__ = (
+        "event_types", "process_names", "domains", "dst_ips", "dst_ports",
+        "sigma_hit", "event_count", "first_ts", "last_ts", "lines", "sigma_lines",
+        "line_base", "chunks",
+    )
+
+    def __init__(self):
+        self.event_types = set()
+        self.process_names = set()
+        self.domains = set()
+        self.dst_ips = set()
+        self.dst_ports = set()
+        self.sigma_hit = False
+        self.event_count = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.lines: List[str] = []
+        # sigma 탐지 이벤트의 clean line (clean text에는 표시하지 않고 프롬프트 중요도 판단에만 사용)
+        self.sigma_lines: Set[str] = set()
+        self.line_base = 0  # spill로 메모리에서 내린 앞부분 줄 수 (lines[0]의 이벤트 번호)
+        # 구간 시작 이벤트 번호 → 다 찬 구간을 flush 전에 미리 요약한 Future (TraceAggregator on_chunk)
+        self.chunks: Optional[Dict[int, Any]] = None
+
+    @classmethod
+    def from_events(cls, events: Iterable[Any]):
+        f = cls()
+        for e in events:
+            f.add(e)
+        return f
+
+    def add(self, e):
+        get = e.get
+        v = get("event_name")
+        if v:
+            self.event_types.add(v)
+        v = get("process_name")
+        if v:
+            self.process_names.add(v)
+        v = get("query_name")
+        if v:
+            self.domains.add(v)
+        v = get("destination_ip")
+        if v:
+            self.dst_ips.add(v)
+        v = get("destination_port")
+        if v:
+            self.dst_ports.add(str(v))
+        sigma = get("sigma_alert") or get("sigma_rule_title")
+        if sigma:
+            self.sigma_hit = True
+        self.event_count += 1
+        ts = get("timestamp_utc")
+        if ts:
+            if self.first_ts is None or ts < self.first_ts:
+                self.first_ts = ts
+            if self.last_ts is None or ts > self.last_ts:
+                self.last_ts = ts
+        line = clean_line(e)
+        self.lines.append(line)
+        if sigma:
+            self.sigma_lines.add(line)
+
+    def prepend(self, events: List[Any]):
+        # spill에서 읽어 온 앞부분 이벤트의 clean line (메타는 add 때 이미 반영됨)
+        lines = [clean_line(e) for e in events]
+        self.lines[:0] = lines
+        self.line_base = 0
+        for e, line in zip(events, lines):
+            if e.get("sigma_alert") or e.get("sigma_rule_title"):
+                self.sigma_lines.add(line)
+
+    def drop_lines(self):
+        # spill: 메모리의 clean line을 버림 (flush 때 prepend로 다시 렌더링)
+        self.lines.clear()
+        self.line_base = self.event_count
+
+    def chunk_text(self, start: int, end: int):
+        # 이벤트 [start, end) 구간의 clean text (== flush 후 clean_text(start, end)). spill로 버린 줄이면 None
+        if start < self.line_base:
+            return None
+        return self.clean_text(start - self.line_base, end - self.line_base)
+
+    def meta(self):
+        # == build_summary_meta(events)
+        return {
+            "event_types": sorted(self.event_types),
+            "process_names": sorted(self.process_names),
+            "domains": sorted(self.domains),
+            "dst_ips": sorted(self.dst_ips),
+            "dst_ports": sorted(self.dst_ports),
+            "sigma_hit": self.sigma_hit,
+            "event_count": self.event_count,
+        }
+
+    def clean_text(self, start: int = 0, end: Optional[int] = None):
+        # == build_clean_text(events[start:end])
+        return "\n".join([ln for ln in self.lines[start:end] if ln])
+
@@ -0,0 +1,141 @@
+import ipaddress, re
+from collections import Counter as _Counter
+from typing import Collection, Dict, List, Optional, Tuple
+
+from config import PROMPT_TOKEN_BUDGET
+from metrics import REGISTRY
+
+try:
+    import tiktoken  # 선택 의존성: 정확한 토큰 수 (없으면 문자 수 근사)
+except ImportError:
+    tiktoken = None
+
+# clean text → LLM 프롬프트 본문:
+#   1) 반복/거의 같은 줄(pid, 출발지 포트, GUID/긴 hex만 다른 줄)을 하나로 접고 (xN) 표기
+#   2) 중요도(sigma > 프로세스 생성 > 외부 IP 연결 > DNS > 기타 > 종료) 순으로 토큰 예산 안에서 선택
+#      sigma 여부는 clean text가 아니라 TraceFeatures.sigma_lines(탐지 이벤트의 줄)로 전달
+#   3) 선택된 줄은 원래 시간 순서대로 출력, 빠진 줄은 유형별 개수만 남김
+
+PROMPT_TOKENS = REGISTRY.counter(
+    "trace_pipeline_prompt_tokens_total",
+    "Prompt body tokens before (raw) and after (sent) compaction",
+    ("stage", "kind"),
+)
+
+_MASKS = (
+    (re.compile(r"pid=\d+"), "pid=*"),
+    (re.compile(r"(\[NET\] \S+ \S+):\d+ ->"), r"\1:* ->"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<guid>"),
+    (re.compile(r"\b[0-9a-fA-F]{16,}\b"), "<hex>"),
+)
+_KIND_RE = re.compile(r"^\[([^\]]*)\]")
+_NET_DST_RE = re.compile(r"-> \[?([0-9a-fA-F:.]+?)\]?:\d+ ")
+
+_encoder = None
+
+
+def count_tokens(text: str):
+    global _encoder
+    if tiktoken is not None:
+        if _encoder is None:
+            try:
+                _encoder = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                _encoder = False
+        if _encoder:
+            return len(_encoder.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _normalize(line: str):
+    for rx, repl in _MASKS:
+        line = rx.sub(repl, line)
+    return line
+
+
+def _is_external(ip: str):
+    try:
+        a = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return a.is_global
+
+
+def salience(line: str, sigma: bool = False):
+    if sigma:
+        return 100
+    kind = line[1:].split("]", 1)[0] if line.startswith("[") else ""
+    if kind == "PROC+":
+        return 50
+    if kind == "NET":
+        m = _NET_DST_RE.search(line)
+        return 40 if m and _is_external(m.group(1)) else 15
+    if kind == "DNS":
+        return 20
+    if kind == "PROC-":
+        return 5
+    return 10
+
+
+def _collapse(lines: List[str], sigma_lines: Collection[str] = ()):
+    # 정규화 키 기준으로 첫 등장 순서 유지 → [(대표 줄, 개수, sigma 포함 여부)]
+    groups: Dict[str, List] = {}
+    for ln in lines:
+        if not ln:
+            continue
+        key = _normalize(ln)
+        g = groups.get(key)
+        if g is None:
+            groups[key] = g = [ln, 0, key, False]
+        g[1] += 1
+        if not g[3] and ln in sigma_lines:
+            g[3] = True
+    out: List[Tuple[str, int, bool]] = []
+    for g in groups.values():
+        ln, n, key, sigma = g
+        # 여러 줄이 접히면 달라지는 값(pid 등)은 마스킹된 형태로 표시
+        out.append((ln, 1, sigma) if n == 1 else (f"{key} (x{n})", n, sigma))
+    return out
+
+
+def compact_clean_text(
+    clean_text: str,
+    budget: Optional[int] = None,
+    stage: str = "summarize",
+    sigma_lines: Optional[Collection[str]] = None,
+):
+    budget = PROMPT_TOKEN_BUDGET if budget is None else budget
+    lines = (clean_text or "").splitlines()
+    groups = _collapse(lines, sigma_lines or ())
+    rendered = [ln for ln, _, _ in groups]
+    costs = [count_tokens(ln) + 1 for ln in rendered]
+    if budget <= 0 or sum(costs) <= budget:
+        keep = set(range(len(groups)))
+    else:
+        reserve = 40  # 생략 안내 줄
+        order = sorted(
+            range(len(groups)), key=lambda i: (-salience(rendered[i], groups[i][2]), i)
+        )
+        keep, used = set(), 0
+        for i in order:
+            if used + costs[i] <= budget - reserve:
+                keep.add(i)
+                used += costs[i]
+        if not keep and order:
+            keep.add(order[0])  # 예산보다 긴 줄 하나라도 보냄 (아래에서 잘림)
+
+    out = [rendered[i] for i in sorted(keep)]
+    dropped = _Counter()
+    for i, (ln, n, _) in enumerate(groups):
+        if i not in keep:
+            m = _KIND_RE.match(ln)
+            dropped[m.group(1) if m else "기타"] += n
+    if dropped:
+        detail = ", ".join(f"{k} {v}" for k, v in dropped.most_common())
+        out.append(f"... 예산 초과로 {sum(dropped.values())}개 이벤트 생략 ({detail})")
+    text = "\n".join(out)
+    if budget > 0 and count_tokens(text) > budget:
+        text = text[: budget * 4]
+    PROMPT_TOKENS.labels(stage, "raw").inc(count_tokens(clean_text or ""))
+    PROMPT_TOKENS.labels(stage, "sent").inc(count_tokens(text))
+    return text
@@ -0,0 +1,39 @@
+import threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class RollingSummaryStore:
+    # trace_id별 누적(rolling) 요약/메타/구간 수. max_events로 나뉘어 여러 번 flush되는
+    # 긴 trace의 앞 구간 요약을 잃지 않도록 보관한다. 항목 수(LRU)와 TTL로 상한.
+    def __init__(self, max_traces: int = 10000, ttl_sec: float = 3600.0, stripes: int = 64):
+        self.max_traces = max(1, max_traces)
+        self.ttl = ttl_sec
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()  # tid -> (state, expires_at)
+        self._lock = threading.Lock()
+        # 같은 trace의 구간이 워커 여러 개에서 동시에 병합되지 않도록 trace별 striped lock
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+
+    def lock(self, trace_id: str):
+        return self._stripes[hash(trace_id) % len(self._stripes)]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(trace_id)
+            if item is None:
+                return None
+            state, expires_at = item
+            if expires_at <= time.time():
+                del self._items[trace_id]
+                return None
+            return state
+
+    def put(self, trace_id: str, state: Dict[str, Any]):
+        with self._lock:
+            self._items[trace_id] = (state, time.time() + self.ttl)
+            self._items.move_to_end(trace_id)
+            while len(self._items) > self.max_traces:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
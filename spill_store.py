@@ -0,0 +1,56 @@
+import json, os, sqlite3
+from typing import Dict, List
+from preprocess import EVENT_FIELDS, EventRecord
+
+
+class SpillStore:
+    # 메모리 압박 시 열린 trace의 버퍼 이벤트를 내려두는 로컬 SQLite 저장소.
+    # 프로세스 로컬 scratch 용도라 fsync 없이 쓰고, 시작 시 이전 내용은 비운다.
+    def __init__(self, path: str):
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS spill ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, trace_id TEXT NOT NULL, rows TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS spill_trace ON spill(trace_id, id)")
+        self._db.execute("DELETE FROM spill")
+        self._db.commit()
+        self.counts: Dict[str, int] = {}  # trace_id -> 디스크에 있는 이벤트 수
+        self.total = 0
+
+    def append(self, trace_id: str, evs: List[EventRecord]):
+        if not evs:
+            return
+        rows = [[getattr(e, k) for k in EVENT_FIELDS] for e in evs]
+        self._db.execute(
+            "INSERT INTO spill (trace_id, rows) VALUES (?, ?)",
+            (trace_id, json.dumps(rows, ensure_ascii=False)),
+        )
+        self._db.commit()
+        self.counts[trace_id] = self.counts.get(trace_id, 0) + len(evs)
+        self.total += len(evs)
+
+    def count(self, trace_id: str):
+        return self.counts.get(trace_id, 0)
+
+    def pop(self, trace_id: str) -> List[EventRecord]:
+        # 내려둔 순서대로 읽어오고 삭제
+        n = self.counts.pop(trace_id, 0)
+        if not n:
+            return []
+        cur = self._db.execute(
+            "SELECT rows FROM spill WHERE trace_id = ? ORDER BY id", (trace_id,)
+        )
+        out = [EventRecord(*row) for (rows,) in cur for row in json.loads(rows)]
+        self._db.execute("DELETE FROM spill WHERE trace_id = ?", (trace_id,))
+        self._db.commit()
+        self.total -= n
+        return out
+
+    def close(self):
+        self._db.close()
@@ -1,9 +1,41 @@
-from typing import Dict, Any
-from openai import OpenAI
-from config import OPENAI_API_KEY, CHAT_MODEL
-from chroma_setup import upsert_trace_summary
+import threading, time
+from typing import Dict, Any, Collection, List, Optional
+from config import OPENAI_API_KEY, CHAT_MODEL, PROMPT_TOKEN_BUDGET
+from chroma_setup import upsert_trace_summary, warmup as chroma_warmup
+from summary_cache import get_cache, make_key, normalize_clean_text
+from metrics import record_usage, stage
+from prompt_builder import compact_clean_text
+from llm_scheduler import PRIORITY_NORMAL, estimate_tokens, get_scheduler
 
-_client = OpenAI(api_key=OPENAI_API_KEY)
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # OpenAI 클라이언트는 첫 요약 시점에 생성 (import 비용/시간 절약)
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+
+                # 재시도/backoff는 llm_scheduler가 담당
+                _client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+    return _client
+
+
+def set_client(client):
+    # 테스트/벤치마크용 fake 클라이언트 주입
+    global _client
+    _client = client
+
+
+def warmup():
+    # OpenAI 클라이언트 + Chroma 연결/컬렉션/writer를 첫 trace 전에 준비
+    t0 = time.perf_counter()
+    get_client()
+    chroma_warmup()
+    return time.perf_counter() - t0
 
 SYSTEM_PROMPT = (
     "당신은 사이버 보안 분석가입니다. "
@@ -12,18 +44,80 @@ SYSTEM_PROMPT = (
 )
 
 
-def summarize_korean(clean_text: str):
-    user = f"다음은 한 트레이스의 핵심 행위 로그입니다:\n\n{clean_text}\n\n위 내용을 1~2문장 한국어로 요약해 주세요."
-    resp = _client.chat.completions.create(
-        model=CHAT_MODEL,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user},
-        ],
-        temperature=0.2,
+def _chat(system: str, user: str, priority: int):
+    # 모든 요약 호출은 공유 스케줄러를 거침 (우선순위, rate limit, 429/5xx 재시도)
+    return get_scheduler().call(
+        lambda: get_client().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            temperature=0.2,
+        ),
+        priority=priority,
+        tokens=estimate_tokens(system + user),
     )
+
+
+def summarize_korean(
+    clean_text: str,
+    priority: int = PRIORITY_NORMAL,
+    sigma_lines: Optional[Collection[str]] = None,
+):
+    body = compact_clean_text(clean_text, stage="summarize", sigma_lines=sigma_lines)
+    user = f"다음은 한 트레이스의 핵심 행위 로그입니다:\n\n{body}\n\n위 내용을 1~2문장 한국어로 요약해 주세요."
+    with stage("llm_summarize"):
+        resp = _chat(SYSTEM_PROMPT, user, priority)
+    record_usage(CHAT_MODEL, getattr(resp, "usage", None))
+    return resp.choices[0].message.content.strip()
+
+
+MERGE_PROMPT = (
+    "당신은 사이버 보안 분석가입니다. "
+    "같은 트레이스를 시간 순서대로 나눈 구간별 요약들을 하나의 1~2문장 한국어 요약으로 통합하세요. "
+    "핵심 행위, 주체(프로세스), 대상(도메인/IP/포트)을 유지하세요."
+)
+
+
+def merge_summaries_korean(summaries: List[str], priority: int = PRIORITY_NORMAL):
+    parts = "\n".join(f"{i + 1}. {s}" for i, s in enumerate(summaries))
+    user = f"다음은 한 트레이스의 구간별 요약입니다(시간순):\n\n{parts}\n\n하나의 1~2문장 한국어 요약으로 통합해 주세요."
+    with stage("llm_merge"):
+        resp = _chat(MERGE_PROMPT, user, priority)
+    record_usage(CHAT_MODEL, getattr(resp, "usage", None))
     return resp.choices[0].message.content.strip()
 
 
-def save_trace_summary(trace_id: str, summary: str, meta: Dict[str, Any]):
-    return upsert_trace_summary(trace_id, summary, meta)
+def summarize_cached(
+    clean_text: str,
+    priority: int = PRIORITY_NORMAL,
+    sigma_lines: Optional[Collection[str]] = None,
+):
+    # 같은 행위 패턴(정규화된 clean text + 모델 + 프롬프트)이면 GPT 호출 없이 캐시된 요약 사용
+    # 토큰 예산/sigma 줄이 달라지면 프롬프트 본문이 달라지므로 키에 포함
+    cache = get_cache()
+    if cache is None:
+        return summarize_korean(clean_text, priority, sigma_lines)
+    lines = set(clean_text.splitlines()) if sigma_lines else ()
+    sigma = "\n".join(sorted(ln for ln in (sigma_lines or ()) if ln in lines))
+    key = make_key(
+        "sum",
+        CHAT_MODEL,
+        SYSTEM_PROMPT,
+        str(PROMPT_TOKEN_BUDGET),
+        normalize_clean_text(clean_text),
+        normalize_clean_text(sigma),
+    )
+    summary = cache.get(key)
+    if summary is None:
+        summary = summarize_korean(clean_text, priority, sigma_lines)
+        cache.put(key, summary)
+    return summary
+
+
+def save_trace_summary(trace_id: str, summary: str, meta: Dict[str, Any], on_durable=None):
+    # type은 검색 시 where 필터용 (chroma_setup.build_where)
+    return upsert_trace_summary(
+        trace_id, summary, {"type": "trace_summary", **meta}, on_durable
+    )
@@ -0,0 +1,190 @@
+import hashlib, json, re, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config import (
+    EMBED_CACHE_SIZE,
+    SUMMARY_CACHE_SIZE,
+    SUMMARY_CACHE_TTL_SEC,
+    SUMMARY_CACHE_DB,
+    SUMMARY_CACHE_DB_MAX_ENTRIES,
+)
+from metrics import REGISTRY
+
+# NET 라인의 출발지 포트(ephemeral)는 요약 내용과 무관하므로 키에서 제외
+_SRC_PORT_RE = re.compile(r"(\[NET\] \S+ \S+):\d+ ->")
+_WS_RE = re.compile(r"[ \t]+")
+
+
+def normalize_clean_text(clean_text: str):
+    lines = []
+    for ln in (clean_text or "").splitlines():
+        ln = _WS_RE.sub(" ", ln.strip())
+        if ln:
+            lines.append(_SRC_PORT_RE.sub(r"\1:* ->", ln))
+    return "\n".join(lines)
+
+
+def make_key(namespace: str, *parts: str):
+    h = hashlib.sha256()
+    for p in parts:
+        h.update((p or "").encode("utf-8"))
+        h.update(b"\0")
+    return f"{namespace}:{h.hexdigest()}"
+
+
+class SummaryCache:
+    # 메모리 LRU + (선택) SQLite 영속 계층. 값은 요약문 str 등 JSON 직렬화 가능한 객체
+    # (SQLite 없이 쓰면 임의 객체 가능 → 임베딩 캐시는 array('f')). TTL이 지난 항목은 조회 시 무시/삭제.
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        ttl_sec: float = 86400.0,
+        db_path: Optional[str] = None,
+        db_max_entries: int = 100_000,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_sec
+        self.db_max_entries = db_max_entries
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS cache_expires ON cache(expires_at)"
+            )
+            self._db.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None:
+                value, expires_at = hit
+                if expires_at > now:
+                    self._lru.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                del self._lru[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.stats["disk_hits"] += 1
+                    return value
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at),
+                )
+                self._puts += 1
+                if self._puts % 256 == 0:
+                    self._prune_db()
+                self._db.commit()
+
+    def delete(self, key: str):
+        # 수동 무효화 (메모리 + 디스크)
+        with self._lock:
+            found = self._lru.pop(key, None) is not None
+            if self._db is not None:
+                found = self._db.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0 or found
+                self._db.commit()
+        return found
+
+    def clear(self):
+        with self._lock:
+            n = len(self._lru)
+            self._lru.clear()
+            if self._db is not None:
+                n = max(n, self._db.execute("DELETE FROM cache").rowcount)
+                self._db.commit()
+        return n
+
+    def _remember(self, key: str, value: Any, expires_at: float):
+        self._lru[key] = (value, expires_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _prune_db(self):
+        # 만료 항목 삭제 후 상한을 넘으면 만료가 가까운(오래된) 항목부터 삭제
+        self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.db_max_entries,),
+        )
+
+    def hit_rate(self):
+        hits = self.stats["hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+
+_cache: Optional[SummaryCache] = None
+_embed_cache: Optional[SummaryCache] = None
+_cache_lock = threading.Lock()
+
+
+def _export_stats(cache: SummaryCache, name: str, help: str):
+    g = REGISTRY.gauge(name, help, ("stat",))
+    for k in cache.stats:
+        g.labels(k).set_function(lambda k=k: cache.stats[k])
+
+
+def get_cache():
+    # 요약 캐시, 프로세스 단위 (SUMMARY_CACHE_SIZE=0이면 None)
+    global _cache
+    if _cache is None and SUMMARY_CACHE_SIZE > 0:
+        with _cache_lock:
+            if _cache is None:
+                cache = SummaryCache(
+                    SUMMARY_CACHE_SIZE,
+                    SUMMARY_CACHE_TTL_SEC,
+                    SUMMARY_CACHE_DB or None,
+                    SUMMARY_CACHE_DB_MAX_ENTRIES,
+                )
+                _export_stats(cache, "trace_summary_cache", "Summary cache counters")
+                _cache = cache
+    return _cache
+
+
+def get_embed_cache():
+    # 임베딩 전용 메모리 캐시 (EMBED_CACHE_SIZE=0이면 None). 요약 LRU를 밀어내지 않도록 분리
+    global _embed_cache
+    if _embed_cache is None and EMBED_CACHE_SIZE > 0:
+        with _cache_lock:
+            if _embed_cache is None:
+                cache = SummaryCache(EMBED_CACHE_SIZE, SUMMARY_CACHE_TTL_SEC)
+                _export_stats(cache, "trace_embed_cache", "Embedding cache counters")
+                _embed_cache = cache
+    return _embed_cache
@@ -0,0 +1,228 @@
+import heapq, itertools, time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from preprocess import (
+    EventRecord,
+    TraceFeatures,
+    iter_events_from_otlp,
+    iter_events_from_json_stream,
+    trace_key,
+)
+from metrics import EVENTS, REGISTRY, STAGE_LATENCY, TRACES
+from spill_store import SpillStore
+
+_DECODE = STAGE_LATENCY.labels("decode")
+_AGGREGATE = STAGE_LATENCY.labels("aggregate")
+_PRESSURE = REGISTRY.counter(
+    "trace_aggregator_pressure_total",
+    "Traces flushed early or spilled to disk because of memory caps",
+    ("action",),
+)
+_EARLY_FLUSH = _PRESSURE.labels("early_flush")
+_SPILL = _PRESSURE.labels("spill")
+SPILLED_EVENTS = REGISTRY.gauge(
+    "trace_aggregator_spilled_events", "Events spilled to the on-disk store"
+)
+
+
+class TraceAggregator:
+    def __init__(
+        self,
+        inactivity_sec: float,
+        max_events: int,
+        clock=time.time,
+        max_buffered_events: int = 0,
+        max_open_traces: int = 0,
+        eviction: str = "oldest",
+        spill_path: Optional[str] = None,
+        chunk_events: int = 0,
+        on_chunk: Optional[Callable[[str, TraceFeatures, str], Any]] = None,
+    ):
+        self.inactivity = inactivity_sec
+        self.max_events = max_events
+        self.clock = clock
+        # 전역 상한 (0이면 무제한). 초과 시 eviction 정책(oldest|largest)으로 희생 trace 선택:
+        #   열린 trace 수 초과 → 조기 flush
+        #   버퍼 이벤트 수 초과 → spill 저장소가 있으면 디스크로 내리고, 없으면 조기 flush
+        self.max_buffered = max_buffered_events
+        self.max_open = max_open_traces
+        if eviction not in ("oldest", "largest"):
+            raise ValueError(f"unknown eviction policy '{eviction}' (oldest|largest)")
+        self.eviction = eviction
+        self.spill = SpillStore(spill_path) if spill_path else None
+        # 열린 trace의 이벤트가 chunk_events개 찰 때마다 on_chunk(trace_id, features, clean text) 호출.
+        # Future를 돌려주면 features.chunks에 두고 flush 때 그 구간은 다시 요약하지 않음 (None이면 flush 때 요약)
+        self.chunk_events = chunk_events
+        self.on_chunk = on_chunk if chunk_events > 0 else None
+        self.buckets: Dict[str, List[EventRecord]] = {}
+        # trace별 메타/clean text 누적기 (flush 시 build_* 재계산 없이 바로 사용)
+        self.features: Dict[str, TraceFeatures] = {}
+        self.last_seen: Dict[str, float] = {}
+        # 비활성 만료 시각 min-heap: (deadline, bucket seq, trace_id)
+        # 열린 버킷당 유효 엔트리는 1개. seq가 다르면 이미 flush된 버킷의 엔트리(lazy invalidation)
+        self._deadlines: List[Tuple[float, int, str]] = []
+        self._seq: Dict[str, int] = {}
+        self._counter = itertools.count()
+        # 버킷이 담은 Kafka 메시지의 파티션별 최소 offset (add_events에 source를 넘길 때만)
+        self.offsets: Dict[str, Dict[Any, int]] = {}
+        # max_events에 도달해 바로 flush 대상이 된 버킷: (trace_id, events, features, offsets)
+        self._ready: Deque[
+            Tuple[str, List[EventRecord], TraceFeatures, Optional[Dict[Any, int]]]
+        ] = deque()
+        self.buffered = 0  # 메모리에 버퍼된 이벤트 수 (gauge용, spill 된 이벤트 제외)
+        if self.spill is not None:
+            SPILLED_EVENTS.set_function(lambda: self.spill.total)
+
+    def add_payload(self, payload: Dict[str, Any]):
+        self.add_events(iter_events_from_otlp(payload, compact=True))
+
+    def add_stream(self, fp):
+        # 디코딩된 전체 문서 없이 span 단위로 바로 버킷에 적재
+        self.add_events(iter_events_from_json_stream(fp, compact=True))
+
+    def add_events(self, evs: Iterable[EventRecord], source: Optional[Tuple[Any, int]] = None):
+        # source: 이 이벤트들을 담은 Kafka 메시지 (TopicPartition, offset). 커밋 가능 offset 계산용
+        now = self.clock()
+        deadline = now + self.inactivity
+        # evs는 보통 디코딩 generator → next() 시간은 decode, 나머지는 aggregate로 분리 측정
+        pc = time.perf_counter
+        t_decode = t_agg = 0.0
+        n = 0
+        t = pc()
+        for e in evs:
+            t1 = pc()
+            t_decode += t1 - t
+            tid = trace_key(e)
+            bucket = self.buckets.get(tid)
+            if bucket is None:
+                bucket = self.buckets[tid] = []
+                feat = self.features[tid] = TraceFeatures()
+                seq = self._seq[tid] = next(self._counter)
+                heapq.heappush(self._deadlines, (deadline, seq, tid))
+            else:
+                feat = self.features[tid]
+            bucket.append(e)
+            feat.add(e)
+            if self.on_chunk is not None and feat.event_count % self.chunk_events == 0:
+                self._chunk(tid, feat)
+            if source is not None:
+                held = self.offsets.get(tid)
+                if held is None:
+                    self.offsets[tid] = {source[0]: source[1]}
+                elif source[0] not in held:
+                    held[source[0]] = source[1]
+            n += 1
+            self.buffered += 1
+            self.last_seen[tid] = now
+            size = len(bucket)
+            if self.spill is not None:
+                size += self.spill.count(tid)
+            if size >= self.max_events:
+                self._ready.append((tid, *self._close(tid)))
+            if (self.max_buffered and self.buffered > self.max_buffered) or (
+                self.max_open and len(self.buckets) > self.max_open
+            ):
+                self._relieve_pressure()
+            t = pc()
+            t_agg += t - t1
+        t_decode += pc() - t
+        EVENTS.inc(n)
+        _DECODE.observe(t_decode)
+        _AGGREGATE.observe(t_agg)
+
+    def _close(self, tid: str):
+        self.last_seen.pop(tid, None)
+        self._seq.pop(tid, None)
+        evs = self.buckets.pop(tid, [])
+        feat = self.features.pop(tid, None) or TraceFeatures.from_events(evs)
+        offsets = self.offsets.pop(tid, None)
+        self.buffered -= len(evs)
+        if self.spill is not None and self.spill.count(tid):
+            spilled = self.spill.pop(tid)
+            evs = spilled + evs  # 디스크에 내려둔 앞부분을 읽어와 순서대로 합침
+            feat.prepend(spilled)
+        return evs, feat, offsets
+
+    def _chunk(self, tid: str, feat: TraceFeatures):
+        end = feat.event_count
+        start = end - self.chunk_events
+        text = feat.chunk_text(start, end)
+        if text is None:
+            return
+        fut = self.on_chunk(tid, feat, text)
+        if fut is not None:
+            if feat.chunks is None:
+                feat.chunks = {}
+            feat.chunks[start] = fut
+
+    def _victim(self, in_memory: bool):
+        # 압박 상황에서만 호출되므로 O(열린 trace) 스캔 허용.
+        # buckets는 생성 순서를 유지하므로 첫 항목이 가장 오래된 trace
+        if self.eviction == "largest":
+            best, best_n = None, 0
+            for tid, b in self.buckets.items():
+                n = len(b) if in_memory else len(b) + (self.spill.count(tid) if self.spill else 0)
+                if n > best_n:
+                    best, best_n = tid, n
+            return best
+        for tid, b in self.buckets.items():
+            if b or not in_memory:
+                return tid
+        return None
+
+    def _relieve_pressure(self):
+        while self.max_open and len(self.buckets) > self.max_open:
+            tid = self._victim(in_memory=False)
+            if tid is None:
+                break
+            self._ready.append((tid, *self._close(tid)))
+            _EARLY_FLUSH.inc()
+        while self.max_buffered and self.buffered > self.max_buffered:
+            tid = self._victim(in_memory=True)
+            if tid is None:
+                break
+            if self.spill is not None:
+                evs = self.buckets[tid]
+                self.spill.append(tid, evs)
+                self.buckets[tid] = []
+                # spill된 이벤트의 clean text 줄은 메모리에 두지 않고 flush 때 다시 렌더링
+                self.features[tid].drop_lines()
+                self.buffered -= len(evs)
+                _SPILL.inc()
+            else:
+                self._ready.append((tid, *self._close(tid)))
+                _EARLY_FLUSH.inc()
+
+    def has_ready(self):
+        return bool(self._ready)
+
+    def pop_ready(self):
+        # 비용은 열린 trace 수가 아니라 만료/가득 찬 trace 수에 비례
+        now = self.clock()
+        out = list(self._ready)
+        self._ready.clear()
+        heap = self._deadlines
+        while heap and heap[0][0] <= now:
+            _, seq, tid = heapq.heappop(heap)
+            if self._seq.get(tid) != seq:
+                continue
+            due = self.last_seen[tid] + self.inactivity
+            if due > now:
+                heapq.heappush(heap, (due, seq, tid))
+                continue
+            evs, feat, offsets = self._close(tid)
+            if evs:
+                out.append((tid, evs, feat, offsets))
+        if out:
+            TRACES.labels("flushed").inc(len(out))
+        return out
+
+    def low_offsets(self):
+        # 아직 요약 작업으로 넘기지 않은 버킷(열림/spill/ready)이 잡고 있는 파티션별 최소 offset
+        low: Dict[Any, int] = {}
+        held = list(self.offsets.values()) + [item[3] for item in self._ready if item[3]]
+        for offsets in held:
+            for tp, off in offsets.items():
+                if off < low.get(tp, off + 1):
+                    low[tp] = off
+        return low
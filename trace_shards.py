@@ -0,0 +1,238 @@
+import multiprocessing as mp
+import queue, signal, time, zlib
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import (
+    AGG_SPILL_PATH,
+    FLUSH_TICK_SEC,
+    KAFKA_COMMIT_INTERVAL_SEC,
+    KAFKA_COMMIT_MODE,
+    KAFKA_MAX_POLL_RECORDS,
+    KAFKA_BOOTSTRAP,
+    METRICS_HOST,
+    METRICS_PORT,
+    RAW_TOPIC,
+    SHARD_QUEUE_SIZE,
+)
+from metrics import ERRORS, start_metrics_server
+from offset_tracker import OffsetTracker
+from preprocess import trace_key
+
+# trace-affinity 샤딩: poll/디코딩은 부모 프로세스, 집계/요약/기록은 trace_id 해시로 고른 샤드 프로세스.
+# 같은 trace의 span은 어느 파티션에서 오든 같은 샤드 aggregator로 모이므로 부분 요약으로 쪼개지지 않는다.
+#   부모: poll → 디코딩 → shard_of(trace_key) 별로 나눠 샤드 큐에 (poll 배치 단위) → 샤드 위치로 offset 커밋
+#   샤드: kafka_trace_consumer.TraceProcessor (aggregator + 요약 워커 풀 + OffsetTracker)를 그대로 실행,
+#         주기적으로 "여기 전까지 기록됨" 위치를 부모에 보고 → 부모는 파티션별 샤드 최소 위치까지 커밋
+# 샤드는 spawn으로 시작 (부모의 Chroma/OpenAI 클라이언트/스레드를 fork로 복제하지 않음)
+
+
+def shard_of(trace_id: str, shards: int):
+    # 프로세스마다 달라지는 hash() 대신 고정 해시
+    return zlib.crc32(trace_id.encode("utf-8", "surrogatepass")) % shards
+
+
+def shard_main(index: int, inbox, outbox, durable: bool, shard_init=None):
+    # 샤드 프로세스 진입점. inbox 항목: ([(tp, offset, events)], {tp: 마지막 offset}) 또는 None(종료)
+    # Ctrl+C는 부모만 처리 (부모가 backlog를 넘기고 종료 항목을 보낼 때까지 샤드는 계속 처리)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if shard_init is not None:
+        shard_init()
+    import kafka_trace_consumer as kc
+    from summarize_embed import warmup
+
+    spill = f"{AGG_SPILL_PATH}.shard{index}" if AGG_SPILL_PATH else ""
+    proc = kc.TraceProcessor(durable, spill)
+    if METRICS_PORT > 0:
+        start_metrics_server(METRICS_PORT + 1 + index, METRICS_HOST)
+    warmup()
+    kc.start_judge()
+    last_report = time.time()
+    closing = False
+    while not closing:
+        try:
+            item = inbox.get(timeout=FLUSH_TICK_SEC / 2)
+        except queue.Empty:
+            item = ()
+        if item is None:
+            closing = True
+        elif item:
+            batch, through = item
+            for tp, offset, events in batch:
+                proc.add(tp, offset, events)
+            if proc.tracker is not None:
+                # 이 샤드 이벤트가 없던 메시지도 처리한 것으로 (샤드 위치가 뒤처지지 않도록)
+                for tp, offset in through.items():
+                    proc.tracker.seen(tp, offset)
+        now = time.time()
+        proc.tick(now)
+        proc.submit_pending()
+        while proc.pending:
+            # 워커 풀이 가득 차면 자리가 날 때까지 블록 → inbox가 차고 부모가 파티션 pause
+            proc.pool.wait_for_room(FLUSH_TICK_SEC)
+            proc.submit_pending()
+        if durable and now - last_report >= KAFKA_COMMIT_INTERVAL_SEC / 2:
+            last_report = now
+            outbox.put((index, proc.position(), None))
+    proc.close()
+    stats = {"summarized": proc.pool.done, "failed": proc.pool.failed}
+    outbox.put((index, proc.position() if durable else None, stats))
+
+
+class ShardRouter:
+    # 부모 쪽: 샤드 프로세스 시작/이벤트 분배/샤드 위치 수집
+    def __init__(
+        self,
+        shards: int,
+        durable: bool,
+        shard_init=None,
+        queue_size: int = SHARD_QUEUE_SIZE,
+    ):
+        ctx = mp.get_context("spawn")
+        self.shards = shards
+        self.inboxes = [ctx.Queue(max(1, queue_size)) for _ in range(shards)]
+        self.outbox = ctx.Queue()
+        self._backlog: List[Deque[Tuple]] = [deque() for _ in range(shards)]
+        self.positions: List[Optional[Dict[Any, int]]] = [None] * shards
+        self.stats: List[Optional[Dict[str, int]]] = [None] * shards
+        self._first: Dict[Any, int] = {}  # 파티션별 샤드로 보낸 첫 offset (보고 전 샤드의 위치)
+        self.routed_events = 0
+        self.procs = [
+            ctx.Process(
+                target=shard_main,
+                args=(i, self.inboxes[i], self.outbox, durable, shard_init),
+                name=f"trace-shard-{i}",
+                daemon=True,
+            )
+            for i in range(shards)
+        ]
+        for p in self.procs:
+            p.start()
+
+    def route(self, records: Dict[Any, List[Any]], decoder):
+        # poll 배치 하나를 샤드별 (tp, offset, events) 묶음으로. 모든 샤드에 배치 끝 offset(through)도 전달
+        if not records:
+            return
+        batches: List[List[Tuple]] = [[] for _ in range(self.shards)]
+        through: Dict[Any, int] = {}
+        for tp, msgs in records.items():
+            for msg in msgs:
+                per: Dict[int, List[Any]] = {}
+                try:
+                    for e in decoder.iter_events(msg.value, compact=True):
+                        per.setdefault(shard_of(trace_key(e), self.shards), []).append(e)
+                except Exception as e:
+                    print(f"[ERR] {e}")
+                    ERRORS.labels("decode").inc()
+                for s, evs in per.items():
+                    batches[s].append((tp, msg.offset, evs))
+                    self.routed_events += len(evs)
+                self._first.setdefault(tp, msg.offset)
+                through[tp] = msg.offset
+        for s in range(self.shards):
+            self._backlog[s].append((batches[s], through))
+        self.pump()
+
+    def pump(self):
+        # 샤드 큐에 넣을 수 있는 만큼 넣음 (가득 찬 샤드는 backlog에 남고 busy() → 파티션 pause)
+        for s, backlog in enumerate(self._backlog):
+            while backlog:
+                try:
+                    self.inboxes[s].put_nowait(backlog[0])
+                except queue.Full:
+                    break
+                backlog.popleft()
+
+    def busy(self):
+        return any(self._backlog)
+
+    def collect(self):
+        while True:
+            try:
+                index, pos, stats = self.outbox.get_nowait()
+            except queue.Empty:
+                return
+            if pos is not None:
+                self.positions[index] = pos
+            if stats is not None:
+                self.stats[index] = stats
+
+    def low_offsets(self):
+        # 파티션별 샤드 위치의 최소값. 아직 보고하지 않은 샤드는 처음 보낸 offset에 묶어 둠
+        self.collect()
+        low: Dict[Any, int] = {}
+        for pos in self.positions:
+            src = self._first if pos is None else pos
+            for tp, off in src.items():
+                if off < low.get(tp, off + 1):
+                    low[tp] = off
+        for tp, off in self._first.items():
+            if any(pos is not None and tp not in pos for pos in self.positions):
+                low[tp] = min(low.get(tp, off), off)  # 그 파티션 메시지를 아직 못 받은 샤드
+        return low
+
+    def close(self, timeout: Optional[float] = None):
+        # backlog를 모두 넘기고 종료 항목 전송 → 샤드가 대기 trace 요약/기록 후 마지막 위치 보고
+        for s, backlog in enumerate(self._backlog):
+            while backlog:
+                self.inboxes[s].put(backlog.popleft())
+            self.inboxes[s].put(None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(st is None for st in self.stats) and any(p.is_alive() for p in self.procs):
+            if deadline is not None and time.monotonic() > deadline:
+                break
+            try:
+                index, pos, stats = self.outbox.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if pos is not None:
+                self.positions[index] = pos
+            if stats is not None:
+                self.stats[index] = stats
+        for p in self.procs:
+            p.join(timeout)
+        self.collect()
+
+
+def run_sharded(consumer, decoder, shards: int, durable: bool, stop=None, shard_init=None):
+    from kafka_trace_consumer import _RevokeCommit, _apply_backpressure, _poll_timeout, _update_lag
+
+    router = ShardRouter(shards, durable, shard_init)
+    tracker = OffsetTracker() if durable else None
+    consumer.subscribe(
+        [RAW_TOPIC], listener=_RevokeCommit(consumer, tracker, router) if durable else None
+    )
+    start_metrics_server(METRICS_PORT, METRICS_HOST)
+    print(
+        f"[INFO] Consuming topic='{RAW_TOPIC}' @ {KAFKA_BOOTSTRAP} decoder={decoder.name} "
+        f"(shards={shards}, commit={KAFKA_COMMIT_MODE}, max_poll_records={KAFKA_MAX_POLL_RECORDS})"
+    )
+    last_commit = last_lag = time.time()
+    try:
+        while stop is None or not stop.is_set():
+            records = consumer.poll(timeout_ms=_poll_timeout(router.busy()))
+            router.route(records, decoder)
+            if tracker is not None:
+                for tp, msgs in records.items():
+                    if msgs:
+                        tracker.seen(tp, msgs[-1].offset)
+            router.pump()
+            now = time.time()
+            if now - last_lag >= FLUSH_TICK_SEC:
+                last_lag = now
+                _update_lag(consumer)
+            if tracker is not None and now - last_commit >= KAFKA_COMMIT_INTERVAL_SEC:
+                last_commit = now
+                tracker.commit(consumer, router.low_offsets())
+            # backpressure: 샤드 큐가 가득 차면 파티션 pause
+            _apply_backpressure(consumer, router.busy())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        router.close()
+        if tracker is not None:
+            tracker.commit(consumer, router.low_offsets())
+        consumer.close(autocommit=not durable)
+        done = sum((st or {}).get("summarized", 0) for st in router.stats)
+        print(f"[INFO] shards={shards} routed_events={router.routed_events} summarized={done}")
+    return router
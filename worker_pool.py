@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+from metrics import ERRORS, TRACES
+from llm_scheduler import LLMShedError
+
+
+class SummaryWorkerPool:
+    # 요약+업서트를 poll 루프 밖에서 병렬 처리하는 bounded 워커 풀.
+    # in-flight(대기+실행) 작업 수가 max_inflight를 넘지 않도록 submit이 거절하고,
+    # 호출 측(Kafka consumer)은 is_full()을 보고 파티션을 pause/resume 한다.
+    def __init__(
+        self,
+        handler: Callable[..., Any],
+        concurrency: int = 4,
+        max_inflight: int = 32,
+    ):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.max_inflight = max(self.concurrency, max_inflight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="summary"
+        )
+        self._lock = threading.Lock()
+        self._room = threading.Condition(self._lock)  # in-flight 자리가 나면 notify
+        self._inflight = 0
+        self.done = 0
+        self.failed = 0
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    def is_full(self):
+        return self._inflight >= self.max_inflight
+
+    def wait_for_room(self, timeout: Optional[float] = None):
+        # 자리가 날 때까지 블록 (sleep 폴링 대신). timeout이 지나도 가득 차 있으면 False
+        with self._room:
+            return self._room.wait_for(lambda: self._inflight < self.max_inflight, timeout)
+
+    def submit(self, trace_id: str, evs: List[Any], *extra):
+        # extra: TraceAggregator가 넘기는 누적 features 등 handler 추가 인자
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                return False
+            self._inflight += 1
+        self._executor.submit(self._run, trace_id, evs, *extra)
+        return True
+
+    def try_call(self, fn: Callable[..., Any], *args):
+        # 부가 작업(긴 trace의 구간 선요약)을 같은 워커에서 실행. 여유가 없으면 실행하지 않고 None
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                return None
+            self._inflight += 1
+        fut = self._executor.submit(fn, *args)
+        fut.add_done_callback(self._call_done)
+        return fut
+
+    def _call_done(self, fut):
+        with self._lock:
+            self._inflight -= 1
+            self._room.notify()
+
+    def _run(self, trace_id: str, evs: List[Any], *extra):
+        try:
+            self.handler(trace_id, evs, *extra)
+            ok = True
+        except LLMShedError as e:
+            # rate limit/재시도로 deadline 초과 → 버린 trace로 따로 집계
+            print(f"[WARN] trace={trace_id} shed: {e}")
+            TRACES.labels("shed").inc()
+            ok = False
+        except Exception as e:
+            print(f"[ERR] trace={trace_id} {e}")
+            ERRORS.labels("summarize_trace").inc()
+            TRACES.labels("failed").inc()
+            ok = False
+        with self._lock:
+            self._inflight -= 1
+            self._room.notify()
+            if ok:
+                self.done += 1
+            else:
+                self.failed += 1
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)